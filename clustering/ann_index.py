@@ -0,0 +1,277 @@
+import json
+import os
+import shutil
+from functools import cached_property
+from typing import Dict, Tuple, Union
+
+import numpy as np
+
+from clustering.centroids import normalize_rows
+
+
+def spherical_kmeans(vectors: np.ndarray, n_clusters: int, n_iter: int = 10, random_state: int = 42, block_size: int = 16384) -> np.ndarray:
+    """
+    Cluster normalized vectors with k-means on the cosine similarity.
+
+    Parameters
+    ----------
+        vectors (numpy.ndarray): The (N, dim) normalized float32 vectors.
+        n_clusters (int): The number of clusters.
+        n_iter (int): The number of iterations. Defaults to 10.
+        random_state (int): The seed of the initialization. Defaults to 42.
+        block_size (int): The number of vectors assigned at once. Defaults to 16384.
+
+    Returns
+    -------
+        numpy.ndarray: The (n_clusters, dim) normalized centroids.
+    """
+    rng = np.random.default_rng(random_state)
+    centroids = vectors[rng.choice(len(vectors), size=n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = assign_lists(vectors, centroids, block_size)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        # Re-seed the empty clusters with random vectors
+        empty = counts == 0
+        sums[empty] = vectors[rng.choice(len(vectors), size=empty.sum(), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray, block_size: int = 16384) -> np.ndarray:
+    """
+    Assign every vector to its most similar centroid, block by block.
+    """
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), block_size):
+        assignments[start:start + block_size] = (normalize_rows(vectors[start:start + block_size]) @ centroids.T).argmax(axis=1)
+    return assignments
+
+
+class IVFIndex:
+    """
+    An inverted file (IVF) index over normalized document embeddings, for approximate nearest neighbour search on the cosine similarity in pure numpy.
+
+    The embeddings are partitioned into `n_lists` clusters. The vectors are stored grouped by cluster (in float16 by default), so that a query only scores the vectors of the `n_probe` clusters most similar to it: at 1M documents with the default settings, a query scores about 0.5% of the vectors.
+
+    Filters on the topics or on any metadata are applied while scanning the lists, and more lists are probed until `k` documents pass the filter, so that a restrictive filter still returns `k` results when they exist.
+
+    Attributes
+    ----------
+        centroids (numpy.ndarray): The (n_lists, dim) normalized centroids.
+        list_offsets (numpy.ndarray): The (n_lists + 1,) offsets of the lists in `ids` and `vectors`.
+        ids (numpy.ndarray): The row of every stored vector in the original embeddings, grouped by list.
+        positions (numpy.ndarray): The inverse of `ids`: the position in `ids` and `vectors` of every row of the original embeddings, computed on first access.
+        vectors (numpy.ndarray): The normalized vectors, grouped by list.
+        topics (numpy.ndarray): The optional topic of every row of the original embeddings, to filter on.
+        n_probe (int): The default number of lists scanned per query.
+    """
+
+    FILES = ('centroids', 'list_offsets', 'ids', 'vectors', 'topics')
+
+    def __init__(self,
+                 centroids: np.ndarray,
+                 list_offsets: np.ndarray,
+                 ids: np.ndarray,
+                 vectors: np.ndarray,
+                 topics: Union[np.ndarray, None] = None,
+                 n_probe: int = 8) -> None:
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.ids = ids
+        self.vectors = vectors
+        self.topics = topics
+        self.n_probe = n_probe
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @cached_property
+    def positions(self) -> np.ndarray:
+        positions = np.empty(len(self.ids), dtype=np.int64)
+        positions[np.asarray(self.ids)] = np.arange(len(self.ids))
+        return positions
+
+    def vector(self, row: int) -> np.ndarray:
+        """
+        Get the stored normalized vector of a row of the original embeddings, e.g. to search the documents similar to a document.
+
+        Parameters
+        ----------
+            row (int): The row of the document in the original embeddings.
+
+        Returns
+        -------
+            numpy.ndarray: The (dim,) float32 vector.
+        """
+        return np.asarray(self.vectors[self.positions[row]], dtype=np.float32)
+
+    @classmethod
+    def build(cls,
+              embeddings: np.ndarray,
+              topics: Union[np.ndarray, list, None] = None,
+              n_lists: Union[int, None] = None,
+              n_probe: int = 8,
+              dtype=np.float16,
+              train_size: int = 100000,
+              random_state: int = 42) -> 'IVFIndex':
+        """
+        Build the index.
+
+        Parameters
+        ----------
+            embeddings (numpy.ndarray): The (N, dim) document embeddings, possibly memory-mapped.
+            topics (list): The optional topic of every document, to filter the results on. Defaults to None.
+            n_lists (int): The number of lists. Defaults to None (about 2 * sqrt(N)).
+            n_probe (int): The default number of lists scanned per query. Defaults to 8.
+            dtype: The dtype of the stored vectors. Defaults to numpy.float16 (half the memory, with a negligible effect on the ranking).
+            train_size (int): The number of embeddings sampled to train the centroids. Defaults to 100000.
+            random_state (int): The seed of the sampling and of the k-means initialization. Defaults to 42.
+
+        Returns
+        -------
+            IVFIndex: The index.
+        """
+        n_docs = len(embeddings)
+        if n_lists is None:
+            n_lists = max(1, int(2 * np.sqrt(n_docs)))
+        n_lists = min(n_lists, n_docs)
+
+        rng = np.random.default_rng(random_state)
+        train_rows = np.sort(rng.choice(n_docs, size=min(train_size, n_docs), replace=False))
+        centroids = spherical_kmeans(normalize_rows(embeddings[train_rows]), n_lists, random_state=random_state)
+
+        assignments = assign_lists(embeddings, centroids)
+        ids = np.argsort(assignments, kind='stable')
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=n_lists))])
+        vectors = np.empty((n_docs, embeddings.shape[1]), dtype=dtype)
+        for start in range(0, n_docs, 65536):
+            rows = ids[start:start + 65536]
+            vectors[start:start + len(rows)] = normalize_rows(embeddings[np.sort(rows)])[np.argsort(np.argsort(rows))]
+
+        return cls(centroids, list_offsets, ids, vectors, np.asarray(topics) if topics is not None else None, n_probe)
+
+    def _keep(self, ids: np.ndarray, topics, mask) -> Union[np.ndarray, None]:
+        """
+        Apply the filters to the candidate documents of a list, or None without filter.
+        """
+        keep = None
+        if topics is not None:
+            keep = np.isin(self.topics[ids], topics)
+        if mask is not None:
+            keep = mask[ids] if keep is None else keep & mask[ids]
+        return keep
+
+    def search(self,
+               queries: np.ndarray,
+               k: int = 10,
+               n_probe: Union[int, None] = None,
+               topics=None,
+               mask: Union[np.ndarray, None] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the approximate `k` most similar documents of every query.
+
+        Parameters
+        ----------
+            queries (numpy.ndarray): A (dim,) query embedding or a (Q, dim) matrix of query embeddings.
+            k (int): The number of documents per query. Defaults to 10.
+            n_probe (int): The number of lists scanned per query. Defaults to None (the `n_probe` of the index).
+            topics (int | list): Only return documents of these topics. Defaults to None.
+            mask (numpy.ndarray): Only return the documents whose row is True in this (N,) boolean mask, e.g. `(df['Zone'] == 'Europe').to_numpy()`. Defaults to None.
+
+        Returns
+        -------
+            tuple: Two (Q, k) arrays (or (k,) arrays for a single query): the rows of the documents in the original embeddings, sorted by decreasing similarity, and their cosine similarities. Missing results are -1 and NaN.
+        """
+        single = np.ndim(queries) == 1
+        queries = normalize_rows(np.atleast_2d(queries))
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        if topics is not None:
+            if self.topics is None:
+                raise ValueError("The index was built without topics")
+            topics = np.atleast_1d(topics)
+        if mask is not None:
+            mask = np.asarray(mask, dtype=bool)
+
+        result_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        result_scores = np.full((len(queries), k), np.nan, dtype=np.float32)
+        list_order = np.argsort(-(queries @ self.centroids.T), axis=1)
+        for q, query in enumerate(queries):
+            candidate_ids, candidate_scores = [], []
+            n_found = 0
+            # Probe n_probe lists, then more while the filters leave fewer than k documents
+            for probed, list_index in enumerate(list_order[q]):
+                if probed >= n_probe and n_found >= k:
+                    break
+                start, end = self.list_offsets[list_index], self.list_offsets[list_index + 1]
+                ids = self.ids[start:end]
+                keep = self._keep(ids, topics, mask)
+                vectors = self.vectors[start:end]
+                if keep is not None:
+                    ids, vectors = ids[keep], vectors[keep]
+                if len(ids) == 0:
+                    continue
+                candidate_ids.append(ids)
+                candidate_scores.append(np.asarray(vectors, dtype=np.float32) @ query)
+                n_found += len(ids)
+            if not candidate_ids:
+                continue
+            ids, scores = np.concatenate(candidate_ids), np.concatenate(candidate_scores)
+            top = min(k, len(ids))
+            best = np.argpartition(-scores, top - 1)[:top]
+            best = best[np.argsort(-scores[best], kind='stable')]
+            result_ids[q, :top], result_scores[q, :top] = ids[best], scores[best]
+
+        if single:
+            return result_ids[0], result_scores[0]
+        return result_ids, result_scores
+
+    def save(self, path: str) -> None:
+        """
+        Save the index to a directory of `.npy` files, which `load` memory-maps.
+
+        Parameters
+        ----------
+            path (str): The directory of the index.
+        """
+        tmp_path = path.rstrip(os.sep) + '.tmp'
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+        for name in self.FILES:
+            array = getattr(self, name)
+            if array is not None:
+                np.save(os.path.join(tmp_path, f'{name}.npy'), np.asarray(array))
+        with open(os.path.join(tmp_path, 'index.json'), 'w') as f:
+            json.dump({'n_probe': self.n_probe, 'n_lists': self.n_lists, 'n_documents': len(self)}, f)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.rename(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: Union[str, None] = 'r') -> 'IVFIndex':
+        """
+        Load an index saved with `save`.
+
+        Parameters
+        ----------
+            path (str): The directory of the index.
+            mmap_mode (str): How the vectors are opened. Defaults to 'r' (memory-mapped, only the probed lists are read from disk).
+
+        Returns
+        -------
+            IVFIndex: The index.
+        """
+        with open(os.path.join(path, 'index.json')) as f:
+            settings = json.load(f)
+        arrays: Dict[str, np.ndarray] = {}
+        for name in cls.FILES:
+            file_path = os.path.join(path, f'{name}.npy')
+            if os.path.exists(file_path):
+                arrays[name] = np.load(file_path, mmap_mode=mmap_mode if name == 'vectors' else None)
+        return cls(arrays['centroids'], arrays['list_offsets'], arrays['ids'], arrays['vectors'], arrays.get('topics'), settings['n_probe'])
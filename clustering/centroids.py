@@ -0,0 +1,66 @@
+from typing import Tuple, Union
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+def normalize_rows(embeddings: np.ndarray) -> np.ndarray:
+    """
+    Scale every row to unit L2 norm (rows of zeros are left unchanged), in float32.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.where(norms > 0, norms, 1)
+
+
+def topic_centroids(embeddings: np.ndarray, topics: np.ndarray, block_size: int = 65536) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute the centroid of every topic, i.e. the normalized mean of the normalized embeddings of its documents.
+
+    Parameters
+    ----------
+        embeddings (numpy.ndarray): The (N, dim) document embeddings, possibly memory-mapped.
+        topics (numpy.ndarray): The (N,) topic of each document. The outlier topic -1 gets no centroid.
+        block_size (int): The number of rows read at once. Defaults to 65536.
+
+    Returns
+    -------
+        tuple: The sorted topics having a centroid, and the (n_topics, dim) float32 matrix of their centroids.
+    """
+    topics = np.asarray(topics)
+    labels = np.unique(topics[topics != -1])
+    rows = np.searchsorted(labels, topics)
+    sums = np.zeros((len(labels), embeddings.shape[1]), dtype=np.float64)
+    for start in range(0, len(topics), block_size):
+        block_topics = topics[start:start + block_size]
+        mask = block_topics != -1
+        # Sum the rows of every topic with a sparse (n_topics, block_size) indicator matrix
+        indicator = csr_matrix((np.ones(mask.sum()), (rows[start:start + block_size][mask], np.nonzero(mask)[0])), shape=(len(labels), len(block_topics)))
+        sums += indicator @ normalize_rows(embeddings[start:start + block_size])
+    return labels, normalize_rows(sums)
+
+
+def nearest_centroids(embeddings: np.ndarray, centroids: np.ndarray, block_size: int = 16384, rows: Union[np.ndarray, None] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the most similar centroid of every embedding, with one matrix multiplication per block of rows.
+
+    Parameters
+    ----------
+        embeddings (numpy.ndarray): The (N, dim) embeddings, possibly memory-mapped.
+        centroids (numpy.ndarray): The (K, dim) normalized centroids.
+        block_size (int): The number of rows multiplied at once, bounding the (block_size, K) similarity matrix. Defaults to 16384.
+        rows (numpy.ndarray): The positions of the embeddings to compare, read one block at a time. Defaults to None (all the embeddings).
+
+    Returns
+    -------
+        tuple: The row of the nearest centroid and the cosine similarity to it, for every compared embedding.
+    """
+    n_rows = len(embeddings) if rows is None else len(rows)
+    nearest = np.empty(n_rows, dtype=np.int64)
+    similarities = np.empty(n_rows, dtype=np.float32)
+    for start in range(0, n_rows, block_size):
+        block = embeddings[start:start + block_size] if rows is None else embeddings[rows[start:start + block_size]]
+        block_similarities = normalize_rows(block) @ centroids.T
+        nearest[start:start + len(block_similarities)] = block_similarities.argmax(axis=1)
+        similarities[start:start + len(block_similarities)] = block_similarities.max(axis=1)
+    return nearest, similarities
@@ -0,0 +1,90 @@
+from typing import List, Union
+
+import numpy as np
+import pandas as pd
+from bertopic import BERTopic
+from scipy.sparse import csr_matrix, load_npz, save_npz, vstack
+from sklearn.preprocessing import normalize
+
+from clustering.merged_model import top_words
+
+
+def compute_doc_term_matrix(bertopic_model: BERTopic, docs: List[str], batch_size: int = 50000) -> csr_matrix:
+    """
+    Apply the vectorizer of a fitted BERTopic model to documents, with the preprocessing BERTopic applies before it.
+
+    Parameters
+    ----------
+        bertopic_model (BERTopic): The fitted BERTopic model.
+        docs (list): The documents.
+        batch_size (int): The number of documents tokenized at once. Defaults to 50000.
+
+    Returns
+    -------
+        scipy.sparse.csr_matrix: The (n_docs, n_words) term counts of the documents.
+    """
+    blocks = [
+        bertopic_model.vectorizer_model.transform(bertopic_model._preprocess_text(docs[start:start + batch_size]))
+        for start in range(0, len(docs), batch_size)
+    ]
+    if not blocks:
+        return csr_matrix((0, len(bertopic_model.vectorizer_model.get_feature_names_out())), dtype=np.int64)
+    return csr_matrix(vstack(blocks))
+
+
+def save_doc_term_matrix(path: str, doc_term_matrix: csr_matrix) -> None:
+    """
+    Save a document-term matrix to a compressed `.npz` file (loadable without pickle).
+    """
+    save_npz(path, csr_matrix(doc_term_matrix), compressed=True)
+
+
+def load_doc_term_matrix(path: str) -> csr_matrix:
+    """
+    Load a document-term matrix saved with `save_doc_term_matrix`.
+    """
+    return csr_matrix(load_npz(path))
+
+
+def topics_per_class_from_matrix(bertopic_model: BERTopic,
+                                 doc_term_matrix: csr_matrix,
+                                 topics: Union[List[int], np.ndarray],
+                                 classes: list,
+                                 global_tuning: bool = True) -> pd.DataFrame:
+    """
+    Compute BERTopic's `topics_per_class` from the rows of a document-term matrix instead of tokenizing the documents again.
+
+    The term counts of the documents of a topic are summed instead of counting the terms of their joined text, and the words are the top c-TF-IDF words (the representation models are not run).
+
+    Parameters
+    ----------
+        bertopic_model (BERTopic): The fitted BERTopic model.
+        doc_term_matrix (scipy.sparse.csr_matrix): The term counts of the documents, e.g. rows of the matrix returned by `ClusteringMethod.get_doc_term_matrix`.
+        topics (list): The topic of each document.
+        classes (list): The class of each document.
+        global_tuning (bool): Average the c-TF-IDF of a topic for a class with its global c-TF-IDF, as BERTopic does. Defaults to True.
+
+    Returns
+    -------
+        pandas.DataFrame: A DataFrame with the columns 'Topic', 'Words', 'Frequency' and 'Class'.
+    """
+    words = bertopic_model.vectorizer_model.get_feature_names_out()
+    global_c_tf_idf = normalize(bertopic_model.c_tf_idf_, axis=1, norm='l1', copy=True)
+    topics = np.asarray(topics)
+    classes = pd.Series(list(classes))
+
+    rows = []
+    for class_, class_rows in classes.groupby(classes, sort=False).indices.items():
+        class_topics, topic_rows = np.unique(topics[class_rows], return_inverse=True)
+        # Sum the counts of the documents of every topic with a sparse (n_topics, n_docs) indicator matrix
+        indicator = csr_matrix((np.ones(len(class_rows)), (topic_rows, class_rows)), shape=(len(class_topics), doc_term_matrix.shape[0]))
+        c_tf_idf = csr_matrix(bertopic_model.ctfidf_model.transform(csr_matrix(indicator @ doc_term_matrix)))
+        if global_tuning:
+            c_tf_idf = normalize(c_tf_idf, axis=1, norm='l1', copy=False)
+            c_tf_idf = csr_matrix((global_c_tf_idf[class_topics + bertopic_model._outliers] + c_tf_idf) / 2.0)
+
+        frequencies = np.bincount(topic_rows)
+        for topic, representation, frequency in zip(class_topics.tolist(), top_words(c_tf_idf, words, 5), frequencies.tolist()):
+            rows.append((topic, ", ".join(word for word, _ in representation), frequency, class_))
+
+    return pd.DataFrame(rows, columns=['Topic', 'Words', 'Frequency', 'Class'])
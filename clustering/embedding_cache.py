@@ -0,0 +1,175 @@
+import hashlib
+import os
+import time
+import uuid
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+def text_hash(text: str) -> str:
+    """
+    Compute the hash used as a cache key for a document.
+
+    Parameters
+    ----------
+        text (str): The document to hash.
+
+    Returns
+    -------
+        str: The hexadecimal SHA-1 digest of the UTF-8 encoded document.
+    """
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    A disk-backed cache of sentence embeddings, keyed by the embedding model name and the hash of each document.
+
+    Embeddings are stored in append-only shards inside `cache_dir/<model_name>`: each shard is a pair of `.npy` files, one
+    with the document hashes and one with the embeddings. Shards are opened with `mmap_mode` so that only the rows actually
+    requested are read from disk. Every shard gets a unique name (write time, process id and a random suffix), so that
+    several processes sharing the cache directory (e.g. the jobs of a sweep) never overwrite each other's shards.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str) -> None:
+        """
+        Parameters
+        ----------
+            cache_dir (str): The root directory of the cache.
+            model_name (str): The name of the SentenceTransformer model the embeddings are computed with.
+        """
+        self.model_name = model_name
+        self.path = os.path.join(cache_dir, model_name.replace('/', '__'))
+        os.makedirs(self.path, exist_ok=True)
+        self._shards: List[np.ndarray] = []
+        self._index: Dict[str, Tuple[int, int]] = {}
+        self._load_index()
+
+    def _load_index(self) -> None:
+        """
+        Read the hashes of every shard on disk and build the in-memory index mapping a hash to its (shard, row) position.
+        """
+        shard_names = sorted(name[:-len('_keys.npy')] for name in os.listdir(self.path) if name.endswith('_keys.npy'))
+        for shard_name in shard_names:
+            self._add_shard(shard_name)
+
+    def _add_shard(self, shard_name: str) -> None:
+        """
+        Register a shard written on disk in the in-memory index.
+
+        Parameters
+        ----------
+            shard_name (str): The name of the shard, without the `_keys.npy` / `.npy` suffix.
+        """
+        keys = np.load(os.path.join(self.path, f'{shard_name}_keys.npy'))
+        shard_id = len(self._shards)
+        self._shards.append(np.load(os.path.join(self.path, f'{shard_name}.npy'), mmap_mode='r'))
+        for row, key in enumerate(keys.tolist()):
+            self._index[key] = (shard_id, row)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, text: str) -> bool:
+        return text_hash(text) in self._index
+
+    def get(self, docs: List[str]) -> Tuple[np.ndarray, List[int]]:
+        """
+        Look up the embeddings of a list of documents.
+
+        Parameters
+        ----------
+            docs (list): A list of documents.
+
+        Returns
+        -------
+            tuple: A tuple containing a float32 array of shape (len(docs), dim), filled for the cached documents (or None if nothing is cached), and the positions of the documents missing from the cache.
+        """
+        hashes = [text_hash(doc) for doc in docs]
+        hits = [(i, self._index[key]) for i, key in enumerate(hashes) if key in self._index]
+        missing = [i for i, key in enumerate(hashes) if key not in self._index]
+        if not hits:
+            return None, missing
+
+        dim = self._shards[0].shape[1]
+        embeddings = np.empty((len(docs), dim), dtype=np.float32)
+        # Gather the rows shard by shard, so that each memory-mapped shard is read with a single fancy indexing
+        positions = np.array([i for i, _ in hits])
+        shard_ids = np.array([shard_id for _, (shard_id, _) in hits])
+        rows = np.array([row for _, (_, row) in hits])
+        for shard_id in np.unique(shard_ids):
+            mask = shard_ids == shard_id
+            embeddings[positions[mask]] = self._shards[shard_id][rows[mask]]
+        return embeddings, missing
+
+    def put(self, docs: List[str], embeddings: np.ndarray) -> None:
+        """
+        Add the embeddings of new documents to the cache as a new shard.
+
+        Parameters
+        ----------
+            docs (list): A list of documents.
+            embeddings (numpy.ndarray): The embeddings of the documents, in the same order.
+        """
+        # Drop duplicates and documents already cached
+        new_rows = {}
+        for i, doc in enumerate(docs):
+            key = text_hash(doc)
+            if key not in self._index and key not in new_rows:
+                new_rows[key] = i
+        if not new_rows:
+            return
+
+        shard_name = f'shard_{time.time_ns():020d}_{os.getpid()}_{uuid.uuid4().hex[:8]}'
+        keys = np.array(list(new_rows.keys()))
+        values = np.asarray(embeddings, dtype=np.float32)[list(new_rows.values())]
+        # Write the embeddings before the keys: a shard is only picked up once its keys file exists
+        np.save(os.path.join(self.path, f'{shard_name}.npy'), values)
+        tmp_keys_path = os.path.join(self.path, f'{shard_name}_keys.tmp.npy')
+        np.save(tmp_keys_path, keys)
+        os.replace(tmp_keys_path, os.path.join(self.path, f'{shard_name}_keys.npy'))
+        self._add_shard(shard_name)
+
+    def dimension(self, sentence_model) -> int:
+        """
+        Get the dimension of the embeddings: read from the cached shards, or else from the model.
+        """
+        if self._shards:
+            return self._shards[0].shape[1]
+        get_dimension = getattr(sentence_model, 'get_sentence_embedding_dimension', None)
+        if get_dimension is not None and get_dimension():
+            return get_dimension()
+        return np.asarray(sentence_model.encode([''])).shape[1]
+
+    def encode(self, sentence_model, docs: List[str], batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        """
+        Embed a list of documents, only running the model on the documents missing from the cache.
+
+        Parameters
+        ----------
+            sentence_model (SentenceTransformer): The model used to embed the missing documents.
+            docs (list): A list of documents.
+            batch_size (int): The batch size passed to the model. Defaults to 32.
+            show_progress_bar (bool): Whether to display a progress bar while embedding the missing documents. Defaults to False.
+
+        Returns
+        -------
+            numpy.ndarray: A float32 array of shape (len(docs), dim) with the embeddings of the documents.
+        """
+        if not docs:
+            return np.empty((0, self.dimension(sentence_model)), dtype=np.float32)
+        embeddings, missing = self.get(docs)
+        if not missing:
+            return embeddings
+
+        # Embed each distinct missing document only once
+        missing_docs = list(dict.fromkeys(docs[i] for i in missing))
+        new_embeddings = np.asarray(sentence_model.encode(missing_docs, batch_size=batch_size, show_progress_bar=show_progress_bar), dtype=np.float32)
+        self.put(missing_docs, new_embeddings)
+
+        if embeddings is None:
+            embeddings = np.empty((len(docs), new_embeddings.shape[1]), dtype=np.float32)
+        row_of = {doc: row for row, doc in enumerate(missing_docs)}
+        embeddings[missing] = new_embeddings[[row_of[docs[i]] for i in missing]]
+        return embeddings
@@ -0,0 +1,233 @@
+import copy
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple, Union
+
+import numpy as np
+from bertopic import BERTopic
+from scipy.sparse import csr_matrix
+
+
+def seed_multiplier(bertopic_model: BERTopic, words: np.ndarray) -> Union[np.ndarray, None]:
+    """
+    Compute the IDF multiplier BERTopic applies to the seed words when fitting its c-TF-IDF model.
+
+    Parameters
+    ----------
+        bertopic_model (BERTopic): The BERTopic model.
+        words (numpy.ndarray): The vocabulary of the vectorizer.
+
+    Returns
+    -------
+        numpy.ndarray: The multiplier of every word, or None if the model uses no seed words.
+    """
+    ctfidf_seed_words = getattr(bertopic_model.ctfidf_model, 'seed_words', None)
+    seed_topic_words = {seed for seeds in bertopic_model.seed_topic_list for seed in seeds} if bertopic_model.seed_topic_list else set()
+    if not ctfidf_seed_words and not seed_topic_words:
+        return None
+
+    multiplier = np.ones(len(words))
+    if ctfidf_seed_words:
+        multiplier = np.array([bertopic_model.ctfidf_model.seed_multiplier if word in ctfidf_seed_words else 1 for word in words])
+    if seed_topic_words:
+        multiplier = np.array([1.2 if word in seed_topic_words else value for value, word in zip(multiplier, words)])
+    return multiplier
+
+
+def topic_term_counts(bertopic_model: BERTopic, docs: List[str], doc_term_matrix: Union[csr_matrix, None] = None) -> Tuple[csr_matrix, List[int]]:
+    """
+    Compute the term counts of every topic of a fitted BERTopic model, i.e. the bag-of-words its c-TF-IDF is computed from.
+
+    Parameters
+    ----------
+        bertopic_model (BERTopic): The fitted BERTopic model.
+        docs (list): The documents used to fit the model, in the same order.
+        doc_term_matrix (scipy.sparse.csr_matrix): The already computed term counts of the documents (see `ClusteringMethod.get_doc_term_matrix`), used instead of tokenizing `docs` again. Defaults to None.
+
+    Returns
+    -------
+        tuple: A (n_topics, n_words) CSR matrix of term counts, one row per topic in increasing topic order (-1 first if there are outliers), and the list of these topics.
+    """
+    if doc_term_matrix is None:
+        doc_term_matrix = bertopic_model.vectorizer_model.transform(bertopic_model._preprocess_text(docs))
+    topics = np.asarray(bertopic_model.topics_)
+    labels, rows = np.unique(topics, return_inverse=True)
+    # Sum the rows of the documents of every topic with a sparse (n_topics, n_docs) indicator matrix
+    indicator = csr_matrix((np.ones(len(topics)), (rows, np.arange(len(topics)))), shape=(len(labels), len(topics)))
+    return csr_matrix(indicator @ doc_term_matrix), labels.tolist()
+
+
+def top_words(c_tf_idf: csr_matrix, words: np.ndarray, top_n_words: int) -> List[List[Tuple[str, float]]]:
+    """
+    Extract the top words of every row of a c-TF-IDF matrix, as BERTopic does without representation model.
+
+    Parameters
+    ----------
+        c_tf_idf (scipy.sparse.csr_matrix): The c-TF-IDF matrix.
+        words (numpy.ndarray): The vocabulary of the vectorizer.
+        top_n_words (int): The number of words per row.
+
+    Returns
+    -------
+        list: For every row, a list of (word, score) tuples sorted by decreasing score.
+    """
+    representations = []
+    for row in range(c_tf_idf.shape[0]):
+        start, end = c_tf_idf.indptr[row], c_tf_idf.indptr[row + 1]
+        data, indices = c_tf_idf.data[start:end], c_tf_idf.indices[start:end]
+        order = np.argsort(-data, kind='stable')[:top_n_words]
+        representation = [(words[indices[i]], float(data[i])) for i in order if data[i] > 0]
+        # BERTopic pads the representations of topics having too few words
+        representation += [('', 0.00001)] * (top_n_words - len(representation))
+        representations.append(representation)
+    return representations
+
+
+class MergedModelBuilder:
+    """
+    A class to build merged versions of a fitted BERTopic model, without deep-copying it nor refitting it.
+
+    The term counts of the topics of the base model are computed once. Building a merged model then only sums the rows of
+    the merged topics and recomputes the c-TF-IDF of the merged topics, which makes trying several merge plans cheap.
+
+    The merged models are shallow copies of the base model: they share its embedding model, UMAP and HDBSCAN models, and
+    own their topic assignments, sizes, c-TF-IDF, representations, topic embeddings and mappings, as well as copies of the
+    vectorizer and representation models, so that updating the topics of a merged model never changes the base model. They
+    are meant to be used for analysis and visualization, not to be fitted again. Their topic representations are the top
+    c-TF-IDF words (the representation models of the base model, such as KeyBERTInspired, are not run again).
+    """
+
+    def __init__(self, bertopic_model: BERTopic, docs: List[str], doc_term_matrix: Union[csr_matrix, None] = None) -> None:
+        """
+        Parameters
+        ----------
+            bertopic_model (BERTopic): The fitted BERTopic model to merge topics from.
+            docs (list): The documents used to fit the model, in the same order.
+            doc_term_matrix (scipy.sparse.csr_matrix): The optional already computed term counts of the documents. Defaults to None.
+        """
+        self.bertopic_model = bertopic_model
+        self.docs = docs
+        self.topic_counts, self.topic_labels = topic_term_counts(bertopic_model, docs, doc_term_matrix)
+        self.words = bertopic_model.vectorizer_model.get_feature_names_out()
+        self.multiplier = seed_multiplier(bertopic_model, self.words)
+
+    @staticmethod
+    def merge_mapping(topics: Iterable[int], topics_to_merge: Union[List[List[int]], List[int], Dict[int, int]]) -> Dict[int, int]:
+        """
+        Map every topic to the topic it is merged into, following BERTopic's conventions: every group of topics is merged into its first topic.
+
+        Parameters
+        ----------
+            topics (iterable): The topics of the base model.
+            topics_to_merge (list | dict): Either a list of groups of topics to merge, a single group of topics, or a dictionary mapping a topic to the topic it is merged into.
+
+        Returns
+        -------
+            dict: A dictionary mapping every topic of the base model to the topic it is merged into.
+        """
+        mapping = {topic: topic for topic in topics}
+        if isinstance(topics_to_merge, dict):
+            mapping.update(topics_to_merge)
+        elif topics_to_merge and isinstance(topics_to_merge[0], (int, np.integer)):
+            for topic in topics_to_merge:
+                mapping[topic] = topics_to_merge[0]
+        else:
+            for topic_group in topics_to_merge:
+                for topic in topic_group:
+                    mapping[topic] = topic_group[0]
+        return mapping
+
+    def merge(self,
+              topics_to_merge: Union[List[List[int]], List[int], Dict[int, int]],
+              label_names: Union[List[str], Dict[int, str], None] = None) -> BERTopic:
+        """
+        Build a merged model.
+
+        As with BERTopic's `merge_topics`, the merged topics are renumbered by decreasing size, -1 staying the outlier topic.
+
+        Parameters
+        ----------
+            topics_to_merge (list | dict): The topics to merge (see `merge_mapping`).
+            label_names (list | dict): Optional labels for the merged topics, either a list starting with the label of topic -1 (as in `ClusteringMethod.create_merged_model`) or a dictionary mapping a merged topic to its label. Defaults to None.
+
+        Returns
+        -------
+            BERTopic: The merged model.
+        """
+        base = self.bertopic_model
+        mapping = self.merge_mapping(self.topic_labels, topics_to_merge)
+
+        # Renumber the merged topics by decreasing size, as BERTopic does
+        merged_sizes = Counter()
+        for topic, size in base.topic_sizes_.items():
+            merged_sizes[mapping[topic]] += size
+        sorted_topics = [topic for topic, _ in sorted(merged_sizes.items(), key=lambda item: -item[1]) if topic != -1]
+        renumbering = {**{-1: -1}, **{topic: new_topic for new_topic, topic in enumerate(sorted_topics)}}
+        final_mapping = {topic: renumbering[mapping[topic]] for topic in self.topic_labels}
+
+        new_labels = sorted(set(final_mapping.values()))
+        new_row = {topic: row for row, topic in enumerate(new_labels)}
+        rows = [new_row[final_mapping[topic]] for topic in self.topic_labels]
+        # A sparse (n_new_topics, n_base_topics) matrix summing the rows of the merged topics
+        merge_matrix = csr_matrix((np.ones(len(rows)), (rows, np.arange(len(rows)))), shape=(len(new_labels), len(self.topic_labels)))
+
+        # c-TF-IDF of the merged topics, with a copy of the c-TF-IDF model so that the base model is left untouched
+        merged_counts = csr_matrix(merge_matrix @ self.topic_counts)
+        ctfidf_model = copy.copy(base.ctfidf_model).fit(merged_counts, multiplier=self.multiplier)
+        c_tf_idf = csr_matrix(ctfidf_model.transform(merged_counts))
+
+        merged_model = copy.copy(base)
+        # Detach the models refitted in place by `update_topics` and `merge_topics`
+        merged_model.vectorizer_model = copy.deepcopy(base.vectorizer_model)
+        merged_model.representation_model = copy.deepcopy(base.representation_model)
+        merged_model.representative_docs_ = dict(base.representative_docs_ or {})
+        merged_model.ctfidf_model = ctfidf_model
+        merged_model.c_tf_idf_ = c_tf_idf
+        merged_model.topics_ = [final_mapping[topic] for topic in base.topics_]
+        merged_model.topic_sizes_ = Counter(merged_model.topics_)
+        merged_model.topic_representations_ = dict(zip(new_labels, top_words(c_tf_idf, self.words, base.top_n_words)))
+        merged_model.topic_aspects_ = {}
+        merged_model.custom_labels_ = None
+        # Older versions of BERTopic store the default labels instead of deriving them from the representations
+        if not isinstance(getattr(type(base), 'topic_labels_', None), property):
+            merged_model.topic_labels_ = {
+                topic: f"{topic}_" + "_".join([word[0] for word in values[:4]])
+                for topic, values in merged_model.topic_representations_.items()
+            }
+
+        # Topic embeddings: average of the embeddings of the merged topics, weighted by their sizes
+        if base.topic_embeddings_ is not None:
+            base_embeddings = np.asarray(base.topic_embeddings_)
+            weights = csr_matrix(merge_matrix.multiply(np.array([base.topic_sizes_[topic] for topic in self.topic_labels])[None, :]))
+            merged_model.topic_embeddings_ = np.asarray(weights @ base_embeddings) / np.asarray(weights.sum(axis=1))
+
+        # Representative documents: the ones of the largest topic of every merged topic
+        if base.representative_docs_:
+            largest_topic = {}
+            for topic in self.topic_labels:
+                new_topic = final_mapping[topic]
+                if new_topic not in largest_topic or base.topic_sizes_[topic] > base.topic_sizes_[largest_topic[new_topic]]:
+                    largest_topic[new_topic] = topic
+            merged_model.representative_docs_ = {new_topic: base.representative_docs_.get(topic, []) for new_topic, topic in largest_topic.items()}
+
+        # Probabilities: sum of the probabilities of the merged topics
+        if base.probabilities_ is not None and np.ndim(base.probabilities_) == 2:
+            columns = [topic for topic in self.topic_labels if topic != -1 and final_mapping[topic] != -1]
+            probability_matrix = np.zeros((base.probabilities_.shape[1], len(sorted_topics)))
+            probability_matrix[columns, [final_mapping[topic] for topic in columns]] = 1
+            merged_model.probabilities_ = np.asarray(base.probabilities_) @ probability_matrix
+
+        # Track the mapping so that `transform` assigns new documents to the merged topics
+        merged_model.topic_mapper_ = copy.deepcopy(base.topic_mapper_)
+        try:
+            merged_model.topic_mapper_.add_mappings(final_mapping, topic_model=merged_model)
+        except TypeError:
+            # Versions of BERTopic before 0.16 do not take the topic model
+            merged_model.topic_mapper_.add_mappings(final_mapping)
+
+        if label_names is not None:
+            if isinstance(label_names, dict):
+                merged_model.set_topic_labels(label_names)
+            else:
+                merged_model.set_topic_labels({i - 1: item for i, item in enumerate(label_names)})
+
+        return merged_model
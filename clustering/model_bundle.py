@@ -0,0 +1,316 @@
+import json
+import os
+import shutil
+import time
+from functools import cached_property
+from typing import List, Union
+
+import numpy as np
+from bertopic import BERTopic
+
+from scipy.sparse import csr_matrix
+
+from clustering.ann_index import IVFIndex
+from clustering.doc_term_matrix import load_doc_term_matrix, save_doc_term_matrix
+from clustering.probabilities import TopKProbabilities
+from clustering.topic_tree import TopicTree
+
+
+class ModelBundle:
+    """
+    A directory bundling a fitted BERTopic model with the data produced when fitting it.
+
+    Layout of a bundle:
+
+        manifest.json     The format version, the embedding model name and the list of the files of the bundle.
+        topic_model       The BERTopic model, saved with its own serialization ("safetensors" or "pickle").
+        embeddings.npy    The (N, dim) document embeddings.
+        topics.npy        The (N,) topic assigned to each document.
+        probs.npy         The dense topic probabilities of each document, if any (float64, float32 or float16), or
+        probs_indices.npy The top-k topics and probabilities of each document, when the probabilities are stored as
+        probs_values.npy  `TopKProbabilities`.
+        docs.json         The documents the model was fitted on, if provided.
+        topic_tree.npz    The precomputed hierarchy of the topics (see `TopicTree`), if built.
+        doc_term_matrix.npz
+                          The sparse term counts of the documents with the vectorizer of the model, if computed.
+        ann_index/        The approximate nearest neighbour index of the embeddings (see `IVFIndex`), if built.
+
+    Only the manifest is read when a bundle is opened. Every other component is loaded on first access, and the arrays are
+    opened with `mmap_mode='r'`, so that the probability matrix is only read from disk when (and where) it is touched.
+    """
+
+    FORMAT = 'wassati-bertopic-bundle'
+    VERSION = 1
+    MANIFEST = 'manifest.json'
+
+    def __init__(self, path: str) -> None:
+        """
+        Parameters
+        ----------
+            path (str): The directory of the bundle.
+        """
+        self.path = path
+        manifest_path = os.path.join(path, self.MANIFEST)
+        # A save interrupted between moving the previous bundle aside and moving the new one in left the previous one aside
+        previous_path = path.rstrip(os.sep) + '.old'
+        if not os.path.exists(path) and os.path.isfile(os.path.join(previous_path, self.MANIFEST)):
+            os.rename(previous_path, path)
+        if not os.path.isfile(manifest_path):
+            raise FileNotFoundError(f"No model bundle found at {path}: {self.MANIFEST} is missing")
+        with open(manifest_path) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format') != self.FORMAT:
+            raise ValueError(f"{path} is not a model bundle")
+        if self.manifest.get('version', 0) > self.VERSION:
+            raise ValueError(f"The bundle at {path} was written by a newer version (version {self.manifest['version']})")
+
+    @property
+    def files(self) -> dict:
+        return self.manifest['files']
+
+    def _file_path(self, key: str) -> Union[str, None]:
+        """
+        Get the absolute path of a component of the bundle, or None if the bundle does not contain it.
+        """
+        filename = self.files.get(key)
+        return os.path.join(self.path, filename) if filename is not None else None
+
+    @cached_property
+    def topic_model(self) -> BERTopic:
+        """
+        The BERTopic model, loaded with the embedding model recorded in the manifest.
+        """
+        return BERTopic.load(self._file_path('topic_model'), embedding_model=self.manifest.get('model_name'))
+
+    def load_topic_model(self, embedding_model=None) -> BERTopic:
+        """
+        Load the BERTopic model with an already loaded embedding model, instead of loading it again from its name.
+
+        Parameters
+        ----------
+            embedding_model: An optional embedding model (e.g. a SentenceTransformer). Defaults to None (use the model name recorded in the manifest).
+
+        Returns
+        -------
+            BERTopic: The BERTopic model, also cached as `topic_model`.
+        """
+        if 'topic_model' not in self.__dict__:
+            self.__dict__['topic_model'] = BERTopic.load(self._file_path('topic_model'), embedding_model=embedding_model or self.manifest.get('model_name'))
+        return self.__dict__['topic_model']
+
+    @cached_property
+    def embeddings(self) -> np.ndarray:
+        """
+        The document embeddings, memory-mapped.
+        """
+        return np.load(self._file_path('embeddings'), mmap_mode='r')
+
+    @cached_property
+    def topics(self) -> List[int]:
+        """
+        The topic assigned to each document.
+        """
+        return np.load(self._file_path('topics')).tolist()
+
+    @cached_property
+    def probs(self) -> Union[np.ndarray, TopKProbabilities, None]:
+        """
+        The topic probabilities of each document, memory-mapped, or None if the bundle has none.
+        """
+        if 'probs_indices' in self.files:
+            return TopKProbabilities(
+                np.load(self._file_path('probs_indices'), mmap_mode='r'),
+                np.load(self._file_path('probs_values'), mmap_mode='r'),
+                self.manifest['probs_n_topics']
+            )
+        probs_path = self._file_path('probs')
+        return np.load(probs_path, mmap_mode='r') if probs_path is not None else None
+
+    @cached_property
+    def docs(self) -> Union[List[str], None]:
+        """
+        The documents the model was fitted on, or None if they were not saved.
+        """
+        docs_path = self._file_path('docs')
+        if docs_path is None:
+            return None
+        with open(docs_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    @cached_property
+    def topic_tree(self) -> Union[TopicTree, None]:
+        """
+        The precomputed hierarchy of the topics, or None if the bundle has none.
+        """
+        tree_path = self._file_path('topic_tree')
+        return TopicTree.load(tree_path) if tree_path is not None else None
+
+    def _write_manifest(self) -> None:
+        """
+        Atomically rewrite the manifest after a component was added to the bundle.
+        """
+        manifest_path = os.path.join(self.path, self.MANIFEST)
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+    def add_topic_tree(self, topic_tree: TopicTree) -> None:
+        """
+        Add (or replace) the topic tree of an existing bundle.
+
+        Parameters
+        ----------
+            topic_tree (TopicTree): The topic tree of the model of the bundle.
+        """
+        self.files['topic_tree'] = 'topic_tree.npz'
+        topic_tree.save(self._file_path('topic_tree'))
+        self._write_manifest()
+        self.__dict__['topic_tree'] = topic_tree
+
+    @cached_property
+    def doc_term_matrix(self) -> Union[csr_matrix, None]:
+        """
+        The term counts of the documents, or None if the bundle has none.
+        """
+        matrix_path = self._file_path('doc_term_matrix')
+        return load_doc_term_matrix(matrix_path) if matrix_path is not None else None
+
+    def add_doc_term_matrix(self, doc_term_matrix: csr_matrix) -> None:
+        """
+        Add (or replace) the document-term matrix of an existing bundle.
+
+        Parameters
+        ----------
+            doc_term_matrix (scipy.sparse.csr_matrix): The term counts of the documents of the bundle.
+        """
+        self.files['doc_term_matrix'] = 'doc_term_matrix.npz'
+        save_doc_term_matrix(self._file_path('doc_term_matrix'), doc_term_matrix)
+        self._write_manifest()
+        self.__dict__['doc_term_matrix'] = doc_term_matrix
+
+    @cached_property
+    def ann_index(self) -> Union[IVFIndex, None]:
+        """
+        The nearest neighbour index of the embeddings, memory-mapped, or None if the bundle has none.
+        """
+        index_path = self._file_path('ann_index')
+        return IVFIndex.load(index_path) if index_path is not None else None
+
+    def add_ann_index(self, ann_index: IVFIndex) -> None:
+        """
+        Add (or replace) the nearest neighbour index of an existing bundle.
+
+        Parameters
+        ----------
+            ann_index (IVFIndex): The index of the embeddings of the bundle.
+        """
+        self.files['ann_index'] = 'ann_index'
+        ann_index.save(self._file_path('ann_index'))
+        self._write_manifest()
+        self.__dict__['ann_index'] = ann_index
+
+    @classmethod
+    def save(cls,
+             path: str,
+             topic_model: BERTopic,
+             embeddings: np.ndarray,
+             topics: List[int],
+             probs: Union[np.ndarray, TopKProbabilities, None] = None,
+             docs: Union[List[str], None] = None,
+             model_name: Union[str, None] = None,
+             serialization: str = 'safetensors',
+             topic_tree: Union[TopicTree, None] = None,
+             doc_term_matrix: Union[csr_matrix, None] = None,
+             ann_index: Union[IVFIndex, None] = None) -> 'ModelBundle':
+        """
+        Write a bundle to disk.
+
+        The bundle is first written in a temporary directory. The previous bundle at `path`, if any, is then moved aside, the new one is moved to `path`, and the previous one is deleted, so that an interrupted save never leaves a half-written bundle behind: if it is interrupted between the two moves, opening the bundle restores the previous one.
+
+        Parameters
+        ----------
+            path (str): The directory of the bundle.
+            topic_model (BERTopic): The fitted BERTopic model.
+            embeddings (numpy.ndarray): The document embeddings.
+            topics (list): The topic assigned to each document.
+            probs (numpy.ndarray | TopKProbabilities): The optional topic probabilities of each document, saved in their current storage (see `compress_probabilities`). Defaults to None.
+            docs (list): The optional documents the model was fitted on. Defaults to None.
+            model_name (str): The name of the SentenceTransformer model, saved as a reference to reload it with the topic model. Defaults to None.
+            serialization (str): The serialization of the BERTopic model, either "safetensors" (safe, small, but without the UMAP and HDBSCAN models, so that the loaded model assigns new documents to the topic with the most similar topic embedding instead of with UMAP and HDBSCAN) or "pickle". Defaults to "safetensors".
+            topic_tree (TopicTree): The optional precomputed hierarchy of the topics. Defaults to None.
+            doc_term_matrix (scipy.sparse.csr_matrix): The optional term counts of the documents. Defaults to None.
+            ann_index (IVFIndex): The optional nearest neighbour index of the embeddings. Defaults to None.
+
+        Returns
+        -------
+            ModelBundle: The saved bundle.
+        """
+        if serialization not in ('safetensors', 'pickle'):
+            raise ValueError("Invalid serialization. Must be either 'safetensors' or 'pickle'.")
+
+        tmp_path = path.rstrip(os.sep) + '.tmp'
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+
+        files = {'topic_model': 'topic_model', 'embeddings': 'embeddings.npy', 'topics': 'topics.npy'}
+        if serialization == 'safetensors':
+            topic_model.save(os.path.join(tmp_path, files['topic_model']), serialization='safetensors', save_ctfidf=True, save_embedding_model=model_name)
+        else:
+            topic_model.save(os.path.join(tmp_path, files['topic_model']), serialization='pickle', save_embedding_model=False)
+
+        embeddings = np.asarray(embeddings)
+        np.save(os.path.join(tmp_path, files['embeddings']), embeddings)
+        np.save(os.path.join(tmp_path, files['topics']), np.asarray(topics, dtype=np.int64))
+        probs_storage = None
+        if isinstance(probs, TopKProbabilities):
+            probs_storage = 'topk'
+            files['probs_indices'] = 'probs_indices.npy'
+            files['probs_values'] = 'probs_values.npy'
+            np.save(os.path.join(tmp_path, files['probs_indices']), np.asarray(probs.indices))
+            np.save(os.path.join(tmp_path, files['probs_values']), np.asarray(probs.values))
+        elif probs is not None:
+            probs = np.asarray(probs)
+            probs_storage = probs.dtype.name
+            files['probs'] = 'probs.npy'
+            np.save(os.path.join(tmp_path, files['probs']), probs)
+        if docs is not None:
+            files['docs'] = 'docs.json'
+            with open(os.path.join(tmp_path, files['docs']), 'w', encoding='utf-8') as f:
+                json.dump(list(docs), f, ensure_ascii=False)
+        if topic_tree is not None:
+            files['topic_tree'] = 'topic_tree.npz'
+            topic_tree.save(os.path.join(tmp_path, files['topic_tree']))
+        if doc_term_matrix is not None:
+            files['doc_term_matrix'] = 'doc_term_matrix.npz'
+            save_doc_term_matrix(os.path.join(tmp_path, files['doc_term_matrix']), doc_term_matrix)
+        if ann_index is not None:
+            files['ann_index'] = 'ann_index'
+            ann_index.save(os.path.join(tmp_path, files['ann_index']))
+
+        manifest = {
+            'format': cls.FORMAT,
+            'version': cls.VERSION,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'model_name': model_name,
+            'serialization': serialization,
+            'n_documents': len(topics),
+            'n_topics': len(set(topics) - {-1}),
+            'embedding_dim': int(embeddings.shape[1]),
+            'probs_storage': probs_storage,
+            'probs_n_topics': int(probs.shape[1]) if probs is not None and probs.ndim == 2 else None,
+            'files': files,
+        }
+        with open(os.path.join(tmp_path, cls.MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        previous_path = path.rstrip(os.sep) + '.old'
+        if os.path.exists(previous_path):
+            shutil.rmtree(previous_path)
+        if os.path.exists(path):
+            os.rename(path, previous_path)
+        os.rename(tmp_path, path)
+        if os.path.exists(previous_path):
+            shutil.rmtree(previous_path)
+
+        return cls(path)
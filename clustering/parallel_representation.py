@@ -0,0 +1,138 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Mapping, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from bertopic.representation import BaseRepresentation
+from scipy.sparse import csr_matrix
+
+
+class _CachedEmbeddingsModel:
+    """
+    A proxy of a BERTopic model given to the representation models, which serves `_extract_embeddings` from a shared cache.
+
+    The embeddings of the documents the model was fitted on are read from their precomputed embeddings, and the embeddings of the other texts (candidate words, joined topic words) are computed once and shared by all the topics and all the representation models of the chain.
+    """
+
+    def __init__(self, topic_model, docs: Union[List[str], None] = None, embeddings: Union[np.ndarray, None] = None) -> None:
+        self._topic_model = topic_model
+        self._doc_rows = {doc: row for row, doc in enumerate(docs)} if docs is not None and embeddings is not None else {}
+        self._doc_embeddings = embeddings
+        self._cache: Dict[Tuple[str, str], np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self._topic_model, name)
+
+    def prefetch(self, texts: List[str], method: str = 'word') -> None:
+        """
+        Embed texts in one batch and keep their embeddings in the cache.
+        """
+        with self._lock:
+            missing = list(dict.fromkeys(text for text in texts if (method, text) not in self._cache))
+        if missing:
+            embeddings = self._topic_model._extract_embeddings(missing, method=method, verbose=False)
+            with self._lock:
+                self._cache.update({(method, text): embedding for text, embedding in zip(missing, embeddings)})
+
+    def _extract_embeddings(self, documents, images=None, method: str = 'document', verbose=None) -> np.ndarray:
+        if images is not None:
+            return self._topic_model._extract_embeddings(documents, images=images, method=method, verbose=verbose)
+        if isinstance(documents, str):
+            documents = [documents]
+        if method == 'document':
+            # The documents the model was fitted on already have their embeddings
+            known = [text for text in documents if text in self._doc_rows]
+            with self._lock:
+                for text in known:
+                    self._cache.setdefault((method, text), np.asarray(self._doc_embeddings[self._doc_rows[text]]))
+        self.prefetch(documents, method=method)
+        with self._lock:
+            return np.vstack([self._cache[(method, text)] for text in documents])
+
+
+class ParallelRepresentation(BaseRepresentation):
+    """
+    Run a chain of representation models (e.g. `[KeyBERTInspired(), MaximalMarginalRelevance(diversity=0.3)]`) topic by topic in a pool of threads.
+
+    Every topic is processed as its own task, with the documents, c-TF-IDF row and candidate words of that topic only, so that the representation of a topic does not depend on the other topics nor on the number of workers. Note that the random sampling of candidate documents of KeyBERTInspired is then seeded per topic, so that the representations may differ slightly from the ones of BERTopic's sequential loop (but not between runs).
+
+    The embeddings of the candidate words of all the topics are computed in one batch before the tasks start, and shared with a cache by all the topics and all the models of the chain (MaximalMarginalRelevance reuses the word embeddings computed for KeyBERTInspired). The representative documents use the precomputed document embeddings when they are given.
+    """
+
+    def __init__(self,
+                 representation_models,
+                 n_jobs: int = 4,
+                 docs: Union[List[str], None] = None,
+                 embeddings: Union[np.ndarray, None] = None,
+                 nr_candidate_words: int = 30) -> None:
+        """
+        Parameters
+        ----------
+            representation_models (BaseRepresentation | list): The representation model or the chain of representation models to run.
+            n_jobs (int): The number of worker threads. Defaults to 4.
+            docs (list): The documents the model is fitted on, to reuse their embeddings. Defaults to None.
+            embeddings (numpy.ndarray): The embeddings of `docs`. Defaults to None.
+            nr_candidate_words (int): The minimum number of top c-TF-IDF words per topic embedded in the first batch, raised to the `nr_candidate_words` of the representation models (e.g. 100 for KeyBERTInspired). Defaults to 30.
+        """
+        self.representation_models = representation_models if isinstance(representation_models, list) else [representation_models]
+        self.n_jobs = n_jobs
+        self.docs = docs
+        self.embeddings = embeddings
+        self.nr_candidate_words = nr_candidate_words
+
+    def __getstate__(self) -> dict:
+        # Do not pickle the documents and embeddings with the BERTopic model
+        state = self.__dict__.copy()
+        state['docs'] = None
+        state['embeddings'] = None
+        return state
+
+    def _extract_topic(self, topic_model: _CachedEmbeddingsModel, documents: pd.DataFrame, c_tf_idf: csr_matrix, topics: Mapping) -> Mapping:
+        for representation_model in self.representation_models:
+            topics = representation_model.extract_topics(topic_model, documents, c_tf_idf, topics)
+        return topics
+
+    def extract_topics(self, topic_model, documents: pd.DataFrame, c_tf_idf: csr_matrix, topics: Mapping[str, List[Tuple[str, float]]]) -> Mapping[str, List[Tuple[str, float]]]:
+        """
+        Extract the representations of all the topics.
+
+        Parameters
+        ----------
+            topic_model (BERTopic): The BERTopic model.
+            documents (DataFrame): The documents with their topics.
+            c_tf_idf (scipy.sparse.csr_matrix): The c-TF-IDF of the topics, one row per topic in the order of the sorted keys of `topics`.
+            topics (dict): The candidate words of every topic, as computed from the c-TF-IDF.
+
+        Returns
+        -------
+            dict: The updated representations, in the order of `topics`.
+        """
+        proxy = _CachedEmbeddingsModel(topic_model, self.docs, self.embeddings)
+        c_tf_idf = csr_matrix(c_tf_idf)
+        labels = sorted(topics.keys())
+
+        # Embed the candidate words of every topic in one batch
+        words = topic_model.vectorizer_model.get_feature_names_out()
+        nr_candidate_words = max([self.nr_candidate_words] + [getattr(model, 'nr_candidate_words', 0) for model in self.representation_models])
+        candidates = []
+        for row in range(len(labels)):
+            start, end = c_tf_idf.indptr[row], c_tf_idf.indptr[row + 1]
+            order = np.argsort(-c_tf_idf.data[start:end], kind='stable')[:nr_candidate_words]
+            candidates.extend(words[c_tf_idf.indices[start:end][order]])
+        proxy.prefetch(candidates + [word for values in topics.values() for word, _ in values if word], method='document')
+        proxy.prefetch([word for values in topics.values() for word, _ in values if word], method='word')
+
+        rows_per_topic = documents.groupby('Topic').indices
+        with ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
+            futures = [
+                executor.submit(self._extract_topic, proxy, documents.iloc[rows_per_topic.get(topic, [])], c_tf_idf[index:index + 1], {topic: topics[topic]})
+                for index, topic in enumerate(labels)
+            ]
+            results = [future.result() for future in futures]
+
+        updated_topics = {}
+        for result in results:
+            updated_topics.update(result)
+        return {topic: updated_topics[topic] for topic in topics}
@@ -0,0 +1,178 @@
+from typing import Union
+
+import numpy as np
+
+
+PROBS_STORAGES = ('float64', 'float32', 'float16', 'topk')
+
+
+class TopKProbabilities:
+    """
+    A compact representation of an (N, K) matrix of topic probabilities, keeping only the `k` highest probabilities of each document.
+
+    Attributes
+    ----------
+        indices (numpy.ndarray): A (N, k) int16/int32 array with the topics of the `k` highest probabilities of each document, sorted by decreasing probability.
+        values (numpy.ndarray): A (N, k) array with the corresponding probabilities.
+        n_topics (int): The number of columns K of the dense matrix.
+    """
+
+    ndim = 2
+
+    def __init__(self, indices: np.ndarray, values: np.ndarray, n_topics: int) -> None:
+        self.indices = indices
+        self.values = values
+        self.n_topics = n_topics
+
+    @property
+    def shape(self) -> tuple:
+        return (self.indices.shape[0], self.n_topics)
+
+    @property
+    def k(self) -> int:
+        return self.indices.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return self.indices.nbytes + self.values.nbytes
+
+    def __len__(self) -> int:
+        return self.indices.shape[0]
+
+    @classmethod
+    def from_dense(cls, probs: np.ndarray, k: int = 5, dtype=np.float16, block_size: int = 65536) -> 'TopKProbabilities':
+        """
+        Build the top-k representation of a dense probability matrix.
+
+        Parameters
+        ----------
+            probs (numpy.ndarray): The (N, K) dense matrix of probabilities, possibly memory-mapped.
+            k (int): The number of probabilities to keep for each document. Defaults to 5.
+            dtype: The dtype of the kept probabilities. Defaults to numpy.float16.
+            block_size (int): The number of rows processed at once, bounding the memory used by the conversion. Defaults to 65536.
+
+        Returns
+        -------
+            TopKProbabilities: The compact representation.
+        """
+        n_docs, n_topics = probs.shape
+        k = min(k, n_topics)
+        index_dtype = np.int16 if n_topics <= np.iinfo(np.int16).max else np.int32
+        indices = np.empty((n_docs, k), dtype=index_dtype)
+        values = np.empty((n_docs, k), dtype=dtype)
+        for start in range(0, n_docs, block_size):
+            block = np.asarray(probs[start:start + block_size])
+            # Select the k best columns without sorting the whole row, then sort only those
+            candidates = np.argpartition(-block, k - 1, axis=1)[:, :k]
+            candidate_values = np.take_along_axis(block, candidates, axis=1)
+            order = np.argsort(-candidate_values, axis=1, kind='stable')
+            indices[start:start + len(block)] = np.take_along_axis(candidates, order, axis=1)
+            values[start:start + len(block)] = np.take_along_axis(candidate_values, order, axis=1)
+        return cls(indices, values, n_topics)
+
+    def column(self, topic: int) -> np.ndarray:
+        """
+        Get the probabilities of a topic for every document, 0 where the topic is not among the top-k of the document.
+
+        Parameters
+        ----------
+            topic (int): The topic (column) number.
+
+        Returns
+        -------
+            numpy.ndarray: A (N,) float32 array.
+        """
+        mask = np.asarray(self.indices) == topic
+        column = np.zeros(len(self), dtype=np.float32)
+        rows, positions = np.nonzero(mask)
+        column[rows] = np.asarray(self.values)[rows, positions]
+        return column
+
+    def toarray(self, dtype=np.float32) -> np.ndarray:
+        """
+        Convert back to a dense (N, K) matrix, with 0 outside of the top-k probabilities.
+        """
+        dense = np.zeros(self.shape, dtype=dtype)
+        np.put_along_axis(dense, np.asarray(self.indices, dtype=np.int64), np.asarray(self.values, dtype=dtype), axis=1)
+        return dense
+
+    def __getitem__(self, key):
+        """
+        Support the two ways the probability matrix is indexed: `probs[rows]` (returns the selected rows as a TopKProbabilities) and `probs[rows, topic]` (returns the probabilities of a topic).
+        """
+        if isinstance(key, tuple):
+            rows, topic = key
+            return self.column(topic)[rows]
+        return TopKProbabilities(self.indices[key], self.values[key], self.n_topics)
+
+
+def compress_probabilities(probs: np.ndarray, storage: str = 'float32', top_k: int = 5) -> Union[np.ndarray, TopKProbabilities, None]:
+    """
+    Convert a dense matrix of topic probabilities to a more compact storage.
+
+    Parameters
+    ----------
+        probs (numpy.ndarray): The (N, K) dense probabilities returned by BERTopic, or a (N,) vector when the model does not calculate all probabilities.
+        storage (str): One of 'float64', 'float32', 'float16' (dense matrix with that dtype) or 'topk' (`TopKProbabilities` keeping the `top_k` highest float16 probabilities of each document). Defaults to 'float32'.
+        top_k (int): The number of probabilities kept per document with the 'topk' storage. Defaults to 5.
+
+    Returns
+    -------
+        numpy.ndarray | TopKProbabilities: The compressed probabilities (vectors and None are returned unchanged apart from the dtype).
+    """
+    if storage not in PROBS_STORAGES:
+        raise ValueError(f"Invalid storage. Must be one of {PROBS_STORAGES}.")
+    if probs is None or isinstance(probs, TopKProbabilities):
+        return probs
+    if storage == 'topk':
+        if np.ndim(probs) == 1:
+            return np.asarray(probs, dtype=np.float16)
+        return TopKProbabilities.from_dense(probs, k=top_k)
+    return np.asarray(probs, dtype=storage)
+
+
+def topic_column(probs: Union[np.ndarray, TopKProbabilities], topic: int) -> np.ndarray:
+    """
+    Get the probabilities of a topic for every document, whatever the storage of the probabilities.
+
+    Parameters
+    ----------
+        probs (numpy.ndarray | TopKProbabilities): The probability matrix.
+        topic (int): The topic (column) number.
+
+    Returns
+    -------
+        numpy.ndarray: A (N,) array.
+    """
+    if isinstance(probs, TopKProbabilities):
+        return probs.column(topic)
+    return np.asarray(probs[:, topic])
+
+
+def top_two_margin(probs: Union[np.ndarray, TopKProbabilities], block_size: int = 65536) -> np.ndarray:
+    """
+    Compute, for every document, the difference between its highest and second highest topic probabilities.
+
+    Parameters
+    ----------
+        probs (numpy.ndarray | TopKProbabilities): The probability matrix.
+        block_size (int): The number of rows of a dense matrix processed at once. Defaults to 65536.
+
+    Returns
+    -------
+        numpy.ndarray: A (N,) float32 array.
+    """
+    if isinstance(probs, TopKProbabilities):
+        values = np.asarray(probs.values, dtype=np.float32)
+        return values[:, 0] - values[:, 1] if probs.k > 1 else values[:, 0]
+
+    margins = np.empty(len(probs), dtype=np.float32)
+    for start in range(0, len(probs), block_size):
+        block = np.asarray(probs[start:start + block_size], dtype=np.float32)
+        if block.shape[1] < 2:
+            margins[start:start + len(block)] = block[:, 0]
+            continue
+        # The two highest probabilities of each row, without sorting the whole row
+        top_two = -np.partition(-block, 1, axis=1)[:, :2]
+        margins[start:start + len(block)] = top_two[:, 0] - top_two[:, 1]
+    return margins
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import pickle
+from typing import Union
+
+import numpy as np
+
+
+def array_hash(array: np.ndarray) -> str:
+    """
+    Compute a hash of the content, shape and dtype of an array.
+
+    Parameters
+    ----------
+        array (numpy.ndarray): The array to hash.
+
+    Returns
+    -------
+        str: The hexadecimal SHA-1 digest of the array.
+    """
+    array = np.ascontiguousarray(array)
+    digest = hashlib.sha1(f'{array.dtype.str}{array.shape}'.encode('utf-8'))
+    digest.update(array.view(np.uint8).reshape(-1))
+    return digest.hexdigest()
+
+
+def params_hash(params: dict) -> str:
+    """
+    Compute a hash of the parameters of an estimator.
+
+    Parameters
+    ----------
+        params (dict): The parameters, as returned by `get_params()`.
+
+    Returns
+    -------
+        str: The hexadecimal SHA-1 digest of the sorted parameters.
+    """
+    return hashlib.sha1(json.dumps(params, sort_keys=True, default=repr).encode('utf-8')).hexdigest()
+
+
+class CachedUMAP:
+    """
+    A dimensionality reduction model which caches its reduced embeddings on disk, to be passed to BERTopic as `umap_model`.
+
+    BERTopic calls `fit(embeddings, y)` then `transform(embeddings)` on its `umap_model`. The reduced embeddings are cached
+    under a key made of the hash of the embeddings, of `y` (used by guided topic modeling) and of the parameters of the
+    wrapped model. When the key is already in the cache, `fit` does nothing and `transform` returns the cached reduced
+    embeddings, so that BERTopic goes straight to the clustering step. Changing the clustering parameters (such as
+    `min_topic_size`) therefore no longer recomputes UMAP.
+
+    The fitted model itself is also cached, and only loaded when new documents have to be transformed.
+    """
+
+    def __init__(self, umap_model, cache_dir: str) -> None:
+        """
+        Parameters
+        ----------
+            umap_model: The dimensionality reduction model to wrap (UMAP by default in BERTopic). It must implement `fit`, `transform` and `get_params`.
+            cache_dir (str): The directory where the reduced embeddings are cached.
+        """
+        self.umap_model = umap_model
+        self.cache_dir = cache_dir
+        self.key = None
+        self.embedding_ = None
+        self._fitted_hash = None
+        self._model_loaded = False
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get_params(self, deep: bool = True) -> dict:
+        return self.umap_model.get_params(deep=deep)
+
+    def _cache_key(self, X_hash: str, y: Union[np.ndarray, None]) -> str:
+        """
+        Build the cache key of a fit from the hash of the embeddings, the optional labels and the parameters of the wrapped model.
+        """
+        y_hash = array_hash(np.asarray(y)) if y is not None else 'none'
+        key = f'{X_hash}{y_hash}{params_hash(self.umap_model.get_params())}'
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _paths(self, key: str):
+        return os.path.join(self.cache_dir, f'{key}.npy'), os.path.join(self.cache_dir, f'{key}.pkl')
+
+    def fit(self, X: np.ndarray, y: Union[np.ndarray, None] = None) -> 'CachedUMAP':
+        """
+        Fit the wrapped model, unless the reduced embeddings of `X` with the same parameters are already cached.
+
+        Parameters
+        ----------
+            X (numpy.ndarray): The embeddings to reduce.
+            y (numpy.ndarray): Optional labels, as passed by BERTopic for guided and supervised topic modeling. Defaults to None.
+
+        Returns
+        -------
+            CachedUMAP: The fitted model.
+        """
+        self._fitted_hash = array_hash(X)
+        self.key = self._cache_key(self._fitted_hash, y)
+        embedding_path, model_path = self._paths(self.key)
+
+        if os.path.exists(embedding_path) and os.path.exists(model_path):
+            self.embedding_ = np.load(embedding_path)
+            self._model_loaded = False
+            return self
+
+        # Cache miss: fit the wrapped model and store both the reduced embeddings and the fitted model
+        if y is not None:
+            self.umap_model.fit(X, y=y)
+        else:
+            self.umap_model.fit(X)
+        self._model_loaded = True
+        # UMAP keeps the reduced training embeddings, other models have to transform them
+        embedding = getattr(self.umap_model, 'embedding_', None)
+        self.embedding_ = np.asarray(embedding if embedding is not None else self.umap_model.transform(X))
+
+        # Write to temporary files first, so that concurrent runs never read a partially written entry
+        tmp_suffix = f'.{os.getpid()}.tmp'
+        with open(model_path + tmp_suffix, 'wb') as f:
+            pickle.dump(self.umap_model, f)
+        with open(embedding_path + tmp_suffix, 'wb') as f:
+            np.save(f, self.embedding_)
+        os.replace(model_path + tmp_suffix, model_path)
+        os.replace(embedding_path + tmp_suffix, embedding_path)
+
+        return self
+
+    def _load_model(self) -> None:
+        """
+        Load the fitted model from the cache if the fit was a cache hit.
+        """
+        if not self._model_loaded:
+            _, model_path = self._paths(self.key)
+            with open(model_path, 'rb') as f:
+                self.umap_model = pickle.load(f)
+            self._model_loaded = True
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        """
+        Reduce embeddings. The embeddings the model was fitted on are served from the cache, other embeddings are transformed by the fitted model.
+
+        Parameters
+        ----------
+            X (numpy.ndarray): The embeddings to reduce.
+
+        Returns
+        -------
+            numpy.ndarray: The reduced embeddings.
+        """
+        if self.embedding_ is not None and len(X) == len(self.embedding_) and array_hash(X) == self._fitted_hash:
+            return self.embedding_
+
+        # New documents: the fitted model is needed
+        self._load_model()
+        return self.umap_model.transform(X)
+
+    def fit_transform(self, X: np.ndarray, y: Union[np.ndarray, None] = None) -> np.ndarray:
+        return self.fit(X, y=y).transform(X)
+
+    def __getstate__(self) -> dict:
+        # When pickled with the BERTopic model, keep the fitted model but not the cached reduced embeddings
+        if self.key is not None:
+            self._load_model()
+        state = self.__dict__.copy()
+        state['embedding_'] = None
+        state['_fitted_hash'] = None
+        return state
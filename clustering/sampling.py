@@ -0,0 +1,56 @@
+from typing import List, Union
+
+import numpy as np
+from pandas import DataFrame
+
+
+def stratified_sample_indices(df: DataFrame, sample_size: Union[int, float], strata: Union[List[str], None] = None, random_state: int = 42) -> np.ndarray:
+    """
+    Draw a sample of the rows of a DataFrame, keeping the proportion of every stratum (e.g. every year and zone).
+
+    The size of the sample of every stratum is proportional to the size of the stratum (largest remainder rounding), and every non-empty stratum keeps at least one row, so that small strata are still represented. The sample never exceeds `sample_size`: the rows given to the small strata are taken from the strata the most above their share, and if there are more strata than rows to sample, only the largest strata are represented.
+
+    Parameters
+    ----------
+        df (DataFrame): The DataFrame to sample.
+        sample_size (int | float): The number of rows to sample, or the fraction of the rows if it is a float between 0 and 1 (1.0 being all the rows).
+        strata (list): The columns defining the strata. Defaults to None (simple random sample).
+        random_state (int): The seed of the random generator. Defaults to 42.
+
+    Returns
+    -------
+        numpy.ndarray: The sorted positions of the sampled rows.
+    """
+    if sample_size <= 0:
+        raise ValueError("The sample size must be positive")
+    n_rows = len(df)
+    if isinstance(sample_size, float) and sample_size <= 1:
+        sample_size = int(round(sample_size * n_rows))
+    sample_size = min(int(sample_size), n_rows)
+    rng = np.random.default_rng(random_state)
+
+    if not strata:
+        return np.sort(rng.choice(n_rows, size=sample_size, replace=False))
+
+    # Position of the rows of every stratum
+    groups = df.groupby(list(strata), sort=True, dropna=False).indices
+    positions = list(groups.values())
+    sizes = np.array([len(rows) for rows in positions])
+
+    # Proportional allocation, with at least one row per stratum when the sample is large enough for it
+    quotas = sizes * sample_size / n_rows
+    minimum = 1 if len(sizes) <= sample_size else 0
+    allocation = np.maximum(np.floor(quotas).astype(int), minimum)
+    # Take back the rows given beyond the sample size from the strata the most above their quota
+    while allocation.sum() > sample_size:
+        excess = np.where(allocation > minimum, allocation - quotas, -np.inf)
+        allocation[np.argmax(excess)] -= 1
+    # Largest remainder rounding
+    for stratum in np.argsort(-(quotas - allocation), kind='stable'):
+        if allocation.sum() >= sample_size:
+            break
+        if allocation[stratum] < sizes[stratum]:
+            allocation[stratum] += 1
+
+    sampled = [rng.choice(rows, size=size, replace=False) for rows, size in zip(positions, allocation)]
+    return np.sort(np.concatenate(sampled))
@@ -0,0 +1,247 @@
+import itertools
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Union
+
+import numpy as np
+from pandas import DataFrame
+
+from clustering.clustering import ClusteringMethod
+
+
+def topic_coherence(topic_words: Dict[int, List[str]], doc_term_matrix, vocabulary: Dict[str, int]) -> float:
+    """
+    Compute the mean NPMI coherence of the topics, using the co-occurrence of their words in the documents.
+
+    Parameters
+    ----------
+        topic_words (dict): A dictionary where the keys are the topic numbers and the values are their top words.
+        doc_term_matrix (scipy.sparse.csr_matrix): The document-term matrix of the documents, as computed by the vectorizer of the BERTopic model.
+        vocabulary (dict): The vocabulary of the vectorizer, mapping each word to its column in `doc_term_matrix`.
+
+    Returns
+    -------
+        float: The mean NPMI over all pairs of words of every topic, between -1 and 1 (NaN if no topic has two words in the vocabulary).
+    """
+    n_docs = doc_term_matrix.shape[0]
+    binary = (doc_term_matrix > 0).astype(np.float64).tocsc()
+    scores = []
+    for words in topic_words.values():
+        indices = [vocabulary[word] for word in words if word in vocabulary]
+        if len(indices) < 2:
+            continue
+        columns = binary[:, indices]
+        # Document frequency of every pair of words, the diagonal being the document frequency of every word
+        co_occurrences = (columns.T @ columns).toarray() / n_docs
+        word_probs = np.diag(co_occurrences)
+        rows, cols = np.triu_indices(len(indices), k=1)
+        joint = co_occurrences[rows, cols]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            npmi = np.log(joint / (word_probs[rows] * word_probs[cols])) / -np.log(joint)
+        # Words which never co-occur get the minimum NPMI, words which always co-occur the maximum one
+        npmi[joint == 0] = -1.0
+        npmi[joint == 1] = 1.0
+        scores.append(np.nanmean(npmi))
+    return float(np.mean(scores)) if scores else float('nan')
+
+
+def topic_diversity(topic_words: Dict[int, List[str]]) -> float:
+    """
+    Compute the diversity of the topics, i.e. the proportion of unique words among the top words of all topics.
+
+    Parameters
+    ----------
+        topic_words (dict): A dictionary where the keys are the topic numbers and the values are their top words.
+
+    Returns
+    -------
+        float: The topic diversity, between 0 (all topics share the same words) and 1 (no word is shared).
+    """
+    all_words = [word for words in topic_words.values() for word in words]
+    return len(set(all_words)) / len(all_words) if all_words else float('nan')
+
+
+def _evaluate_configuration(model_name: str, cache_dir: str, docs: List[str], bertopic_kwargs: dict) -> dict:
+    """
+    Fit BERTopic with one configuration and compute its metrics. Run in a worker process.
+    """
+    start = time.perf_counter()
+    clustering = ClusteringMethod(model_name, cache_dir=cache_dir)
+    topics, _, topic_model, _ = clustering.run_bertopic(DataFrame({'processed_data': docs}), **bertopic_kwargs)
+    wall_time = time.perf_counter() - start
+
+    topics = np.asarray(topics)
+    topic_words = {topic: [word for word, _ in topic_model.get_topic(topic)] for topic in set(topics.tolist()) if topic != -1}
+    doc_term_matrix = topic_model.vectorizer_model.transform(docs)
+
+    return {
+        'n_topics': len(topic_words),
+        'outlier_ratio': float(np.mean(topics == -1)),
+        'coherence_npmi': topic_coherence(topic_words, doc_term_matrix, topic_model.vectorizer_model.vocabulary_),
+        'diversity': topic_diversity(topic_words),
+        'wall_time_s': wall_time,
+        # ru_maxrss is in kilobytes on Linux; each worker process only runs one configuration
+        'peak_memory_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def _evaluate_sample_size(model_name: str, cache_dir: str, df: DataFrame, sample_size: Union[int, float], strata: Union[List[str], None], bertopic_kwargs: dict) -> dict:
+    """
+    Fit BERTopic on a stratified sample and assign the rest of the documents. Run in a worker process.
+    """
+    clustering = ClusteringMethod(model_name, cache_dir=cache_dir)
+    topics, _, _, _ = clustering.run_bertopic_sampled(df, sample_size, strata=strata, **bertopic_kwargs)
+    report = dict(clustering.sampling_report)
+    report['strata'] = ",".join(report['strata'])
+    report['n_topics'] = len(set(topics) - {-1})
+    report['outlier_ratio'] = float(np.mean(np.asarray(topics) == -1))
+    return report
+
+
+def sample_size_tradeoff(model_name: str,
+                         cache_dir: str,
+                         df: DataFrame,
+                         sample_sizes: List[Union[int, float]],
+                         strata: Union[List[str], None] = ('year', 'Zone'),
+                         bertopic_kwargs: Union[dict, None] = None,
+                         n_jobs: int = 1) -> DataFrame:
+    """
+    Compare the cost of `ClusteringMethod.run_bertopic_sampled` for several sample sizes.
+
+    Every sample size runs in its own process, so that the reported peak memory is the one of that run only. The embeddings are computed once beforehand and read from the cache by every run, so that the reported times are the ones of the fit and of the assignment. Keep `n_jobs` to 1 to avoid the runs competing for the CPU.
+
+    Parameters
+    ----------
+        model_name (str): The name of the SentenceTransformer model used to embed the documents.
+        cache_dir (str): The cache directory of `ClusteringMethod`.
+        df (DataFrame): A DataFrame containing the input documents in the "processed_data" column, and the strata columns.
+        sample_sizes (list): The sample sizes to try (numbers of documents, or fractions if they are floats between 0 and 1).
+        strata (list): The columns the samples are stratified by. Defaults to ('year', 'Zone').
+        bertopic_kwargs (dict): Optional BERTopic keyword arguments. Defaults to None.
+        n_jobs (int): The number of worker processes. Defaults to 1.
+
+    Returns
+    -------
+        DataFrame: A DataFrame with one row per sample size, with the 'sample_size', 'sample_fraction', 'fit_time_s', 'assign_time_s', 'wall_time_s', 'peak_memory_mb', 'n_topics' and 'outlier_ratio' columns, plus an 'error' column for the runs which failed.
+    """
+    bertopic_kwargs = bertopic_kwargs if bertopic_kwargs is not None else {}
+    ClusteringMethod(model_name, cache_dir=cache_dir).encode(df["processed_data"].astype(str).tolist(), show_progress_bar=True)
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=n_jobs, max_tasks_per_child=1) as executor:
+        futures = {
+            executor.submit(_evaluate_sample_size, model_name, cache_dir, df, sample_size, strata, bertopic_kwargs): i
+            for i, sample_size in enumerate(sample_sizes)
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as error:
+                results[i] = {'requested_sample_size': sample_sizes[i], 'error': repr(error)}
+
+    return DataFrame([results[i] for i in range(len(sample_sizes))])
+
+
+class BertopicSweep:
+    """
+    A class to evaluate a grid of BERTopic configurations in parallel worker processes.
+
+    The embeddings are computed once in the main process and stored in the embedding cache of `ClusteringMethod`, and every
+    worker reuses them, as well as the UMAP-reduced embeddings cached by the configurations sharing the same UMAP settings.
+    """
+
+    # Parameters which change the input of UMAP: configurations sharing them share the cached reduced embeddings
+    UMAP_PARAMETERS = ('umap_model', 'seed_topic_list', 'low_memory')
+
+    def __init__(self, model_name: str, cache_dir: str, base_kwargs: Union[dict, None] = None, n_jobs: int = 2) -> None:
+        """
+        Parameters
+        ----------
+            model_name (str): The name of the SentenceTransformer model used to embed the documents.
+            cache_dir (str): The cache directory of `ClusteringMethod`, shared by all the workers.
+            base_kwargs (dict): Optional BERTopic keyword arguments common to all configurations (e.g. `bertopic_kwargs` from utils/schneider.py). Defaults to None.
+            n_jobs (int): The number of worker processes. Defaults to 2.
+        """
+        self.model_name = model_name
+        self.cache_dir = cache_dir
+        self.base_kwargs = base_kwargs if base_kwargs is not None else {}
+        self.n_jobs = n_jobs
+
+    @staticmethod
+    def expand_grid(param_grid: Union[Dict[str, list], List[dict]]) -> List[dict]:
+        """
+        Expand a parameter grid into the list of configurations to evaluate.
+
+        Parameters
+        ----------
+            param_grid (dict | list): Either a dictionary mapping each BERTopic parameter to the list of its values to try (every combination is evaluated), or an explicit list of configurations.
+
+        Returns
+        -------
+            list: A list of dictionaries of BERTopic keyword arguments overriding `base_kwargs`.
+        """
+        if isinstance(param_grid, list):
+            return [dict(configuration) for configuration in param_grid]
+        names = list(param_grid.keys())
+        return [dict(zip(names, values)) for values in itertools.product(*param_grid.values())]
+
+    def _umap_group(self, configuration: dict) -> str:
+        """
+        Identify the configurations which will produce the same reduced embeddings.
+        """
+        kwargs = {**self.base_kwargs, **configuration}
+        return repr([kwargs.get(name) for name in self.UMAP_PARAMETERS])
+
+    def run(self, df: DataFrame, param_grid: Union[Dict[str, list], List[dict]]) -> DataFrame:
+        """
+        Evaluate every configuration of the grid and gather their metrics.
+
+        The first configuration of every group sharing the same UMAP settings runs first, so that the other configurations of the group find the reduced embeddings in the cache instead of computing them concurrently.
+
+        Parameters
+        ----------
+            df (DataFrame): A DataFrame containing the input documents in the "processed_data" column.
+            param_grid (dict | list): The configurations to evaluate (see `expand_grid`).
+
+        Returns
+        -------
+            DataFrame: A DataFrame with one row per configuration, with the overridden parameters and the 'n_topics', 'outlier_ratio', 'coherence_npmi', 'diversity', 'wall_time_s' and 'peak_memory_mb' metrics, plus an 'error' column for the configurations which failed.
+        """
+        docs = df["processed_data"].astype(str).tolist()
+        configurations = self.expand_grid(param_grid)
+
+        # Compute the embeddings once, the workers read them from the cache
+        ClusteringMethod(self.model_name, cache_dir=self.cache_dir).encode(docs, show_progress_bar=True)
+
+        # Split the configurations in two waves: one per UMAP group first, then the others
+        first_wave, second_wave, seen_groups = [], [], set()
+        for i, configuration in enumerate(configurations):
+            group = self._umap_group(configuration)
+            (second_wave if group in seen_groups else first_wave).append(i)
+            seen_groups.add(group)
+
+        results = {}
+        # One configuration per process, so that the peak memory of a worker is the one of its configuration
+        with ProcessPoolExecutor(max_workers=self.n_jobs, max_tasks_per_child=1) as executor:
+            for wave in (first_wave, second_wave):
+                futures = {
+                    executor.submit(_evaluate_configuration, self.model_name, self.cache_dir, docs, {**self.base_kwargs, **configurations[i]}): i
+                    for i in wave
+                }
+                for future in as_completed(futures):
+                    i = futures[future]
+                    try:
+                        results[i] = future.result()
+                    except Exception as error:
+                        results[i] = {'error': repr(error)}
+
+        rows = []
+        for i, configuration in enumerate(configurations):
+            # Keep scalar parameters as they are, and represent objects (models, seed lists) by their repr
+            row = {name: value if isinstance(value, (int, float, str, bool, type(None))) else repr(value) for name, value in configuration.items()}
+            row.update(results[i])
+            rows.append(row)
+
+        return DataFrame(rows)
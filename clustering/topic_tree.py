@@ -0,0 +1,288 @@
+from collections import Counter
+from typing import Dict, List, Union
+
+import numpy as np
+import scipy.cluster.hierarchy as sch
+from bertopic import BERTopic
+from bertopic.vectorizers import ClassTfidfTransformer
+from pandas import DataFrame
+from scipy.sparse import csr_matrix, diags, vstack
+from scipy.spatial.distance import squareform
+from sklearn.metrics.pairwise import cosine_similarity
+
+from clustering.merged_model import MergedModelBuilder, seed_multiplier, top_words, topic_term_counts
+
+
+class TopicTree:
+    """
+    The full hierarchy of the topics of a fitted BERTopic model, computed once and persisted.
+
+    The tree is stored as compact arrays: the (n_topics - 1, 4) scipy linkage matrix, and the term counts and size of every
+    node (the n_topics leaves, which are the topics of the model, followed by the n_topics - 1 merged nodes). Since the term
+    counts of a node are the sum of those of its children, cutting the tree at any level or applying any merge plan only sums
+    rows of these counts and recomputes a small c-TF-IDF: the documents are never read again.
+
+    Attributes
+    ----------
+        linkage (numpy.ndarray): The linkage matrix, as computed by BERTopic's `hierarchical_topics` (Ward linkage on the cosine distance between the c-TF-IDF of the topics).
+        leaf_topics (numpy.ndarray): The topic of every leaf.
+        node_counts (scipy.sparse.csr_matrix): The (2 * n_topics - 1, n_words) term counts of every node.
+        node_sizes (numpy.ndarray): The number of documents of every node.
+        outlier_size (int): The number of documents of the outlier topic -1, which is not part of the tree.
+        words (numpy.ndarray): The vocabulary of the vectorizer.
+        idf (numpy.ndarray): The IDF of the c-TF-IDF model of the BERTopic model.
+        multiplier (numpy.ndarray): The seed words IDF multiplier, or None.
+    """
+
+    def __init__(self,
+                 linkage: np.ndarray,
+                 leaf_topics: np.ndarray,
+                 node_counts: csr_matrix,
+                 node_sizes: np.ndarray,
+                 outlier_size: int,
+                 words: np.ndarray,
+                 idf: np.ndarray,
+                 multiplier: Union[np.ndarray, None] = None,
+                 bm25_weighting: bool = False,
+                 reduce_frequent_words: bool = False) -> None:
+        self.linkage = linkage
+        self.leaf_topics = leaf_topics
+        self.node_counts = node_counts
+        self.node_sizes = node_sizes
+        self.outlier_size = outlier_size
+        self.words = words
+        self.idf = idf
+        self.multiplier = multiplier
+        self.bm25_weighting = bm25_weighting
+        self.reduce_frequent_words = reduce_frequent_words
+
+    @property
+    def n_topics(self) -> int:
+        return len(self.leaf_topics)
+
+    @classmethod
+    def from_model(cls, bertopic_model: BERTopic, docs: List[str], doc_term_matrix: Union[csr_matrix, None] = None) -> 'TopicTree':
+        """
+        Compute the tree of a fitted BERTopic model, with a single pass over the documents (none if their term counts are given).
+
+        Parameters
+        ----------
+            bertopic_model (BERTopic): The fitted BERTopic model.
+            docs (list): The documents used to fit the model, in the same order.
+            doc_term_matrix (scipy.sparse.csr_matrix): The optional already computed term counts of the documents, used instead of tokenizing `docs` again. Defaults to None.
+
+        Returns
+        -------
+            TopicTree: The topic tree.
+        """
+        topic_counts, labels = topic_term_counts(bertopic_model, docs, doc_term_matrix)
+        outliers = 1 if labels[0] == -1 else 0
+        leaf_counts = topic_counts[outliers:]
+        leaf_topics = np.array(labels[outliers:])
+        outlier_size = bertopic_model.topic_sizes_.get(-1, 0)
+
+        # Same linkage as BERTopic's hierarchical_topics
+        c_tf_idf = bertopic_model.c_tf_idf_[bertopic_model._outliers:]
+        distances = 1 - cosine_similarity(c_tf_idf)
+        np.fill_diagonal(distances, 0)
+        distances = np.clip((distances + distances.T) / 2, 0, None)
+        linkage = sch.linkage(squareform(distances, checks=False), 'ward', optimal_ordering=True)
+
+        # The counts and size of every merged node are the sums of those of its two children
+        node_counts = [leaf_counts[i] for i in range(len(leaf_topics))]
+        node_sizes = [bertopic_model.topic_sizes_[topic] for topic in leaf_topics]
+        for left, right, _, _ in linkage:
+            node_counts.append(node_counts[int(left)] + node_counts[int(right)])
+            node_sizes.append(node_sizes[int(left)] + node_sizes[int(right)])
+
+        words = bertopic_model.vectorizer_model.get_feature_names_out()
+        return cls(
+            linkage=linkage,
+            leaf_topics=leaf_topics,
+            node_counts=csr_matrix(vstack(node_counts)),
+            node_sizes=np.array(node_sizes),
+            outlier_size=outlier_size,
+            words=words,
+            idf=bertopic_model.ctfidf_model._idf_diag.diagonal(),
+            multiplier=seed_multiplier(bertopic_model, words),
+            bm25_weighting=bertopic_model.ctfidf_model.bm25_weighting,
+            reduce_frequent_words=bertopic_model.ctfidf_model.reduce_frequent_words,
+        )
+
+    def _ctfidf_model(self, counts: Union[csr_matrix, None] = None) -> ClassTfidfTransformer:
+        """
+        Build the c-TF-IDF model, either with the IDF of the BERTopic model, or fitted on the given topic counts as BERTopic does when merging topics.
+        """
+        ctfidf_model = ClassTfidfTransformer(bm25_weighting=self.bm25_weighting, reduce_frequent_words=self.reduce_frequent_words)
+        if counts is not None:
+            return ctfidf_model.fit(counts, multiplier=self.multiplier)
+        ctfidf_model._idf_diag = diags(self.idf, offsets=0, shape=(len(self.idf), len(self.idf)), format='csr')
+        return ctfidf_model
+
+    def node_topics(self, node: int) -> List[int]:
+        """
+        Get the topics under a node of the tree.
+
+        Parameters
+        ----------
+            node (int): The node id: a leaf for ids lower than `n_topics`, otherwise the merged node of row `node - n_topics` of the linkage matrix.
+
+        Returns
+        -------
+            list: The sorted topics under the node.
+        """
+        stack, leaves = [node], []
+        while stack:
+            current = stack.pop()
+            if current < self.n_topics:
+                leaves.append(int(self.leaf_topics[current]))
+            else:
+                left, right = self.linkage[current - self.n_topics, :2]
+                stack.extend([int(left), int(right)])
+        return sorted(leaves)
+
+    def cut(self, n_topics: Union[int, None] = None, distance: Union[float, None] = None) -> List[List[int]]:
+        """
+        Cut the tree into a merge plan, either at a number of topics or at a distance threshold.
+
+        Parameters
+        ----------
+            n_topics (int): The number of topics to keep. Defaults to None.
+            distance (float): The distance under which topics are merged. Defaults to None.
+
+        Returns
+        -------
+            list: The merge plan, as a list of groups of topics, that can be passed to `evaluate` or `ClusteringMethod.create_merged_model`.
+        """
+        if (n_topics is None) == (distance is None):
+            raise ValueError("Exactly one of n_topics and distance must be provided")
+        if n_topics is not None:
+            clusters = sch.fcluster(self.linkage, t=n_topics, criterion='maxclust')
+        else:
+            clusters = sch.fcluster(self.linkage, t=distance, criterion='distance')
+
+        groups: Dict[int, List[int]] = {}
+        for topic, cluster in zip(self.leaf_topics.tolist(), clusters):
+            groups.setdefault(cluster, []).append(topic)
+        return sorted(groups.values())
+
+    def evaluate(self, topics_to_merge: Union[List[List[int]], List[int], Dict[int, int]], top_n_words: int = 10) -> DataFrame:
+        """
+        Compute the sizes and top words of the topics resulting from a merge plan, from the stored counts only.
+
+        The merged topics are numbered as `ClusteringMethod.create_merged_model` numbers them (by decreasing size) and their c-TF-IDF is computed the same way.
+
+        Parameters
+        ----------
+            topics_to_merge (list | dict): The topics to merge: a list of groups of topics (for instance from `cut`), or a dictionary mapping a topic to the topic it is merged into.
+            top_n_words (int): The number of top words per topic. Defaults to 10.
+
+        Returns
+        -------
+            DataFrame: A DataFrame with one row per merged topic and the columns 'Topic', 'Merged_Topics', 'Count', 'Name' and 'Representation'.
+        """
+        mapping = MergedModelBuilder.merge_mapping(self.leaf_topics.tolist(), topics_to_merge)
+        groups: Dict[int, List[int]] = {}
+        for leaf, topic in enumerate(self.leaf_topics.tolist()):
+            groups.setdefault(mapping[topic], []).append(leaf)
+
+        sizes = Counter({head: int(self.node_sizes[leaves].sum()) for head, leaves in groups.items()})
+        sorted_heads = [head for head, _ in sizes.most_common()]
+        counts = csr_matrix(vstack([csr_matrix(self.node_counts[groups[head]].sum(axis=0)) for head in sorted_heads]))
+        c_tf_idf = self._ctfidf_model(counts).transform(counts)
+        representations = top_words(csr_matrix(c_tf_idf), self.words, top_n_words)
+
+        rows = []
+        if self.outlier_size:
+            rows.append({'Topic': -1, 'Merged_Topics': [-1], 'Count': self.outlier_size, 'Name': None, 'Representation': None})
+        for topic, (head, representation) in enumerate(zip(sorted_heads, representations)):
+            words = [word for word, _ in representation]
+            rows.append({
+                'Topic': topic,
+                'Merged_Topics': [int(self.leaf_topics[leaf]) for leaf in groups[head]],
+                'Count': sizes[head],
+                'Name': f"{topic}_" + "_".join(words[:4]),
+                'Representation': words,
+            })
+        return DataFrame(rows)
+
+    def to_hierarchical_topics(self) -> DataFrame:
+        """
+        Convert the tree to the DataFrame returned by BERTopic's `hierarchical_topics`, so that it can be passed to `visualize_hierarchy` and `get_topic_tree`.
+
+        The names of the nodes are the top c-TF-IDF words of the nodes (the representation models are not run).
+
+        Returns
+        -------
+            DataFrame: A DataFrame with the columns 'Parent_ID', 'Parent_Name', 'Topics', 'Child_Left_ID', 'Child_Left_Name', 'Child_Right_ID', 'Child_Right_Name' and 'Distance'.
+        """
+        c_tf_idf = csr_matrix(self._ctfidf_model().transform(self.node_counts))
+        names = ["_".join(word for word, _ in representation if word)
+                 for representation in top_words(c_tf_idf, self.words, 5)]
+
+        rows = []
+        for index, (left, right, distance, _) in enumerate(self.linkage):
+            left, right = int(left), int(right)
+            rows.append({
+                'Parent_ID': str(index + self.n_topics),
+                'Parent_Name': names[index + self.n_topics],
+                'Topics': self.node_topics(index + self.n_topics),
+                'Child_Left_ID': str(left),
+                'Child_Left_Name': names[left],
+                'Child_Right_ID': str(right),
+                'Child_Right_Name': names[right],
+                'Distance': distance,
+            })
+        return DataFrame(rows).sort_values('Parent_ID', ascending=False, key=lambda ids: ids.astype(int))
+
+    def save(self, path: str) -> None:
+        """
+        Save the tree to a `.npz` file (loadable without pickle).
+
+        Parameters
+        ----------
+            path (str): The path of the file.
+        """
+        np.savez_compressed(
+            path,
+            linkage=self.linkage,
+            leaf_topics=self.leaf_topics,
+            counts_data=self.node_counts.data,
+            counts_indices=self.node_counts.indices,
+            counts_indptr=self.node_counts.indptr,
+            counts_shape=np.array(self.node_counts.shape),
+            node_sizes=self.node_sizes,
+            outlier_size=np.array(self.outlier_size),
+            words=np.asarray(self.words, dtype=str),
+            idf=self.idf,
+            multiplier=self.multiplier if self.multiplier is not None else np.empty(0),
+            flags=np.array([self.bm25_weighting, self.reduce_frequent_words]),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> 'TopicTree':
+        """
+        Load a tree saved with `save`.
+
+        Parameters
+        ----------
+            path (str): The path of the file.
+
+        Returns
+        -------
+            TopicTree: The topic tree.
+        """
+        with np.load(path, allow_pickle=False) as arrays:
+            multiplier = arrays['multiplier']
+            return cls(
+                linkage=arrays['linkage'],
+                leaf_topics=arrays['leaf_topics'],
+                node_counts=csr_matrix((arrays['counts_data'], arrays['counts_indices'], arrays['counts_indptr']), shape=tuple(arrays['counts_shape'])),
+                node_sizes=arrays['node_sizes'],
+                outlier_size=int(arrays['outlier_size']),
+                words=arrays['words'],
+                idf=arrays['idf'],
+                multiplier=multiplier if len(multiplier) else None,
+                bm25_weighting=bool(arrays['flags'][0]),
+                reduce_frequent_words=bool(arrays['flags'][1]),
+            )
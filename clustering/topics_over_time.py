@@ -0,0 +1,219 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Union
+
+import numpy as np
+import pandas as pd
+from bertopic import BERTopic
+from scipy.sparse import csr_matrix
+from sklearn.preprocessing import normalize
+
+from clustering.merged_model import top_words
+
+
+def vocabulary_hash(words: np.ndarray) -> str:
+    """
+    Fingerprint a vocabulary, to detect that stored term counts were computed with another vectorizer.
+    """
+    return hashlib.sha1("\n".join(words).encode('utf-8')).hexdigest()
+
+
+class IncrementalTopicsOverTime:
+    """
+    A persisted, incremental version of BERTopic's `topics_over_time`, with one bin per timestamp (e.g. per `year_month`).
+
+    The term counts of every topic in every bin are stored on disk, one `.npz` file per bin, with the tuned c-TF-IDF of the
+    bin (needed by the evolution tuning of the next bin). Updating the state with new documents only tokenizes the documents
+    of the bins which are not stored yet, and only recomputes the c-TF-IDF of these bins (and of the stored bins which come
+    after them, from their stored counts, since the evolution tuning chains the bins). A monthly refresh therefore costs the
+    documents of one month.
+
+    The c-TF-IDF of a bin is computed as in `topics_over_time` (c-TF-IDF model of the fitted BERTopic model, optional
+    evolution and global tuning), except that the counts of the documents of a topic are summed instead of counting the terms
+    of their joined text, and that the words are the top c-TF-IDF words (the representation models are not run).
+
+    Layout of the directory:
+
+        state.json        The vocabulary fingerprint, the tuning options, and the bins with their topics, words and frequencies.
+        bin_<i>.npz       The term counts and the tuned c-TF-IDF of the topics of a bin.
+    """
+
+    STATE = 'state.json'
+
+    def __init__(self, path: str, evolution_tuning: bool = True, global_tuning: bool = True, datetime_format: Union[str, None] = None) -> None:
+        """
+        Parameters
+        ----------
+            path (str): The directory of the persisted state. It is created on the first update.
+            evolution_tuning (bool): Average the c-TF-IDF of a topic at a timestamp with the one at the previous timestamp, as BERTopic does. Defaults to True.
+            global_tuning (bool): Average the c-TF-IDF of a topic at a timestamp with its global c-TF-IDF, as BERTopic does. Defaults to True.
+            datetime_format (str): The format of the timestamps, used to convert them to dates in `to_dataframe`. Defaults to None (inferred).
+        """
+        self.path = path
+        state_path = os.path.join(path, self.STATE)
+        if os.path.isfile(state_path):
+            with open(state_path) as f:
+                self.state = json.load(f)
+        else:
+            self.state = {
+                'vocabulary_hash': None,
+                'evolution_tuning': evolution_tuning,
+                'global_tuning': global_tuning,
+                'datetime_format': datetime_format,
+                'bins': {},
+            }
+
+    @property
+    def timestamps(self) -> List[str]:
+        """
+        The stored bins, in chronological order.
+        """
+        return sorted(self.state['bins'], key=lambda timestamp: self.state['bins'][timestamp]['order'])
+
+    def _bin_path(self, timestamp: str) -> str:
+        return os.path.join(self.path, self.state['bins'][timestamp]['file'])
+
+    def _load_bin(self, timestamp: str) -> tuple:
+        """
+        Load the topics, term counts and tuned c-TF-IDF of a stored bin.
+        """
+        with np.load(self._bin_path(timestamp), allow_pickle=False) as arrays:
+            counts = csr_matrix((arrays['counts_data'], arrays['counts_indices'], arrays['counts_indptr']), shape=tuple(arrays['counts_shape']))
+            tuned = csr_matrix((arrays['tuned_data'], arrays['tuned_indices'], arrays['tuned_indptr']), shape=tuple(arrays['tuned_shape']))
+            return arrays['topics'].tolist(), counts, tuned
+
+    def _save_bin(self, timestamp: str, topics: List[int], counts: csr_matrix, tuned: csr_matrix) -> None:
+        tmp_path = self._bin_path(timestamp) + '.tmp.npz'
+        np.savez_compressed(
+            tmp_path,
+            topics=np.asarray(topics, dtype=np.int64),
+            counts_data=counts.data, counts_indices=counts.indices, counts_indptr=counts.indptr, counts_shape=np.array(counts.shape),
+            tuned_data=tuned.data, tuned_indices=tuned.indices, tuned_indptr=tuned.indptr, tuned_shape=np.array(tuned.shape),
+        )
+        os.replace(tmp_path, self._bin_path(timestamp))
+
+    def _save_state(self) -> None:
+        state_path = os.path.join(self.path, self.STATE)
+        with open(state_path + '.tmp', 'w') as f:
+            json.dump(self.state, f, indent=2, ensure_ascii=False)
+        os.replace(state_path + '.tmp', state_path)
+
+    def update(self,
+               topic_model: BERTopic,
+               docs: List[str],
+               timestamps: List[str],
+               topics: List[int],
+               recompute: Union[List[str], None] = None) -> List[str]:
+        """
+        Add the documents of new bins to the state, and recompute the c-TF-IDF of the bins affected by them.
+
+        The documents of bins which are already stored are skipped, unless the bin is listed in `recompute`, in which case its counts are replaced by the ones of the given documents.
+
+        Parameters
+        ----------
+            topic_model (BERTopic): The fitted BERTopic model. Its vectorizer must be the one of the stored counts.
+            docs (list): The documents.
+            timestamps (list): The bin of each document, e.g. its `year_month`.
+            topics (list): The topic of each document.
+            recompute (list): Stored bins whose counts are computed again from the given documents. Defaults to None.
+
+        Returns
+        -------
+            list: The bins whose c-TF-IDF was recomputed, in chronological order.
+        """
+        words = topic_model.vectorizer_model.get_feature_names_out()
+        fingerprint = vocabulary_hash(words)
+        if self.state['vocabulary_hash'] not in (None, fingerprint):
+            raise ValueError("The stored term counts were computed with another vocabulary: use a new directory for this model")
+        self.state['vocabulary_hash'] = fingerprint
+        os.makedirs(self.path, exist_ok=True)
+
+        documents = pd.DataFrame({'Document': [str(doc) for doc in docs], 'Topic': np.asarray(topics), 'Timestamp': [str(timestamp) for timestamp in timestamps]})
+        recompute = {str(timestamp) for timestamp in (recompute or [])}
+        documents = documents[~documents.Timestamp.isin(self.state['bins']) | documents.Timestamp.isin(recompute)]
+        if documents.empty:
+            return []
+
+        # Tokenize the documents of the new bins only, and sum their counts per (bin, topic)
+        doc_term_matrix = topic_model.vectorizer_model.transform(topic_model._preprocess_text(documents.Document.values))
+        new_counts = {}
+        for timestamp, rows in documents.groupby('Timestamp', sort=False).indices.items():
+            bin_topics, topic_rows = np.unique(documents.Topic.values[rows], return_inverse=True)
+            indicator = csr_matrix((np.ones(len(rows)), (topic_rows, rows)), shape=(len(bin_topics), doc_term_matrix.shape[0]))
+            new_counts[timestamp] = (bin_topics.tolist(), csr_matrix(indicator @ doc_term_matrix), np.bincount(topic_rows).tolist())
+
+        for timestamp in new_counts:
+            if timestamp not in self.state['bins']:
+                self.state['bins'][timestamp] = {'file': f"bin_{len(self.state['bins']):05d}.npz"}
+        # Keep the bins in chronological order, whatever the order they were added in
+        ordered = sorted(self.state['bins'], key=lambda timestamp: pd.to_datetime(timestamp, format=self.state['datetime_format']))
+        for order, timestamp in enumerate(ordered):
+            self.state['bins'][timestamp]['order'] = order
+
+        # The evolution tuning chains the bins: every bin after the first new one must be tuned again
+        first = min(ordered.index(timestamp) for timestamp in new_counts)
+        to_compute = ordered[first:] if self.state['evolution_tuning'] else [timestamp for timestamp in ordered if timestamp in new_counts]
+
+        global_c_tf_idf = normalize(topic_model.c_tf_idf_, axis=1, norm='l1', copy=True)
+        global_rows = {topic: row for row, topic in enumerate(sorted(topic_model.topic_sizes_))}
+        previous_topics, previous_c_tf_idf = None, None
+        if first > 0 and self.state['evolution_tuning']:
+            previous_topics, _, previous_c_tf_idf = self._load_bin(ordered[first - 1])
+
+        for timestamp in to_compute:
+            if timestamp in new_counts:
+                bin_topics, counts, frequencies = new_counts[timestamp]
+            else:
+                bin_topics, counts, _ = self._load_bin(timestamp)
+                frequencies = self.state['bins'][timestamp]['frequencies']
+
+            c_tf_idf = csr_matrix(topic_model.ctfidf_model.transform(counts))
+            if self.state['global_tuning'] or self.state['evolution_tuning']:
+                c_tf_idf = normalize(c_tf_idf, axis=1, norm='l1', copy=False)
+            if self.state['evolution_tuning'] and previous_topics is not None:
+                overlapping = sorted(set(previous_topics) & set(bin_topics))
+                current_rows = [bin_topics.index(topic) for topic in overlapping]
+                previous_rows = [previous_topics.index(topic) for topic in overlapping]
+                c_tf_idf = c_tf_idf.tolil()
+                c_tf_idf[current_rows] = ((c_tf_idf[current_rows] + previous_c_tf_idf[previous_rows]) / 2.0).tolil()
+                c_tf_idf = csr_matrix(c_tf_idf)
+            if self.state['global_tuning']:
+                c_tf_idf = csr_matrix((global_c_tf_idf[[global_rows[topic] for topic in bin_topics]] + c_tf_idf) / 2.0)
+
+            representations = top_words(c_tf_idf, words, 5)
+            self.state['bins'][timestamp].update({
+                'topics': bin_topics,
+                'frequencies': frequencies,
+                'words': [", ".join(word for word, _ in representation) for representation in representations],
+            })
+            self._save_bin(timestamp, bin_topics, counts, c_tf_idf)
+            previous_topics, previous_c_tf_idf = bin_topics, c_tf_idf
+
+        self._save_state()
+        return to_compute
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Get the topics over time in the format of BERTopic's `topics_over_time`, to be passed to `visualize_topics_over_time`.
+
+        Returns
+        -------
+            DataFrame: A DataFrame with the columns 'Topic', 'Words', 'Frequency' and 'Timestamp'.
+        """
+        rows = []
+        for timestamp in self.timestamps:
+            stored = self.state['bins'][timestamp]
+            date = pd.to_datetime(timestamp, format=self.state['datetime_format'])
+            rows.extend(zip(stored['topics'], stored['words'], stored['frequencies'], [date] * len(stored['topics'])))
+        return pd.DataFrame(rows, columns=['Topic', 'Words', 'Frequency', 'Timestamp'])
+
+    def frequencies(self) -> Dict[str, Dict[int, int]]:
+        """
+        Get the number of documents of every topic in every bin.
+
+        Returns
+        -------
+            dict: A dictionary mapping every bin to a dictionary mapping every topic to its number of documents.
+        """
+        return {timestamp: dict(zip(self.state['bins'][timestamp]['topics'], self.state['bins'][timestamp]['frequencies'])) for timestamp in self.timestamps}
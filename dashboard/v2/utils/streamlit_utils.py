@@ -1,6 +1,7 @@
 import streamlit.components.v1 as components
 import streamlit as st 
 import os 
+import json
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
@@ -8,6 +9,7 @@ from itertools import cycle
 import plotly.subplots as sp
 import colorsys
 import random
+from clustering.ann_index import IVFIndex
 
 @st.cache_data
 def load_data():
@@ -21,6 +23,74 @@ def load_data():
     data = pd.read_csv('dashboard/data/csv_files/schneider_all_processed_labelled_full_newBertopic2.csv')
     return data
 
+@st.cache_resource
+def load_ann_index(bundle_path):
+    """
+    Loads the nearest neighbour index of a model bundle once per session, memory-mapped.
+
+    Parameters:
+    bundle_path (str): The directory of the model bundle (see `ModelBundle`).
+
+    Returns:
+    IVFIndex: The index, or None if the bundle has none.
+    """
+    index_path = os.path.join(bundle_path, 'ann_index')
+    return IVFIndex.load(index_path) if os.path.isdir(index_path) else None
+
+@st.cache_resource
+def load_sentence_model(model_name):
+    """
+    Loads a SentenceTransformer model once per session, to embed the search queries.
+
+    Parameters:
+    model_name (str): The name of the model the bundle was fitted with.
+
+    Returns:
+    SentenceTransformer: The model.
+    """
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+def similar_verbatims(df, bundle_path, query, k=10, topics=None, filter_column=None, filter_value=None, text_column='processed_data', model_name=None):
+    """
+    Finds the verbatims most similar to a query text or to a verbatim, with the nearest neighbour index of a model bundle.
+
+    Parameters:
+    df (pandas.DataFrame): The verbatims the bundle was fitted on, in the same order.
+    bundle_path (str): The directory of the model bundle.
+    query (str or int): A query text, or the row of a verbatim in `df`.
+    k (int, optional): The number of verbatims to return. Defaults to 10.
+    topics (list, optional): Only return verbatims of these topics. Defaults to None.
+    filter_column (str, optional): A column of `df` to filter the verbatims on, e.g. 'Zone'. Defaults to None.
+    filter_value (optional): The value of `filter_column` to keep. Defaults to None.
+    text_column (str, optional): The column of the verbatims. Defaults to 'processed_data'.
+    model_name (str, optional): The SentenceTransformer model embedding a query text. Defaults to None (the model of the bundle).
+
+    Returns:
+    pandas.DataFrame: The most similar verbatims with their 'similarity' and 'topic', sorted by decreasing similarity.
+    """
+    index = load_ann_index(bundle_path)
+    if index is None:
+        raise ValueError(f"The bundle at {bundle_path} has no nearest neighbour index, build it with ClusteringMethod.build_ann_index")
+    mask = (df[filter_column] == filter_value).to_numpy() if filter_column is not None else None
+    if isinstance(query, str):
+        if model_name is None:
+            with open(os.path.join(bundle_path, 'manifest.json')) as f:
+                model_name = json.load(f)['model_name']
+        query_embedding = load_sentence_model(model_name).encode([query])[0]
+        exclude = None
+    else:
+        # The stored vectors are normalized, the query verbatim is its own stored vector
+        query_embedding = index.vector(query)
+        exclude = query
+    rows, similarities = index.search(query_embedding, k=k + (exclude is not None), topics=topics, mask=mask)
+    found = (rows >= 0) & (rows != exclude)
+    rows, similarities = rows[found][:k], similarities[found][:k]
+    similar_df = df.iloc[rows][[text_column]].copy()
+    similar_df['similarity'] = similarities
+    similar_df['topic'] = np.asarray(index.topics)[rows] if index.topics is not None else None
+    return similar_df
+
 def print_graph(path, height=None, width=None):
     """
     Prints a graph from a specified file path.
@@ -0,0 +1,146 @@
+import json
+import os
+import urllib.error
+import urllib.request
+from typing import Callable, List, Union
+
+import numpy as np
+
+from inference.worker import DEFAULT_HOST, DEFAULT_PORT, decode_array
+
+
+WORKER_URL_VARIABLE = 'WASSATI_WORKER_URL'
+
+
+class WorkerUnavailable(ConnectionError):
+    """
+    Raised when the inference worker cannot be reached.
+    """
+
+
+class WorkerClient:
+    """
+    A client of the local inference worker (see inference/worker.py).
+    """
+
+    def __init__(self, url: str, timeout: float = 600.0, max_docs_per_request: int = 2048) -> None:
+        """
+        Parameters
+        ----------
+            url (str): The address of the worker, e.g. 'http://127.0.0.1:8765'.
+            timeout (float): The timeout of a request in seconds. Defaults to 600.
+            max_docs_per_request (int): The number of documents sent per request, bounding the size of the payloads. Defaults to 2048.
+        """
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.max_docs_per_request = max_docs_per_request
+
+    @classmethod
+    def from_env(cls, url: Union[str, None] = None) -> Union['WorkerClient', None]:
+        """
+        Get a client of the worker if one is running.
+
+        The address is `url`, or the `WASSATI_WORKER_URL` environment variable, or the default local address. Setting the variable to 'off' disables the worker.
+
+        Returns
+        -------
+            WorkerClient: The client, or None if no worker answers.
+        """
+        url = url or os.environ.get(WORKER_URL_VARIABLE, f'http://{DEFAULT_HOST}:{DEFAULT_PORT}')
+        if url.lower() == 'off':
+            return None
+        client = cls(url)
+        return client if client.available() else None
+
+    def available(self) -> bool:
+        """
+        Check that the worker answers, with a short timeout.
+        """
+        try:
+            with urllib.request.urlopen(f'{self.url}/health', timeout=0.5) as response:
+                return response.status == 200
+        except (urllib.error.URLError, OSError, ValueError):
+            return False
+
+    def _post(self, path: str, payload: dict) -> dict:
+        request = urllib.request.Request(f'{self.url}{path}', data=json.dumps(payload).encode('utf-8'), headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as error:
+            raise RuntimeError(f"The inference worker failed: {json.loads(error.read()).get('error')}") from error
+        except (urllib.error.URLError, OSError) as error:
+            raise WorkerUnavailable(f"The inference worker at {self.url} cannot be reached") from error
+
+    def encode(self, model_name: str, docs: List[str], batch_size: int = 32, **kwargs) -> np.ndarray:
+        """
+        Embed documents with a SentenceTransformer model kept loaded by the worker.
+
+        Returns
+        -------
+            numpy.ndarray: The embeddings of the documents.
+        """
+        chunks = [
+            decode_array(self._post('/encode', {'model_name': model_name, 'docs': list(docs[start:start + self.max_docs_per_request]), 'batch_size': batch_size, 'kwargs': kwargs})['embeddings'])
+            for start in range(0, len(docs), self.max_docs_per_request)
+        ]
+        return np.concatenate(chunks) if chunks else np.empty((0, 0), dtype=np.float32)
+
+    def classify(self, model_name: str, task: str, docs: List[str], problem_type=None, pipeline_kwargs=None, **kwargs) -> list:
+        """
+        Run a Hugging Face pipeline kept loaded by the worker.
+
+        Returns
+        -------
+            list: The predictions of the pipeline, one per document.
+        """
+        predictions = []
+        for start in range(0, len(docs), self.max_docs_per_request):
+            predictions.extend(self._post('/classify', {
+                'model_name': model_name,
+                'task': task,
+                'problem_type': problem_type,
+                'pipeline_kwargs': pipeline_kwargs or {},
+                'docs': list(docs[start:start + self.max_docs_per_request]),
+                'kwargs': kwargs,
+            })['predictions'])
+        return predictions
+
+
+class RemotePipeline:
+    """
+    A stand-in for a Hugging Face pipeline which runs in the inference worker, and falls back to a pipeline loaded in the current process if the worker stops answering.
+    """
+
+    def __init__(self, client: WorkerClient, model_name: str, task: str, problem_type=None, pipeline_kwargs=None, fallback: Union[Callable, None] = None) -> None:
+        """
+        Parameters
+        ----------
+            client (WorkerClient): The client of the worker.
+            model_name (str): The name of the model.
+            task (str): The task of the pipeline.
+            problem_type (str): The problem type of the model ("multi_label_classification" for multi-label tasks). Defaults to None.
+            pipeline_kwargs (dict): The JSON-serializable arguments used to create the pipeline. Defaults to None.
+            fallback (callable): A function loading the pipeline in the current process. Defaults to None (no fallback).
+        """
+        self.client = client
+        self.model_name = model_name
+        self.task = task
+        self.problem_type = problem_type
+        self.pipeline_kwargs = pipeline_kwargs or {}
+        self.fallback = fallback
+        self._local_pipeline = None
+
+    def __call__(self, docs, **kwargs):
+        single = isinstance(docs, str)
+        docs = [docs] if single else list(docs)
+        if self._local_pipeline is None:
+            try:
+                predictions = self.client.classify(self.model_name, self.task, docs, self.problem_type, self.pipeline_kwargs, **kwargs)
+                return predictions[0] if single else predictions
+            except WorkerUnavailable:
+                if self.fallback is None:
+                    raise
+                self._local_pipeline = self.fallback()
+        predictions = self._local_pipeline(docs, **kwargs)
+        return predictions[0] if single else predictions
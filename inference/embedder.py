@@ -0,0 +1,45 @@
+from typing import Callable, List, Union
+
+import numpy as np
+from bertopic.backend import BaseEmbedder
+
+from inference.client import WorkerClient, WorkerUnavailable
+
+
+class RemoteSentenceModel(BaseEmbedder):
+    """
+    A stand-in for a SentenceTransformer model which runs in the inference worker, and falls back to a model loaded in the current process if the worker stops answering.
+
+    It exposes the `encode` method of SentenceTransformer (used by `ClusteringMethod` and the embedding cache) and the `embed` method of BERTopic's embedding backends (used by BERTopic and its representation models).
+    """
+
+    def __init__(self, client: WorkerClient, model_name: str, fallback: Union[Callable, None] = None) -> None:
+        """
+        Parameters
+        ----------
+            client (WorkerClient): The client of the worker.
+            model_name (str): The name of the SentenceTransformer model.
+            fallback (callable): A function loading the model in the current process. Defaults to None (no fallback).
+        """
+        super().__init__()
+        self.client = client
+        self.model_name = model_name
+        self.fallback = fallback
+        self._local_model = None
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        docs = [sentences] if single else list(sentences)
+        if self._local_model is None:
+            try:
+                embeddings = self.client.encode(self.model_name, docs, batch_size=batch_size, **kwargs)
+                return embeddings[0] if single else embeddings
+            except WorkerUnavailable:
+                if self.fallback is None:
+                    raise
+                self._local_model = self.fallback()
+        embeddings = self._local_model.encode(docs, batch_size=batch_size, show_progress_bar=show_progress_bar, **kwargs)
+        return embeddings[0] if single else embeddings
+
+    def embed(self, documents: List[str], verbose: bool = False) -> np.ndarray:
+        return self.encode(documents, show_progress_bar=verbose)
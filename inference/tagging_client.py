@@ -0,0 +1,177 @@
+import argparse
+import http.client
+import json
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Union
+
+import numpy as np
+
+from inference.client import WorkerUnavailable
+from inference.tagging_server import DEFAULT_TAGGING_PORT
+from inference.worker import DEFAULT_HOST
+
+
+class TaggingClient:
+    """
+    A client of the tagging server (see inference/tagging_server.py), keeping one connection open per thread.
+    """
+
+    def __init__(self, url: str = f'http://{DEFAULT_HOST}:{DEFAULT_TAGGING_PORT}', timeout: float = 60.0) -> None:
+        """
+        Parameters
+        ----------
+            url (str): The address of the server. Defaults to the default local address.
+            timeout (float): The timeout of a request in seconds. Defaults to 60.
+        """
+        parsed = urllib.parse.urlparse(url)
+        self.url = url.rstrip('/')
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _request(self, method: str, path: str, payload: Union[dict, None] = None) -> dict:
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        for attempt in range(2):
+            connection = getattr(self._local, 'connection', None)
+            if connection is None:
+                connection = self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                connection.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                result = json.loads(response.read())
+                break
+            except (ConnectionError, http.client.HTTPException, OSError) as error:
+                # The server may have closed an idle connection, retry once on a new one
+                connection.close()
+                self._local.connection = None
+                if attempt == 1:
+                    raise WorkerUnavailable(f"The tagging server at {self.url} cannot be reached") from error
+        if response.status != 200:
+            raise RuntimeError(f"The tagging server failed: {result.get('error')}")
+        return result
+
+    def health(self) -> dict:
+        return self._request('GET', '/health')
+
+    def metrics(self) -> list:
+        """
+        Get the latency percentiles and batch-size histogram of every model loaded by the server.
+        """
+        return self._request('GET', '/metrics')['models']
+
+    def classify(self, model_name: str, task: str, text: str, problem_type=None, pipeline_kwargs=None) -> dict:
+        """
+        Tag one text.
+
+        Returns
+        -------
+            dict: The prediction of the pipeline, the size of the batch it was scored in, and the latency measured by the server.
+        """
+        return self._request('POST', '/classify', {
+            'model_name': model_name,
+            'task': task,
+            'problem_type': problem_type,
+            'pipeline_kwargs': pipeline_kwargs or {},
+            'text': text,
+        })
+
+
+class TaggingPipeline:
+    """
+    A stand-in for a Hugging Face pipeline which tags texts with the tagging server, sending them as concurrent single-text requests that the server batches.
+    """
+
+    def __init__(self, client: TaggingClient, model_name: str, task: str, problem_type=None, pipeline_kwargs=None, n_connections: int = 8) -> None:
+        """
+        Parameters
+        ----------
+            client (TaggingClient): The client of the server.
+            model_name (str): The name of the model.
+            task (str): The task of the pipeline.
+            problem_type (str): The problem type of the model ("multi_label_classification" for multi-label tasks). Defaults to None.
+            pipeline_kwargs (dict): The JSON-serializable arguments used to create the pipeline. Defaults to None.
+            n_connections (int): The number of requests in flight. Defaults to 8.
+        """
+        self.client = client
+        self.model_name = model_name
+        self.task = task
+        self.problem_type = problem_type
+        self.pipeline_kwargs = pipeline_kwargs or {}
+        self.n_connections = n_connections
+
+    def __call__(self, docs, **kwargs):
+        single = isinstance(docs, str)
+        docs = [docs] if single else list(docs)
+        with ThreadPoolExecutor(max_workers=self.n_connections) as executor:
+            predictions = list(executor.map(lambda doc: self.client.classify(self.model_name, self.task, doc, self.problem_type, self.pipeline_kwargs)['prediction'], docs))
+        return predictions[0] if single else predictions
+
+
+def load_test(client: TaggingClient, model_name: str, task: str, texts: List[str], concurrency: int = 16, n_requests: int = 1000, problem_type=None, pipeline_kwargs=None) -> dict:
+    """
+    Send single-text requests to the tagging server from concurrent clients, and measure the throughput and the latencies.
+
+    Parameters
+    ----------
+        client (TaggingClient): The client of the server.
+        model_name (str): The name of the model.
+        task (str): The task of the pipeline.
+        texts (list): The texts sent, cycled through.
+        concurrency (int): The number of clients sending requests at the same time. Defaults to 16.
+        n_requests (int): The number of requests. Defaults to 1000.
+        problem_type (str): The problem type of the model. Defaults to None.
+        pipeline_kwargs (dict): The arguments of the pipeline. Defaults to None.
+
+    Returns
+    -------
+        dict: The throughput, the p50 and p99 of the latency seen by the clients in milliseconds, the number of failed requests, and the statistics of the server for the model (see `TaggingServer.metrics`).
+    """
+    # Load the model before the clock starts
+    client.classify(model_name, task, texts[0], problem_type, pipeline_kwargs)
+
+    def send(i):
+        start = time.perf_counter()
+        try:
+            client.classify(model_name, task, texts[i % len(texts)], problem_type, pipeline_kwargs)
+        except (RuntimeError, WorkerUnavailable):
+            return None
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(send, range(n_requests)))
+    wall_time = time.perf_counter() - start
+    succeeded = np.array([latency for latency in latencies if latency is not None])
+
+    server_metrics = [metrics for metrics in client.metrics() if metrics['model_name'] == model_name and metrics['task'] == task]
+    return {
+        'n_requests': n_requests,
+        'n_failed': n_requests - len(succeeded),
+        'concurrency': concurrency,
+        'throughput_per_s': len(succeeded) / wall_time,
+        'client_latency_p50_ms': float(np.percentile(succeeded, 50)) if len(succeeded) else None,
+        'client_latency_p99_ms': float(np.percentile(succeeded, 99)) if len(succeeded) else None,
+        'server': server_metrics[0] if server_metrics else None,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load test the tagging server with texts of a CSV file.")
+    parser.add_argument('model_name')
+    parser.add_argument('--task', default='text-classification')
+    parser.add_argument('--problem-type', default=None)
+    parser.add_argument('--csv', required=True, help="A CSV file with the texts")
+    parser.add_argument('--text-column', default='processed_data')
+    parser.add_argument('--url', default=f'http://{DEFAULT_HOST}:{DEFAULT_TAGGING_PORT}')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--n-requests', type=int, default=1000)
+    args = parser.parse_args()
+
+    import pandas as pd
+    texts = pd.read_csv(args.csv, usecols=[args.text_column])[args.text_column].dropna().astype(str).tolist()
+    report = load_test(TaggingClient(args.url), args.model_name, args.task, texts, args.concurrency, args.n_requests, args.problem_type, {'truncation': True})
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,286 @@
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Tuple
+
+import numpy as np
+
+from inference.worker import DEFAULT_HOST, ModelRegistry
+
+
+DEFAULT_TAGGING_PORT = 8766
+
+
+class LatencyStats:
+    """
+    The latencies of the last requests of a model, and the sizes of the batches it ran.
+    """
+
+    def __init__(self, window: int = 10000) -> None:
+        """
+        Parameters
+        ----------
+            window (int): The number of most recent requests the percentiles are computed on. Defaults to 10000.
+        """
+        self.latencies_ms = deque(maxlen=window)
+        self.queue_ms = deque(maxlen=window)
+        self.batch_sizes = Counter()
+        self.n_requests = 0
+        self.n_batches = 0
+
+    def add_batch(self, latencies_ms: list, queue_ms: list) -> None:
+        self.latencies_ms.extend(latencies_ms)
+        self.queue_ms.extend(queue_ms)
+        self.batch_sizes[len(latencies_ms)] += 1
+        self.n_requests += len(latencies_ms)
+        self.n_batches += 1
+
+    def describe(self) -> dict:
+        """
+        Summarize the statistics: the p50 and p99 of the latency (from the arrival of a request to its answer) and of the time spent waiting in the queue, in milliseconds, and the histogram of the batch sizes.
+        """
+        latencies = np.asarray(self.latencies_ms, dtype=np.float64)
+        queue = np.asarray(self.queue_ms, dtype=np.float64)
+        return {
+            'n_requests': self.n_requests,
+            'n_batches': self.n_batches,
+            'mean_batch_size': self.n_requests / self.n_batches if self.n_batches else None,
+            'latency_p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+            'latency_p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+            'queue_p50_ms': float(np.percentile(queue, 50)) if len(queue) else None,
+            'queue_p99_ms': float(np.percentile(queue, 99)) if len(queue) else None,
+            'batch_size_histogram': {str(size): count for size, count in sorted(self.batch_sizes.items())},
+        }
+
+
+class MicroBatcher:
+    """
+    Queue the single-text requests of one pipeline and run them in micro-batches: a batch starts with the oldest waiting request, and is run as soon as it holds `max_batch_size` texts or its oldest request has waited `max_latency_ms`.
+
+    The pipeline runs in a worker thread, so that the event loop keeps accepting requests while a batch is scored; the requests arriving meanwhile form the next batch.
+    """
+
+    def __init__(self, classifier, max_batch_size: int = 32, max_latency_ms: float = 10.0) -> None:
+        """
+        Parameters
+        ----------
+            classifier (pipeline): The Hugging Face pipeline.
+            max_batch_size (int): The maximum number of texts of a batch. Defaults to 32.
+            max_latency_ms (float): The maximum time the oldest request of a batch waits for other requests, in milliseconds. Defaults to 10.
+        """
+        self.classifier = classifier
+        self.max_batch_size = max_batch_size
+        self.max_latency_ms = max_latency_ms
+        self.stats = LatencyStats()
+        self._queue: asyncio.Queue = None
+        self._task: asyncio.Task = None
+        # One thread per pipeline: a pipeline is not safe to call from several threads at once
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, text: str):
+        """
+        Queue a text and wait for its prediction.
+
+        Returns
+        -------
+            tuple: The prediction of the pipeline, and the size of the batch it was scored in.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = batch[0][2] + self.max_latency_ms / 1000
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                # Still take the requests already waiting, it costs no latency
+                while len(batch) < self.max_batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            texts = [text for text, _, _ in batch]
+            started = time.perf_counter()
+            try:
+                predictions = await loop.run_in_executor(self._executor, lambda: self.classifier(texts, batch_size=len(texts)))
+            except Exception as error:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            finished = time.perf_counter()
+            for (_, future, _), prediction in zip(batch, predictions):
+                if not future.done():
+                    future.set_result((prediction, len(batch)))
+            self.stats.add_batch([(finished - arrival) * 1000 for _, _, arrival in batch], [(started - arrival) * 1000 for _, _, arrival in batch])
+
+
+class TaggingServer:
+    """
+    A local HTTP server tagging single texts with the classifiers of `ClusteringMethod.load_model_huggingface`, so that other tools can call them without loading them.
+
+    The pipelines are loaded on their first request and kept loaded (see `ModelRegistry`), and the requests of every pipeline are micro-batched (see `MicroBatcher`). The endpoints are:
+
+        GET  /health     The loaded models.
+        GET  /metrics    The latency percentiles and batch-size histogram of every model.
+        POST /classify   {"model_name", "task", "problem_type", "pipeline_kwargs", "text"} -> {"prediction", "batch_size", "latency_ms"}
+    """
+
+    def __init__(self, max_batch_size: int = 32, max_latency_ms: float = 10.0) -> None:
+        """
+        Parameters
+        ----------
+            max_batch_size (int): The maximum number of texts of a batch. Defaults to 32.
+            max_latency_ms (float): The maximum time a request waits for other requests to be batched with, in milliseconds. Defaults to 10.
+        """
+        self.max_batch_size = max_batch_size
+        self.max_latency_ms = max_latency_ms
+        self.registry = ModelRegistry()
+        self.batchers: Dict[Tuple, MicroBatcher] = {}
+        self._loading: Dict[Tuple, asyncio.Future] = {}
+
+    async def batcher(self, model_name: str, task: str, problem_type=None, pipeline_kwargs=None) -> MicroBatcher:
+        """
+        Get the batcher of a pipeline, loading the pipeline in a thread on its first request.
+        """
+        pipeline_kwargs = pipeline_kwargs or {}
+        key = (model_name, task, problem_type, json.dumps(pipeline_kwargs, sort_keys=True))
+        if key in self.batchers:
+            return self.batchers[key]
+        if key not in self._loading:
+            loop = asyncio.get_running_loop()
+            self._loading[key] = loop.run_in_executor(None, lambda: self.registry.pipeline(model_name, task, problem_type, pipeline_kwargs)[0])
+        try:
+            classifier = await asyncio.shield(self._loading[key])
+        except Exception:
+            self._loading.pop(key, None)
+            raise
+        if key not in self.batchers:
+            batcher = MicroBatcher(classifier, self.max_batch_size, self.max_latency_ms)
+            batcher.start()
+            self.batchers[key] = batcher
+        return self.batchers[key]
+
+    def metrics(self) -> list:
+        """
+        Get the statistics of every loaded pipeline (see `LatencyStats.describe`).
+        """
+        return [
+            {'model_name': model_name, 'task': task, 'problem_type': problem_type, 'pipeline_kwargs': json.loads(pipeline_kwargs), **batcher.stats.describe()}
+            for (model_name, task, problem_type, pipeline_kwargs), batcher in self.batchers.items()
+        ]
+
+    async def handle(self, method: str, path: str, body: bytes) -> Tuple[int, dict]:
+        if method == 'GET' and path == '/health':
+            return 200, {'status': 'ok', 'models': self.registry.describe()}
+        if method == 'GET' and path == '/metrics':
+            return 200, {'models': self.metrics()}
+        if method == 'POST' and path == '/classify':
+            start = time.perf_counter()
+            request = json.loads(body)
+            if not isinstance(request.get('text'), str):
+                return 400, {'error': "The request must hold one text in 'text'"}
+            batcher = await self.batcher(request['model_name'], request['task'], request.get('problem_type'), request.get('pipeline_kwargs'))
+            prediction, batch_size = await batcher.submit(request['text'])
+            return 200, {'prediction': prediction, 'batch_size': batch_size, 'latency_ms': (time.perf_counter() - start) * 1000}
+        return 404, {'error': f'Unknown path {path}'}
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # A minimal HTTP/1.1 server, with keep-alive connections
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                try:
+                    status, payload = await self.handle(method, path, body)
+                except Exception as error:
+                    status, payload = 500, {'error': repr(error)}
+                content = json.dumps(payload).encode('utf-8')
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(content)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + content
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = DEFAULT_HOST, port: int = DEFAULT_TAGGING_PORT, verbose: bool = True) -> None:
+        server = await asyncio.start_server(self._serve_connection, host, port)
+        if verbose:
+            print(f"Tagging server listening on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for batcher in self.batchers.values():
+                await batcher.stop()
+
+
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_TAGGING_PORT, max_batch_size: int = 32, max_latency_ms: float = 10.0, verbose: bool = True) -> None:
+    """
+    Run the tagging server until it is interrupted.
+
+    Parameters
+    ----------
+        host (str): The address to listen on. Keep the default to only accept local connections. Defaults to '127.0.0.1'.
+        port (int): The port to listen on. Defaults to 8766.
+        max_batch_size (int): The maximum number of texts of a batch. Defaults to 32.
+        max_latency_ms (float): The maximum time a request waits for other requests to be batched with, in milliseconds. Defaults to 10.
+        verbose (bool): Whether to print the address of the server. Defaults to True.
+    """
+    try:
+        asyncio.run(TaggingServer(max_batch_size, max_latency_ms).serve(host, port, verbose))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Tag single texts with micro-batched classification pipelines.")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_TAGGING_PORT)
+    parser.add_argument('--max-batch-size', type=int, default=32)
+    parser.add_argument('--max-latency-ms', type=float, default=10.0)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.max_batch_size, args.max_latency_ms)
@@ -0,0 +1,153 @@
+import argparse
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+
+import numpy as np
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+
+def encode_array(array: np.ndarray) -> dict:
+    """
+    Serialize a numpy array for a JSON payload (raw bytes in base64, with its dtype and shape).
+    """
+    array = np.ascontiguousarray(array)
+    return {'dtype': array.dtype.str, 'shape': list(array.shape), 'data': base64.b64encode(array.tobytes()).decode('ascii')}
+
+
+def decode_array(payload: dict) -> np.ndarray:
+    """
+    Deserialize an array serialized with `encode_array`.
+    """
+    return np.frombuffer(base64.b64decode(payload['data']), dtype=np.dtype(payload['dtype'])).reshape(payload['shape'])
+
+
+class ModelRegistry:
+    """
+    The models kept resident by the worker: SentenceTransformer models by name, and Hugging Face pipelines by (model name, task, problem type, pipeline arguments).
+
+    Every model is loaded on its first request and guarded by its own lock, so that requests for different models run concurrently while the requests for one model are served one at a time.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._models: Dict[Tuple, object] = {}
+        self._model_locks: Dict[Tuple, threading.Lock] = {}
+        self.loaded_at: Dict[str, float] = {}
+
+    def _get(self, key: Tuple, loader):
+        with self._lock:
+            model_lock = self._model_locks.setdefault(key, threading.Lock())
+        with model_lock:
+            if key not in self._models:
+                self._models[key] = loader()
+                self.loaded_at[repr(key)] = time.time()
+        return self._models[key], model_lock
+
+    def sentence_model(self, model_name: str):
+        def load():
+            import torch
+            from sentence_transformers import SentenceTransformer
+            device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+            return SentenceTransformer(model_name, device=device)
+        return self._get(('sentence_model', model_name), load)
+
+    def pipeline(self, model_name: str, task: str, problem_type=None, pipeline_kwargs=None):
+        pipeline_kwargs = pipeline_kwargs or {}
+
+        def load():
+            from clustering.clustering import ClusteringMethod
+            return ClusteringMethod.load_model_huggingface(model_name, task, problem_type=problem_type, use_worker=False, **pipeline_kwargs)
+        return self._get(('pipeline', model_name, task, problem_type, json.dumps(pipeline_kwargs, sort_keys=True)), load)
+
+    def describe(self) -> list:
+        return sorted(self.loaded_at)
+
+
+class WorkerRequestHandler(BaseHTTPRequestHandler):
+    """
+    The HTTP endpoints of the worker:
+
+        GET  /health     The loaded models.
+        POST /encode     {"model_name", "docs", "batch_size", "kwargs"} -> {"embeddings": <array>}
+        POST /classify   {"model_name", "task", "problem_type", "pipeline_kwargs", "docs", "kwargs"} -> {"predictions": [...]}
+    """
+
+    registry: ModelRegistry = None
+
+    def log_message(self, format, *args) -> None:
+        # Keep the console quiet, one line per request is too verbose for batch clients
+        pass
+
+    def _send(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path == '/health':
+            self._send(200, {'status': 'ok', 'models': self.registry.describe()})
+        else:
+            self._send(404, {'error': f'Unknown path {self.path}'})
+
+    def do_POST(self) -> None:
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            if self.path == '/encode':
+                model, lock = self.registry.sentence_model(request['model_name'])
+                with lock:
+                    embeddings = model.encode(request['docs'], batch_size=request.get('batch_size', 32), show_progress_bar=False, **request.get('kwargs', {}))
+                self._send(200, {'embeddings': encode_array(np.asarray(embeddings))})
+            elif self.path == '/classify':
+                classifier, lock = self.registry.pipeline(request['model_name'], request['task'], request.get('problem_type'), request.get('pipeline_kwargs'))
+                with lock:
+                    predictions = classifier(request['docs'], **request.get('kwargs', {}))
+                self._send(200, {'predictions': predictions})
+            else:
+                self._send(404, {'error': f'Unknown path {self.path}'})
+        except Exception as error:
+            self._send(500, {'error': repr(error)})
+
+
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, preload_sentence_models=(), verbose: bool = True) -> None:
+    """
+    Run the worker until it is interrupted.
+
+    Parameters
+    ----------
+        host (str): The address to listen on. Keep the default to only accept local connections. Defaults to '127.0.0.1'.
+        port (int): The port to listen on. Defaults to 8765.
+        preload_sentence_models (iterable): SentenceTransformer models to load at startup instead of on their first request. Defaults to ().
+        verbose (bool): Whether to print the address of the worker. Defaults to True.
+    """
+    registry = ModelRegistry()
+    for model_name in preload_sentence_models:
+        registry.sentence_model(model_name)
+    handler = type('Handler', (WorkerRequestHandler,), {'registry': registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    if verbose:
+        print(f"Inference worker listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Keep embedding models and classification pipelines loaded between runs.")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--preload', nargs='*', default=[], help="SentenceTransformer models to load at startup")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.preload)
@@ -5,6 +5,7 @@ from preprocessing.dataLoaders.schneider_data_loader import SchneiderDataLoader
 from preprocessing.preprocessing import Preprocessor
 from vocabulary.vocabulary import VocabularyCreator
 from clustering.clustering import ClusteringMethod
+from prediction.score_matrix import read_score_matrix, score_columns, score_matrix_from_dicts
 from sklearn.feature_extraction.text import CountVectorizer
 
 from visualization.Shared.Sunburst.sunburst_chart import SunburstChart
@@ -54,8 +55,13 @@ topics, probs, topic_model, embeddings = clustering.run_bertopic(
 # clustering.save('models/model')
 
 df = read_csv("dashboard/data/csv_files/df_all_labelled.csv")
-# Find the additional columns in df
-additional_columns = ['allComment', 'keywords', 'label', 'predicted_labels', 'predicted_scores', 'proba_dict', 'score', 'sentiment_label', 'single_emotion_label', 'single_sentiment_from_emotion', 'topic', 'year_month']
+# Find the additional columns in df: the multi-label emotions are stored as one score column per label (see prediction.score_matrix)
+emotion_column = 'emotion'
+if not any(name.startswith(f'{emotion_column}__') for name in df.columns):
+    # The files labelled before the score matrix hold the scores as dictionaries in 'proba_dict'
+    df = score_matrix_from_dicts(df, 'proba_dict', emotion_column)
+emotion_labels, _ = read_score_matrix(df, emotion_column)
+additional_columns = ['allComment', 'keywords', 'label', 'score', 'sentiment_label', 'single_emotion_label', 'single_sentiment_from_emotion', 'topic', 'year_month'] + score_columns(emotion_column, emotion_labels) + [f'best_{emotion_column}', f'best_{emotion_column}_score']
 # Perform the merge only on these additional columns
 merged_df = df_full.merge(df[['Survey ID'] + additional_columns], on='Survey ID', how='left')
 # merged_df.to_csv("dashboard/data/csv_files/schneider_processed_labelled_full.csv", index=False)
@@ -0,0 +1,284 @@
+import hashlib
+from typing import Callable, List, Sequence, Union
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression, Ridge
+from sklearn.neural_network import MLPClassifier, MLPRegressor
+
+from clustering.centroids import normalize_rows
+
+
+def best_labels(predictions: list) -> List[str]:
+    """
+    Get the best label of every prediction of a pipeline, either a {'label', 'score'} dictionary (single-label) or a list of them (multi-label).
+    """
+    return [
+        max(prediction, key=lambda item: item['score'])['label'] if isinstance(prediction, list) else prediction['label']
+        for prediction in predictions
+    ]
+
+
+class EmbeddingHead:
+    """
+    A lightweight classifier on sentence embeddings, trained to reproduce the predictions of a transformer classifier, so that most documents can be classified from the embeddings computed for the topic model instead of a full transformer pass.
+
+    For a single-label classifier, the head is a logistic regression (or an MLP) predicting the label of the transformer. For a multi-label classifier, it is a ridge regression (or an MLP) of the logits of the transformer scores of every label, the scores being recovered with a sigmoid.
+
+    The head is fitted with scikit-learn, but only its weights are kept, so that it is saved to a `.npz` file (loadable without pickle) and applied with numpy.
+    """
+
+    KINDS = ('logistic', 'mlp')
+
+    def __init__(self, kind: str = 'logistic', hidden_layer_sizes: Sequence[int] = (256,), C: float = 1.0, max_iter: int = 500, random_state: int = 42) -> None:
+        """
+        Parameters
+        ----------
+            kind (str): The model of the head, either 'logistic' (a linear model) or 'mlp'. Defaults to 'logistic'.
+            hidden_layer_sizes (tuple): The sizes of the hidden layers of the 'mlp' head. Defaults to (256,).
+            C (float): The inverse of the regularization strength of the 'logistic' head. Defaults to 1.0.
+            max_iter (int): The maximum number of training iterations. Defaults to 500.
+            random_state (int): The seed of the training. Defaults to 42.
+        """
+        if kind not in self.KINDS:
+            raise ValueError(f"Invalid kind. Must be one of {self.KINDS}.")
+        self.kind = kind
+        self.hidden_layer_sizes = tuple(hidden_layer_sizes)
+        self.C = C
+        self.max_iter = max_iter
+        self.random_state = random_state
+        self.labels = None
+        self.multi_label = None
+        self.weights = []
+        self.biases = []
+
+    def fit(self, embeddings: np.ndarray, predictions: list) -> 'EmbeddingHead':
+        """
+        Fit the head on the predictions of the transformer classifier, e.g. the predictions of last month read from the `PredictionCache`.
+
+        Parameters
+        ----------
+            embeddings (numpy.ndarray): The (N, dim) sentence embeddings of the documents.
+            predictions (list): The predictions of the transformer pipeline for the documents: {'label', 'score'} dictionaries for a single-label classifier, or lists of them (with `top_k=None`) for a multi-label classifier.
+
+        Returns
+        -------
+            EmbeddingHead: The fitted head.
+        """
+        X = normalize_rows(embeddings)
+        self.multi_label = isinstance(predictions[0], list)
+        if self.multi_label:
+            self.labels = sorted({item['label'] for prediction in predictions for item in prediction})
+            column_of = {label: column for column, label in enumerate(self.labels)}
+            scores = np.full((len(predictions), len(self.labels)), 0.5)
+            for row, prediction in enumerate(predictions):
+                for item in prediction:
+                    scores[row, column_of[item['label']]] = item['score']
+            scores = np.clip(scores, 1e-6, 1 - 1e-6)
+            logits = np.log(scores / (1 - scores))
+            if self.kind == 'logistic':
+                model = Ridge(alpha=1 / self.C).fit(X, logits)
+                self.weights, self.biases = [model.coef_.T], [model.intercept_]
+            else:
+                model = MLPRegressor(hidden_layer_sizes=self.hidden_layer_sizes, max_iter=self.max_iter, early_stopping=len(X) >= 100, random_state=self.random_state).fit(X, logits)
+                self.weights, self.biases = model.coefs_, model.intercepts_
+        else:
+            targets = best_labels(predictions)
+            if len(set(targets)) == 1:
+                # A constant classifier: a single label, always predicted with probability 1
+                self.labels = [targets[0]]
+                self.weights, self.biases = [np.zeros((X.shape[1], 1))], [np.zeros(1)]
+            else:
+                if self.kind == 'logistic':
+                    model = LogisticRegression(C=self.C, max_iter=self.max_iter).fit(X, targets)
+                    self.weights, self.biases = [model.coef_.T], [model.intercept_]
+                else:
+                    model = MLPClassifier(hidden_layer_sizes=self.hidden_layer_sizes, max_iter=self.max_iter, early_stopping=len(X) >= 100, random_state=self.random_state).fit(X, targets)
+                    self.weights, self.biases = model.coefs_, model.intercepts_
+                self.labels = [str(label) for label in model.classes_]
+                if self.weights[-1].shape[1] == 1:
+                    # A binary model has one output z: the softmax of (0, z) is the probability of the second class
+                    self.weights[-1] = np.hstack([np.zeros_like(self.weights[-1]), self.weights[-1]])
+                    self.biases[-1] = np.concatenate([[0.0], self.biases[-1]])
+        self.weights = [np.asarray(weight, dtype=np.float32) for weight in self.weights]
+        self.biases = [np.asarray(bias, dtype=np.float32) for bias in self.biases]
+        return self
+
+    def predict_scores(self, embeddings: np.ndarray) -> np.ndarray:
+        """
+        Compute the scores of every label: the probabilities of the labels for a single-label head (summing to 1), or the independent probability of every label for a multi-label head.
+
+        Returns
+        -------
+            numpy.ndarray: The (N, n_labels) float32 scores, one column per label of `labels`.
+        """
+        outputs = normalize_rows(embeddings)
+        for layer, (weight, bias) in enumerate(zip(self.weights, self.biases)):
+            outputs = outputs @ weight + bias
+            if layer < len(self.weights) - 1:
+                outputs = np.maximum(outputs, 0)
+        if self.multi_label:
+            return 1 / (1 + np.exp(-outputs))
+        outputs = np.exp(outputs - outputs.max(axis=1, keepdims=True))
+        return outputs / outputs.sum(axis=1, keepdims=True)
+
+    def confidences(self, scores: np.ndarray) -> np.ndarray:
+        """
+        Measure how sure the head is of the best label of every document: the probability of the best label for a single-label head, or the gap between the scores of the two best labels for a multi-label head.
+        """
+        if not self.multi_label or scores.shape[1] < 2:
+            return scores.max(axis=1)
+        top_two = -np.partition(-scores, 1, axis=1)[:, :2]
+        return top_two[:, 0] - top_two[:, 1]
+
+    def to_predictions(self, scores: np.ndarray) -> list:
+        """
+        Format scores as the predictions of a pipeline: a {'label', 'score'} dictionary per document for a single-label head, or the list of the scores of all the labels, sorted by decreasing score, for a multi-label head.
+        """
+        if self.multi_label:
+            return self.ranked_predictions(scores)
+        best = scores.argmax(axis=1)
+        return [{'label': self.labels[column], 'score': float(row_scores[column])} for row_scores, column in zip(scores, best)]
+
+    def ranked_predictions(self, scores: np.ndarray, top_k: Union[int, None] = None) -> list:
+        """
+        Format scores as the predictions of a pipeline called with `top_k`: the list of the scores of the `top_k` best labels of every document, sorted by decreasing score.
+
+        Parameters
+        ----------
+            scores (numpy.ndarray): The (N, n_labels) scores (see `predict_scores`).
+            top_k (int): The number of labels of every prediction. Defaults to None (all the labels).
+
+        Returns
+        -------
+            list: The predictions of the documents.
+        """
+        order = np.argsort(-scores, axis=1, kind='stable')[:, :top_k]
+        return [[{'label': self.labels[column], 'score': float(row_scores[column])} for column in row_order] for row_scores, row_order in zip(scores, order)]
+
+    def evaluate(self, embeddings: np.ndarray, predictions: list, thresholds: Sequence[float] = (0.5, 0.6, 0.7, 0.8, 0.9, 0.95)) -> pd.DataFrame:
+        """
+        Measure, on documents held out from the training, the trade-off between the fraction of documents routed to the transformer and the agreement of the cascade with the transformer, to choose the threshold of the `CascadeClassifier`.
+
+        Parameters
+        ----------
+            embeddings (numpy.ndarray): The sentence embeddings of the held-out documents.
+            predictions (list): The predictions of the transformer pipeline for the held-out documents.
+            thresholds (list): The confidence thresholds to evaluate. Defaults to (0.5, 0.6, 0.7, 0.8, 0.9, 0.95).
+
+        Returns
+        -------
+            pd.DataFrame: One row per threshold with the 'routed_fraction' of documents sent to the transformer, the 'head_agreement' of the best labels of the head and the transformer on the documents the head answers, and the 'cascade_agreement' on all the documents.
+        """
+        scores = self.predict_scores(embeddings)
+        confidences = self.confidences(scores)
+        agree = np.array(best_labels(self.to_predictions(scores))) == np.array(best_labels(predictions))
+        rows = []
+        for threshold in thresholds:
+            answered = confidences >= threshold
+            rows.append({
+                'threshold': threshold,
+                'routed_fraction': 1 - answered.mean(),
+                'head_agreement': agree[answered].mean() if answered.any() else np.nan,
+                # The routed documents get the prediction of the transformer itself
+                'cascade_agreement': (agree | ~answered).mean(),
+            })
+        return pd.DataFrame(rows)
+
+    def fingerprint(self) -> str:
+        """
+        Hash the labels and weights of the head, to tell its predictions apart in the `PredictionCache`.
+        """
+        digest = hashlib.sha1(repr((self.kind, self.multi_label, self.labels)).encode('utf-8'))
+        for array in self.weights + self.biases:
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    def save(self, path: str) -> None:
+        """
+        Save the head to a `.npz` file (loadable without pickle).
+        """
+        arrays = {f'weight_{layer}': weight for layer, weight in enumerate(self.weights)}
+        arrays.update({f'bias_{layer}': bias for layer, bias in enumerate(self.biases)})
+        np.savez(path, kind=np.array(self.kind), multi_label=np.array(self.multi_label), labels=np.array(self.labels), n_layers=np.array(len(self.weights)), **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> 'EmbeddingHead':
+        """
+        Load a head saved with `save`.
+        """
+        with np.load(path, allow_pickle=False) as arrays:
+            head = cls(kind=str(arrays['kind']))
+            head.multi_label = bool(arrays['multi_label'])
+            head.labels = arrays['labels'].tolist()
+            head.weights = [arrays[f'weight_{layer}'] for layer in range(int(arrays['n_layers']))]
+            head.biases = [arrays[f'bias_{layer}'] for layer in range(int(arrays['n_layers']))]
+        return head
+
+
+class CascadeClassifier:
+    """
+    A classifier answering with an `EmbeddingHead` when it is confident, and routing the other documents to the transformer pipeline.
+
+    It is called like a pipeline, and exposes the attributes of the pipeline (its tokenizer in particular), so that it can be given to `Prediction` instead of the pipeline. Like a pipeline, it answers with the ranked scores of the labels when it is called or the pipeline was created with `top_k` (all of them with `top_k=None`, e.g. to combine the windows of the long documents, see `Prediction.aggregate_windows`). The fraction of documents routed to the transformer is counted in `report`.
+
+    Example
+    -------
+        clustering_method = ClusteringMethod(model_name, cache_dir=cache_dir)
+        classifier = ClusteringMethod.load_model_huggingface(...)
+        cascade = CascadeClassifier(EmbeddingHead.load(head_path), classifier, clustering_method.encode, threshold=0.9)
+        df_predicted = Prediction(df, 'sentiment_label', cascade).make_predictions_df()
+    """
+
+    def __init__(self, head: EmbeddingHead, classifier, encode: Callable[[List[str]], np.ndarray], threshold: float = 0.9) -> None:
+        """
+        Parameters
+        ----------
+            head (EmbeddingHead): The fitted head.
+            classifier (pipeline): The transformer pipeline the head was trained to reproduce.
+            encode (callable): The function embedding documents with the sentence model the head was trained on, e.g. `ClusteringMethod.encode`, which reads the embeddings from the embedding cache.
+            threshold (float): The confidence (see `EmbeddingHead.confidences`) under which a document is routed to the transformer. Defaults to 0.9.
+        """
+        self.head = head
+        self.classifier = classifier
+        self.encode = encode
+        self.threshold = threshold
+        self.n_documents = 0
+        self.n_routed = 0
+
+    def __getattr__(self, name):
+        return getattr(self.__dict__['classifier'], name)
+
+    def __call__(self, docs: Union[str, List[str]], embeddings: Union[np.ndarray, None] = None, **kwargs):
+        single = isinstance(docs, str)
+        docs = [docs] if single else list(docs)
+        if embeddings is None:
+            embeddings = self.encode(docs)
+        scores = self.head.predict_scores(embeddings)
+        # Answer in the format of the pipeline: ranked scores when it is called or was created with `top_k`
+        postprocess_params = getattr(self.classifier, '_postprocess_params', {})
+        if 'top_k' in kwargs or 'top_k' in postprocess_params:
+            predictions = self.head.ranked_predictions(scores, kwargs.get('top_k', postprocess_params.get('top_k')))
+        else:
+            predictions = self.head.to_predictions(scores)
+
+        routed = np.nonzero(self.head.confidences(scores) < self.threshold)[0]
+        if len(routed):
+            routed_predictions = self.classifier([docs[i] for i in routed], **kwargs)
+            for i, prediction in zip(routed, routed_predictions):
+                predictions[i] = prediction
+
+        self.n_documents += len(docs)
+        self.n_routed += len(routed)
+        return predictions[0] if single else predictions
+
+    @property
+    def report(self) -> dict:
+        """
+        The number of documents classified, and the number and fraction of them routed to the transformer.
+        """
+        return {
+            'n_documents': self.n_documents,
+            'n_routed': self.n_routed,
+            'routed_fraction': self.n_routed / self.n_documents if self.n_documents else 0.0,
+        }
@@ -0,0 +1,241 @@
+import gc
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import torch
+from transformers import AutoConfig, AutoModelForSequenceClassification, AutoTokenizer
+
+from clustering.clustering import ClusteringMethod
+from prediction.prediction import Prediction, count_tokens
+from prediction.prediction_cache import PredictionCache
+from prediction.score_matrix import prediction_frame
+
+
+def estimate_memory_mb(model_name: str, max_batch_tokens: int = 8192) -> float:
+    """
+    Roughly estimate the memory used by a classifier at inference: its float32 weights, plus the activations of one layer for a batch of `max_batch_tokens` tokens (hidden states, feed-forward and attention scores).
+
+    The model is instantiated on the meta device, so that no weight is loaded.
+
+    Parameters
+    ----------
+        model_name (str): The name of the model.
+        max_batch_tokens (int): The maximum number of tokens of a padded batch. Defaults to 8192.
+
+    Returns
+    -------
+        float: The estimated memory in MB.
+    """
+    config = AutoConfig.from_pretrained(model_name)
+    with torch.device('meta'):
+        model = AutoModelForSequenceClassification.from_config(config)
+    n_parameters = sum(parameter.numel() for parameter in model.parameters())
+    hidden_size = getattr(config, 'hidden_size', 768)
+    intermediate_size = getattr(config, 'intermediate_size', 4 * hidden_size)
+    attention_size = getattr(config, 'num_attention_heads', 12) * getattr(config, 'max_position_embeddings', 512)
+    activations = max_batch_tokens * (4 * hidden_size + intermediate_size + attention_size)
+    return 4 * (n_parameters + activations) / 2 ** 20
+
+
+def tokenizer_key(tokenizer) -> str:
+    """
+    Identify a tokenizer by its class and vocabulary, so that the models sharing a tokenizer (e.g. several fine-tuned RoBERTa models) share their token counts.
+    """
+    vocabulary = sorted(tokenizer.get_vocab().items())
+    return hashlib.sha1(json.dumps([type(tokenizer).__name__, vocabulary]).encode('utf-8')).hexdigest()
+
+
+class MemoryBudget:
+    """
+    A budget of memory shared by threads: a thread waits until the memory it needs is available. A request larger than the whole budget is granted when nothing else runs, so that it runs alone instead of never.
+    """
+
+    def __init__(self, budget_mb: float) -> None:
+        self.budget_mb = budget_mb
+        self.used_mb = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self, memory_mb: float) -> None:
+        with self._condition:
+            self._condition.wait_for(lambda: self.used_mb == 0 or self.used_mb + memory_mb <= self.budget_mb)
+            self.used_mb += memory_mb
+
+    def release(self, memory_mb: float) -> None:
+        with self._condition:
+            self.used_mb -= memory_mb
+            self._condition.notify_all()
+
+
+class MultiModelPredictor:
+    """
+    Run several classifiers (e.g. sentiment, emotions and human values) over the same documents, and add all their prediction columns to the DataFrame at once.
+
+    The documents are deduplicated once, and tokenized once per distinct tokenizer to sort them into batches of similar lengths (see `Prediction`). The models are then run concurrently by a pool of threads, each model being loaded when its turn comes and released when it is done, so that the estimated memory of the models running at the same time stays within `memory_budget_mb`. The largest models are scheduled first.
+
+    Example
+    -------
+        predictor = MultiModelPredictor([
+            ('sentiment_label', 'cardiffnlp/twitter-roberta-base-sentiment-latest', 'text-classification', {'truncation': True, 'max_length': 512}),
+            ('emotions', 'SamLowe/roberta-base-go_emotions', 'text-classification', {'problem_type': 'multi_label_classification', 'top_k': None, 'truncation': True}),
+        ], memory_budget_mb=4096)
+        df = predictor.run(df)
+    """
+
+    def __init__(self,
+                 specs: List[tuple],
+                 memory_budget_mb: float = 4096,
+                 n_jobs: int = 2,
+                 max_batch_tokens: int = 8192,
+                 max_batch_size: int = 64,
+                 cache: Union[str, None] = None,
+                 use_worker: bool = False,
+                 show_progress_bar: bool = True) -> None:
+        """
+        Parameters
+        ----------
+            specs (list): The classifiers, as (column name, model name, task) tuples, optionally followed by a dictionary of arguments of `ClusteringMethod.load_model_huggingface` (`problem_type` and the pipeline arguments). The columns are named as by `Prediction`: at most one classifier may return a single label (written to `<column>` and `score`), the other ones must be given `top_k` (e.g. `top_k=None`) to write their score matrix.
+            memory_budget_mb (float): The memory available to the models running at the same time, in MB (see `estimate_memory_mb`). Defaults to 4096.
+            n_jobs (int): The maximum number of models running at the same time. Defaults to 2.
+            max_batch_tokens (int): The maximum number of tokens of a padded batch. Defaults to 8192.
+            max_batch_size (int): The maximum number of documents of a batch. Defaults to 64.
+            cache (str): The optional path of the SQLite database caching the predictions of every model (see `PredictionCache`). Defaults to None (no cache).
+            use_worker (bool): Whether to run the models in the local inference worker when it is running. Defaults to False.
+            show_progress_bar (bool): Whether to display the progress of the predictions. Defaults to True.
+        """
+        self.specs = [self._parse_spec(spec) for spec in specs]
+        columns = [column for column, _, _, _ in self.specs]
+        if len(set(columns)) != len(columns):
+            raise ValueError("Every classifier must write its own column")
+        # A pipeline returns the scores of all the labels when it is given `top_k`, the other ones write their score in the shared 'score' column
+        if sum('top_k' not in kwargs for _, _, _, kwargs in self.specs) > 1:
+            raise ValueError("At most one classifier can return a single label, the other ones must be given `top_k`")
+        self.memory_budget_mb = memory_budget_mb
+        self.n_jobs = n_jobs
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.cache = cache
+        self.use_worker = use_worker
+        self.show_progress_bar = show_progress_bar
+        self.run_report = None
+
+    @staticmethod
+    def _parse_spec(spec: tuple) -> Tuple[str, str, str, dict]:
+        if len(spec) == 3:
+            return spec[0], spec[1], spec[2], {}
+        if len(spec) == 4:
+            return spec[0], spec[1], spec[2], dict(spec[3])
+        raise ValueError("A classifier must be given as (column name, model name, task) or (column name, model name, task, kwargs)")
+
+    def _token_lengths(self, docs: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Count the tokens of the documents once per distinct tokenizer.
+
+        Returns
+        -------
+            dict: The token counts of the documents for the model of every column.
+        """
+        lengths_of_tokenizer, lengths = {}, {}
+        for column, model_name, _, _ in self.specs:
+            tokenizer = AutoTokenizer.from_pretrained(model_name)
+            key = tokenizer_key(tokenizer)
+            if key not in lengths_of_tokenizer:
+                lengths_of_tokenizer[key] = count_tokens(tokenizer, docs)
+            lengths[column] = lengths_of_tokenizer[key]
+        return lengths
+
+    def _run_model(self, spec: Tuple[str, str, str, dict], docs: List[str], lengths: np.ndarray, memory_mb: float, budget: MemoryBudget) -> Tuple[list, Union[List[str], None], dict]:
+        """
+        Load one classifier within the memory budget, predict the documents and release it.
+
+        Returns
+        -------
+            tuple: The predictions of the documents, the labels of the classifier in the order of its outputs (see `Prediction.labels`), and the report of the run.
+        """
+        column, model_name, task, kwargs = spec
+        kwargs = dict(kwargs)
+        problem_type = kwargs.pop('problem_type', None)
+        load_time = predict_time = labels = None
+        n_cached = 0
+        budget.acquire(memory_mb)
+        try:
+            start = time.perf_counter()
+            classifier = ClusteringMethod.load_model_huggingface(model_name, task, problem_type=problem_type, use_worker=self.use_worker, **kwargs)
+            load_time = time.perf_counter() - start
+
+            prediction = Prediction(pd.DataFrame({'processed_data': []}), column, classifier, max_batch_tokens=self.max_batch_tokens, max_batch_size=self.max_batch_size, show_progress_bar=self.show_progress_bar)
+            labels = prediction.labels()
+            # The token counts were computed before the model was loaded, cap them to the length it truncates to
+            max_length = prediction.max_length()
+            capped_lengths = np.minimum(lengths, max_length) if max_length is not None else lengths
+            length_of = dict(zip(docs, capped_lengths.tolist()))
+
+            def predict(docs_to_predict):
+                return prediction.predict(docs_to_predict, lengths=np.array([length_of[doc] for doc in docs_to_predict], dtype=np.int64))
+
+            if self.cache is not None:
+                # SQLite connections cannot be shared between threads, every model opens its own
+                cache = PredictionCache.for_prediction(self.cache, prediction)
+                n_cached = len(docs) - len(cache.get(docs)[1])
+                predictions = cache.predict(predict, docs)
+                cache.close()
+            else:
+                predictions = predict(docs)
+            predict_time = time.perf_counter() - start - load_time
+        finally:
+            classifier = None
+            prediction = None
+            gc.collect()
+            budget.release(memory_mb)
+
+        report = {'column': column, 'model_name': model_name, 'memory_mb': memory_mb, 'load_time_s': load_time, 'predict_time_s': predict_time, 'n_cached': n_cached}
+        return predictions, labels, report
+
+    def run(self, df: pd.DataFrame, text_column: str = 'processed_data') -> pd.DataFrame:
+        """
+        Run all the classifiers over the documents of a DataFrame.
+
+        The details of the run of every model (estimated memory, load and prediction times, number of cached documents) are stored in `run_report`.
+
+        Parameters
+        ----------
+            df (pd.DataFrame): The DataFrame of the documents.
+            text_column (str): The column of the documents. Defaults to 'processed_data'.
+
+        Returns
+        -------
+            pd.DataFrame: A copy of the DataFrame with the prediction columns of every classifier.
+        """
+        start = time.perf_counter()
+        # Score every distinct document once
+        codes, unique_docs = pd.factorize(df[text_column].astype(str))
+        docs = unique_docs.tolist()
+        lengths = self._token_lengths(docs)
+        memory = {column: estimate_memory_mb(model_name, self.max_batch_tokens) for column, model_name, _, _ in self.specs}
+
+        budget = MemoryBudget(self.memory_budget_mb)
+        specs = sorted(self.specs, key=lambda spec: -memory[spec[0]])
+        with ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
+            futures = {spec[0]: executor.submit(self._run_model, spec, docs, lengths[spec[0]], memory[spec[0]], budget) for spec in specs}
+            results = {column: future.result() for column, future in futures.items()}
+
+        # Write all the prediction columns at once, named and ordered as by `Prediction`
+        frames = []
+        for column, _, _, _ in self.specs:
+            predictions, labels, _ = results[column]
+            frames.append(prediction_frame(column, [predictions[code] for code in codes], labels, index=df.index))
+        df_predicted = pd.concat([df] + frames, axis=1)
+
+        self.run_report = {
+            'n_documents': len(df),
+            'n_unique_documents': len(docs),
+            'wall_time_s': time.perf_counter() - start,
+            'models': [results[column][2] for column, _, _, _ in self.specs],
+        }
+        return df_predicted
+
@@ -1,27 +1,266 @@
+from typing import List, Tuple, Union
+
+import numpy as np
 import pandas as pd
+from tqdm.auto import tqdm
+
+from prediction.prediction_cache import PredictionCache, pipeline_signature
+from prediction.score_matrix import prediction_frame, scores_to_matrix
+
+
+def count_tokens(tokenizer, docs: List[str], chunk_size: int = 10000) -> np.ndarray:
+    """
+    Count the tokens of every document, special tokens included.
+
+    Parameters
+    ----------
+        tokenizer: A Hugging Face tokenizer.
+        docs (list): The documents.
+        chunk_size (int): The number of documents tokenized at once. Defaults to 10000.
+
+    Returns
+    -------
+        numpy.ndarray: The number of tokens of every document.
+    """
+    if not docs:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate([
+        np.array([len(ids) for ids in tokenizer(docs[start:start + chunk_size])['input_ids']], dtype=np.int64)
+        for start in range(0, len(docs), chunk_size)
+    ])
 
 class Prediction:
 
-    def __init__(self, df, predicted_column_name, classifier, predictions) -> None:
+    LONG_TEXTS = ('truncate', 'windows')
+    WINDOW_AGGREGATIONS = ('mean', 'max')
+
+    def __init__(self, df, predicted_column_name, classifier, predictions=None, max_batch_tokens: int = 8192, max_batch_size: int = 64, show_progress_bar: bool = True, cache: Union[PredictionCache, str, None] = None, long_texts: str = 'truncate', window_overlap: int = 64, window_aggregation: str = 'mean') -> None:
         """
         Parameters
         ----------
             df (pd.DataFrame): The original DataFrame.
             predicted_column_name (str): The name of the column to be added to the DataFrame.
-            classifier (pipeline): The Hugging Face pipeline object for making predictions.
-            predictions (list): The list of predictions. Each prediction is a dictionary containing a 'label' and a 'score'.
+            classifier (pipeline): The Hugging Face pipeline object for making predictions, or the `RemotePipeline` returned by `ClusteringMethod.load_model_huggingface` when the inference worker is running.
+            predictions (list): The list of predictions. Each prediction is a dictionary containing a 'label' and a 'score'. Defaults to None (computed by `make_predictions_df`).
+            max_batch_tokens (int): The maximum number of tokens of a padded batch (batch size x longest document of the batch). Defaults to 8192.
+            max_batch_size (int): The maximum number of documents of a batch. Defaults to 64.
+            show_progress_bar (bool): Whether to display the progress of the predictions. Defaults to True.
+            cache (PredictionCache | str): An optional cache of the predictions of the classifier, opened with the signature of this prediction (see `PredictionCache.for_prediction`), or the path of its SQLite database, so that only the documents never scored by this model are classified. Defaults to None (no cache).
+            long_texts (str): How the documents longer than the maximum length of the model are scored: 'truncate' (only their beginning is seen) or 'windows' (they are split into overlapping windows whose scores are aggregated, see `predict`). Defaults to 'truncate'.
+            window_overlap (int): The number of tokens shared by consecutive windows. Defaults to 64.
+            window_aggregation (str): How the scores of the windows of a document are combined: 'mean' (weighted by their number of tokens) or 'max' (e.g. for a multi-label classifier, a label found in any part of the document). Defaults to 'mean'.
         """
+        if long_texts not in self.LONG_TEXTS:
+            raise ValueError(f"Invalid long_texts. Must be one of {self.LONG_TEXTS}.")
+        if window_aggregation not in self.WINDOW_AGGREGATIONS:
+            raise ValueError(f"Invalid window_aggregation. Must be one of {self.WINDOW_AGGREGATIONS}.")
         self.df = df.copy()
         self.predicted_column_name = predicted_column_name
         self.classifier = classifier
         self.predictions = predictions
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.show_progress_bar = show_progress_bar
+        self.long_texts = long_texts
+        self.window_overlap = window_overlap
+        self.window_aggregation = window_aggregation
+        self.cache = PredictionCache.for_prediction(cache, self) if isinstance(cache, str) else cache
+        if self.cache is not None and self.cache.signature != self.signature():
+            raise ValueError("The cache holds the predictions of another classifier or of other window settings: open it with PredictionCache.for_prediction")
+
+    def signature(self) -> dict:
+        """
+        Describe what determines the predictions: the signature of the classifier (see `pipeline_signature`), and how the long documents are split into windows.
+        """
+        signature = pipeline_signature(self.classifier)
+        if self.long_texts == 'windows':
+            signature['windows'] = {'overlap': self.window_overlap, 'aggregation': self.window_aggregation}
+        return signature
+
+    def max_length(self) -> Union[int, None]:
+        """
+        Get the maximum number of tokens of a document seen by the model: the `max_length` the pipeline truncates to, or else the maximum length of the model.
+        """
+        max_length = getattr(self.classifier, '_preprocess_params', {}).get('max_length')
+        if max_length is not None:
+            return max_length
+        tokenizer = getattr(self.classifier, 'tokenizer', None)
+        # Tokenizers saved without a maximum length report a huge sentinel value
+        if tokenizer is not None and tokenizer.model_max_length < 1e6:
+            return tokenizer.model_max_length
+        model = getattr(self.classifier, 'model', None)
+        return getattr(getattr(model, 'config', None), 'max_position_embeddings', None)
+
+    def token_lengths(self, docs: List[str], chunk_size: int = 10000) -> np.ndarray:
+        """
+        Count the tokens of every document with the tokenizer of the pipeline, capped to the maximum length of the model.
+
+        When the tokenizer is not available (e.g. a pipeline run by the inference worker), the number of tokens is estimated from the number of words.
+
+        Parameters
+        ----------
+            docs (list): The documents.
+            chunk_size (int): The number of documents tokenized at once. Defaults to 10000.
+
+        Returns
+        -------
+            numpy.ndarray: The number of tokens of every document, special tokens included.
+        """
+        tokenizer = getattr(self.classifier, 'tokenizer', None)
+        if tokenizer is None:
+            lengths = np.array([int(len(doc.split()) * 1.3) + 2 for doc in docs], dtype=np.int64)
+        else:
+            lengths = count_tokens(tokenizer, docs, chunk_size)
+        max_length = self.max_length()
+        return np.minimum(lengths, max_length) if max_length is not None else lengths
+
+    def make_batches(self, lengths: np.ndarray) -> List[np.ndarray]:
+        """
+        Group the documents into batches of documents of similar lengths, so that little compute is spent on padding.
+
+        The documents are sorted by decreasing number of tokens (so that the most memory-hungry batch comes first) and cut into batches whose padded size, i.e. their number of documents times the length of their longest document, stays under `max_batch_tokens`.
+
+        Parameters
+        ----------
+            lengths (numpy.ndarray): The number of tokens of every document.
+
+        Returns
+        -------
+            list: The batches, as arrays of document positions.
+        """
+        order = np.argsort(-lengths, kind='stable')
+        batches, start = [], 0
+        while start < len(order):
+            # The first document of a batch is its longest one
+            batch_size = max(1, min(self.max_batch_size, self.max_batch_tokens // max(int(lengths[order[start]]), 1)))
+            batches.append(order[start:start + batch_size])
+            start += batch_size
+        return batches
+
+    def split_windows(self, doc: str, max_length: int) -> Tuple[List[str], List[int]]:
+        """
+        Split a document into overlapping windows of at most `max_length` tokens, special tokens included. The last window ends with the document, so that no window is much shorter than the others.
+
+        Parameters
+        ----------
+            doc (str): The document.
+            max_length (int): The maximum number of tokens of a window.
+
+        Returns
+        -------
+            tuple: The texts of the windows, and their numbers of tokens.
+        """
+        tokenizer = self.classifier.tokenizer
+        n_special_tokens = tokenizer.num_special_tokens_to_add()
+        window = max_length - n_special_tokens
+        stride = max(1, window - self.window_overlap)
+        encoding = tokenizer(doc, add_special_tokens=False, return_offsets_mapping=tokenizer.is_fast)
+        ids = encoding['input_ids']
+        if len(ids) <= window:
+            return [doc], [len(ids) + n_special_tokens]
+        starts = [0]
+        while starts[-1] + window < len(ids):
+            starts.append(min(starts[-1] + stride, len(ids) - window))
+        if tokenizer.is_fast:
+            # Cut the original text, rather than decoding the tokens, so that the windows are tokenized as the document
+            offsets = encoding['offset_mapping']
+            texts = [doc[offsets[start][0]:offsets[start + window - 1][1]] for start in starts]
+        else:
+            texts = [tokenizer.decode(ids[start:start + window]) for start in starts]
+        return texts, [window + n_special_tokens] * len(starts)
+
+    def aggregate_windows(self, window_predictions: list, window_lengths: np.ndarray, n_windows: List[int]) -> list:
+        """
+        Combine the predictions of the windows of every document (see `window_aggregation`), in the output format of the classifier: a {'label', 'score'} dictionary, or a list of them sorted by decreasing score when the pipeline was created with `top_k`.
+
+        Parameters
+        ----------
+            window_predictions (list): The scores of all the labels of every window, consecutive for the windows of a document.
+            window_lengths (numpy.ndarray): The number of tokens of every window.
+            n_windows (list): The number of windows of every document.
+
+        Returns
+        -------
+            list: The prediction of every document.
+        """
+        labels, matrix = scores_to_matrix(window_predictions, self.labels())
+        matrix = np.nan_to_num(matrix)
+        starts = np.concatenate([[0], np.cumsum(n_windows)[:-1]]).astype(np.int64)
+        if self.window_aggregation == 'mean':
+            weights = np.asarray(window_lengths, dtype=np.float32)[:, None]
+            scores = np.add.reduceat(matrix * weights, starts, axis=0) / np.add.reduceat(weights, starts, axis=0)
+        else:
+            scores = np.maximum.reduceat(matrix, starts, axis=0)
+
+        postprocess_params = getattr(self.classifier, '_postprocess_params', {})
+        order = np.argsort(-scores, axis=1, kind='stable')
+        if 'top_k' not in postprocess_params:
+            return [{'label': labels[row_order[0]], 'score': float(row[row_order[0]])} for row, row_order in zip(scores, order)]
+        top_k = postprocess_params['top_k'] or len(labels)
+        return [[{'label': labels[label], 'score': float(row[label])} for label in row_order[:top_k]] for row, row_order in zip(scores, order)]
+
+    def run_batches(self, docs: List[str], lengths: np.ndarray, progress_bar, **kwargs) -> list:
+        """
+        Run the classifier on documents, with batches of documents of similar lengths (see `make_batches`).
+        """
+        predictions = [None] * len(docs)
+        for batch in self.make_batches(np.asarray(lengths)):
+            batch_predictions = self.classifier([docs[i] for i in batch], batch_size=len(batch), **kwargs)
+            for i, prediction in zip(batch, batch_predictions):
+                predictions[i] = prediction
+            progress_bar.update(len(batch))
+        return predictions
+
+    def predict(self, docs: List[str], lengths: Union[np.ndarray, None] = None) -> list:
+        """
+        Run the classifier on documents, batch by batch, with batches of documents of similar lengths padded to their longest document.
+
+        With `long_texts='windows'`, the documents longer than the maximum length of the model are split into overlapping windows (see `split_windows`), which are batched by length like the other documents, and the scores of all the labels of its windows are combined into the prediction of every long document (see `aggregate_windows`). The compute grows with the number of tokens of the documents, and only the long documents are split.
+
+        Parameters
+        ----------
+            docs (list): The documents.
+            lengths (numpy.ndarray): The number of tokens of every document, capped to the maximum length of the model, if already known. Defaults to None (counted with `token_lengths`).
+
+        Returns
+        -------
+            list: The predictions of the classifier, in the order of `docs`.
+        """
+        lengths = self.token_lengths(docs) if lengths is None else np.asarray(lengths)
+        max_length = self.max_length()
+        long_docs = []
+        if self.long_texts == 'windows' and getattr(self.classifier, 'tokenizer', None) is not None and max_length is not None:
+            # Only the documents reaching the maximum length may be longer than it
+            long_docs = np.flatnonzero(lengths >= max_length).tolist()
+
+        windows, window_lengths, n_windows = [], [], []
+        for i in long_docs:
+            texts, text_lengths = self.split_windows(docs[i], max_length)
+            windows.extend(texts)
+            window_lengths.extend(text_lengths)
+            n_windows.append(len(texts))
+
+        with tqdm(total=len(docs) - len(long_docs) + len(windows), desc=f"Predicting {self.predicted_column_name}", disable=not self.show_progress_bar) as progress_bar:
+            short_docs = np.setdiff1d(np.arange(len(docs)), long_docs, assume_unique=True)
+            short_predictions = self.run_batches([docs[i] for i in short_docs], lengths[short_docs], progress_bar)
+            predictions = [None] * len(docs)
+            for i, prediction in zip(short_docs, short_predictions):
+                predictions[i] = prediction
+            if long_docs:
+                # The scores of all the labels are needed to combine the windows
+                window_predictions = self.run_batches(windows, np.array(window_lengths, dtype=np.int64), progress_bar, top_k=None, truncation=True)
+                for i, prediction in zip(long_docs, self.aggregate_windows(window_predictions, np.array(window_lengths), n_windows)):
+                    predictions[i] = prediction
+        return predictions
 
     def make_predictions_df(self) -> pd.DataFrame:
         """
-        This function makes predictions on a DataFrame of documents using a given classifier. It adds the predictions to 
-        the DataFrame as new columns. If the classifier is for single-label classification, it adds one column for the 
-        predicted label and one for the score. If the classifier is for multi-label classification, it adds one column 
-        with a dictionary of label-score pairs for each document, and two additional columns for the best label and its score.
+        This function makes predictions on a DataFrame of documents using a given classifier. It adds the predictions to
+        the DataFrame as new columns. If the classifier is for single-label classification, it adds one column for the
+        predicted label and one for the score. If the classifier is for multi-label classification, it adds one float32
+        score column per label (see `prediction.score_matrix`), and two additional columns for the best label and its score.
+
+        The documents are classified in batches of similar lengths (see `predict`). With a cache, the predictions of the documents already scored by the same model are read from the cache, and only the new documents are classified.
 
         Returns
         -------
@@ -30,18 +269,20 @@ class Prediction:
         # Get the list of documents from the DataFrame
         docs = self.df["processed_data"].tolist()
         # Get predictions
-        predictions = self.classifier(docs)
-        
+        self.predictions = self.cache.predict(self.predict, docs) if self.cache is not None else self.predict(docs)
+        if not self.predictions:
+            return self.df
+
         # Check if predictions is a list of dictionaries (single-label case)
-        if isinstance(predictions, list) and isinstance(predictions[0], dict):
-            df_predicted = self.add_single_label_predictions(self.df, predictions, self.predicted_column_name)
-        
+        if isinstance(self.predictions[0], dict):
+            df_predicted = self.add_single_label_predictions()
+
         # Multi-label case
-        elif isinstance(predictions, list) and isinstance(predictions[0], list):
-            df_predicted = self.add_multi_label_predictions(self.df, predictions, self.predicted_column_name)
+        elif isinstance(self.predictions[0], list):
+            df_predicted = self.add_multi_label_predictions()
 
         return df_predicted
-    
+
     def add_single_label_predictions(self) -> pd.DataFrame:
         """
         This function merges the DataFrame of single-label predictions with the original DataFrame.
@@ -51,27 +292,34 @@ class Prediction:
             pd.DataFrame: The original DataFrame with added columns for the predicted labels and their scores.
         """
         predicted_df = self.df
-        # Convert the predictions to a DataFrame
-        prediction_results = pd.DataFrame(self.predictions)
-        prediction_results.rename(columns={'label': self.predicted_column_name}, inplace=True)
+        # Convert the predictions to a DataFrame, aligned on the index of the original DataFrame
+        prediction_results = prediction_frame(self.predicted_column_name, self.predictions, index=predicted_df.index)
         # Merge the original DataFrame with the prediction results
         df_predicted = pd.concat([predicted_df, prediction_results], axis=1)
         return df_predicted
 
+    def labels(self) -> Union[List[str], None]:
+        """
+        Get the labels of the classifier, in the order of its outputs, or None if the classifier does not expose its model (e.g. the `RemotePipeline`).
+        """
+        model = getattr(self.classifier, 'model', None)
+        id2label = getattr(getattr(model, 'config', None), 'id2label', None)
+        if not id2label:
+            return None
+        return [id2label[i] for i in sorted(id2label)]
+
     def add_multi_label_predictions(self) -> pd.DataFrame:
         """
-        This function adds a new column with multi-label predictions to the DataFrame and also adds two more columns for 
-        the best label and its score.
+        This function adds the multi-label predictions to the DataFrame as a dense score matrix, with one float32 column per
+        label (`<column>__<label>`), and two more columns for the best label and its score, computed with a vectorized argmax.
+        The columns round-trip through CSV and Parquet, and `prediction.score_matrix.read_score_matrix` reads the matrix back.
 
         Returns
         -------
-            pd.DataFrame: The original DataFrame with added columns for the predicted labels and their scores, as well as columns for the best label and its score.
+            pd.DataFrame: The original DataFrame with added columns for the scores of the labels, as well as columns for the best label and its score.
         """
         predicted_df = self.df
-        # Keep the original predictions as they are (a list of dictionaries) and add them to the DataFrame as a new column
-        predicted_df[self.predicted_column_name] = self.predictions
-        # Add columns for the best label and its score
-        predicted_df[f'best_{self.predicted_column_name}'] = predicted_df[self.predicted_column_name].apply(lambda x: max(x.keys(), key=lambda k: x[k]) if x else None)
-        predicted_df[f'best_{self.predicted_column_name}_score'] = predicted_df[self.predicted_column_name].apply(lambda x: x[max(x.keys(), key=lambda k: x[k])] if x else None)
+        prediction_results = prediction_frame(self.predicted_column_name, self.predictions, self.labels(), index=predicted_df.index)
+        df_predicted = pd.concat([predicted_df, prediction_results], axis=1)
 
-        return predicted_df
\ No newline at end of file
+        return df_predicted
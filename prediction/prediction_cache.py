@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Callable, List, Tuple, Union
+
+from clustering.embedding_cache import text_hash
+from prediction.embedding_heads import CascadeClassifier
+
+
+def local_revision(model_path: str) -> Union[str, None]:
+    """
+    Compute a revision for a model saved in a local directory, from the names, sizes and modification times of its files, so that retraining a model in place invalidates its cached predictions.
+
+    Parameters
+    ----------
+        model_path (str): The directory of the model.
+
+    Returns
+    -------
+        str: The revision, or None if `model_path` is not a directory.
+    """
+    if not os.path.isdir(model_path):
+        return None
+    files = sorted((name, os.stat(os.path.join(model_path, name))) for name in os.listdir(model_path) if os.path.isfile(os.path.join(model_path, name)))
+    return hashlib.sha1(json.dumps([(name, stat.st_size, int(stat.st_mtime)) for name, stat in files]).encode('utf-8')).hexdigest()
+
+
+def pipeline_signature(classifier, revision: Union[str, None] = None) -> dict:
+    """
+    Describe what determines the output of a classifier: the model name, its revision, its task and the arguments of the pipeline.
+
+    Parameters
+    ----------
+        classifier (pipeline): A Hugging Face pipeline, or the `RemotePipeline` returned by `ClusteringMethod.load_model_huggingface` when the inference worker is running.
+        revision (str): The revision of the model. Defaults to None (the commit of a model downloaded from the Hugging Face Hub, or a hash of the files of a local model).
+
+    Returns
+    -------
+        dict: The model name, revision, task, problem type and pipeline arguments, and for a `CascadeClassifier` the fingerprint of its head and its threshold.
+    """
+    if isinstance(classifier, CascadeClassifier):
+        # The predictions of a cascade are not the ones of its transformer alone
+        signature = pipeline_signature(classifier.classifier, revision)
+        signature['cascade'] = {'head': classifier.head.fingerprint(), 'threshold': classifier.threshold}
+        return signature
+    model = getattr(classifier, 'model', None)
+    if model is not None:
+        config = model.config
+        model_name = config._name_or_path
+        task = getattr(classifier, 'task', None)
+        problem_type = getattr(config, 'problem_type', None)
+        pipeline_kwargs = {}
+        for params in ('_preprocess_params', '_forward_params', '_postprocess_params'):
+            pipeline_kwargs.update(getattr(classifier, params, {}))
+        # A quantized model is named as in the pipeline arguments of a `RemotePipeline`
+        if getattr(model, 'quantization', None) is not None:
+            pipeline_kwargs['quantize'] = model.quantization
+        revision = revision or getattr(config, '_commit_hash', None) or local_revision(model_name)
+    else:
+        model_name = classifier.model_name
+        task = classifier.task
+        problem_type = classifier.problem_type
+        pipeline_kwargs = classifier.pipeline_kwargs
+        revision = revision or local_revision(model_name)
+    return {
+        'model_name': model_name,
+        'revision': revision,
+        'task': task,
+        'problem_type': problem_type,
+        'pipeline_kwargs': {key: value if isinstance(value, (int, float, str, bool, type(None))) else repr(value) for key, value in sorted(pipeline_kwargs.items())},
+    }
+
+
+class PredictionCache:
+    """
+    A disk-backed cache of the predictions of a classifier, keyed by the signature of the model (name, revision, task and pipeline arguments) and the hash of each document.
+
+    The predictions of every model are stored in one SQLite database, as JSON, so that the predictions of a document are computed once per model and reused when the labelled dataset is rebuilt.
+    """
+
+    def __init__(self, path: str, signature: dict) -> None:
+        """
+        Parameters
+        ----------
+            path (str): The path of the SQLite database, created if needed.
+            signature (dict): The signature of the model (see `pipeline_signature`).
+        """
+        self.path = path
+        self.signature = signature
+        self.model_key = hashlib.sha1(json.dumps(signature, sort_keys=True).encode('utf-8')).hexdigest()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path)
+        with self._connection:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS models (model_key TEXT PRIMARY KEY, signature TEXT NOT NULL, created_at TEXT NOT NULL)')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS predictions (model_key TEXT NOT NULL, text_hash TEXT NOT NULL, prediction TEXT NOT NULL, PRIMARY KEY (model_key, text_hash)) WITHOUT ROWID')
+            self._connection.execute('INSERT OR IGNORE INTO models VALUES (?, ?, ?)', (self.model_key, json.dumps(signature, sort_keys=True), time.strftime('%Y-%m-%dT%H:%M:%S')))
+
+    @classmethod
+    def for_prediction(cls, path: str, prediction) -> 'PredictionCache':
+        """
+        Open the cache of the predictions of a `Prediction`, keyed by its signature (see `Prediction.signature`), so that the predictions of a classifier made with other window settings are never mixed.
+
+        Parameters
+        ----------
+            path (str): The path of the SQLite database.
+            prediction (Prediction): The prediction whose predictions are cached.
+
+        Returns
+        -------
+            PredictionCache: The cache.
+        """
+        return cls(path, prediction.signature())
+
+    def __len__(self) -> int:
+        return self._connection.execute('SELECT COUNT(*) FROM predictions WHERE model_key = ?', (self.model_key,)).fetchone()[0]
+
+    def __contains__(self, text: str) -> bool:
+        return self._connection.execute('SELECT 1 FROM predictions WHERE model_key = ? AND text_hash = ?', (self.model_key, text_hash(text))).fetchone() is not None
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def get(self, docs: List[str], chunk_size: int = 500) -> Tuple[list, List[int]]:
+        """
+        Look up the predictions of a list of documents.
+
+        Parameters
+        ----------
+            docs (list): A list of documents.
+            chunk_size (int): The number of hashes looked up per query. Defaults to 500.
+
+        Returns
+        -------
+            tuple: A tuple containing the list of the predictions of the documents (None for the documents missing from the cache), and the positions of the documents missing from the cache.
+        """
+        hashes = [text_hash(doc) for doc in docs]
+        found = {}
+        distinct_hashes = list(dict.fromkeys(hashes))
+        for start in range(0, len(distinct_hashes), chunk_size):
+            chunk = distinct_hashes[start:start + chunk_size]
+            rows = self._connection.execute(
+                f"SELECT text_hash, prediction FROM predictions WHERE model_key = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                [self.model_key] + chunk,
+            )
+            found.update((key, json.loads(prediction)) for key, prediction in rows)
+        predictions = [found.get(key) for key in hashes]
+        missing = [i for i, key in enumerate(hashes) if key not in found]
+        return predictions, missing
+
+    def put(self, docs: List[str], predictions: list) -> None:
+        """
+        Add the predictions of documents to the cache.
+
+        Parameters
+        ----------
+            docs (list): A list of documents.
+            predictions (list): The predictions of the documents, in the same order.
+        """
+        with self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO predictions VALUES (?, ?, ?)',
+                ((self.model_key, text_hash(doc), json.dumps(prediction)) for doc, prediction in zip(docs, predictions)),
+            )
+
+    def predict(self, predict_function: Callable[[List[str]], list], docs: List[str]) -> list:
+        """
+        Get the predictions of a list of documents, only running the classifier on the distinct documents missing from the cache.
+
+        Parameters
+        ----------
+            predict_function (callable): A function returning the predictions of a list of documents, in order.
+            docs (list): A list of documents.
+
+        Returns
+        -------
+            list: The predictions of the documents.
+        """
+        predictions, missing = self.get(docs)
+        if not missing:
+            return predictions
+
+        # Predict each distinct missing document only once
+        missing_docs = list(dict.fromkeys(docs[i] for i in missing))
+        new_predictions = predict_function(missing_docs)
+        self.put(missing_docs, new_predictions)
+
+        prediction_of = dict(zip(missing_docs, new_predictions))
+        for i in missing:
+            predictions[i] = prediction_of[docs[i]]
+        return predictions
@@ -0,0 +1,86 @@
+import time
+from typing import Union
+
+import numpy as np
+import pandas as pd
+import torch
+
+from clustering.clustering import ClusteringMethod
+from prediction.prediction import Prediction
+from prediction.score_matrix import best_of, scores_to_matrix
+
+
+def quantization_report(df: pd.DataFrame,
+                        model_name: str,
+                        task: str = 'text-classification',
+                        quantize: str = 'int8',
+                        problem_type: Union[str, None] = None,
+                        sample_size: int = 1000,
+                        random_state: int = 42,
+                        max_batch_tokens: int = 8192,
+                        max_batch_size: int = 64,
+                        **kwargs) -> dict:
+    """
+    Compare a quantized classifier with its full-precision version on a sample of the documents: how often they agree on the label, how much the scores change, and how much faster the quantized model is.
+
+    Both models score the same sample with the same batches (see `Prediction`), in this process, so that the throughputs are comparable.
+
+    Parameters
+    ----------
+        df (pd.DataFrame): The DataFrame of the documents, in a 'processed_data' column.
+        model_name (str): The name of the model.
+        task (str): The task of the pipeline. Defaults to 'text-classification'.
+        quantize (str): The quantization compared with full precision (see `ClusteringMethod.load_model_huggingface`). Defaults to 'int8'.
+        problem_type (str): The problem type of the model ("multi_label_classification" for multi-label tasks). Defaults to None.
+        sample_size (int): The number of documents of the sample. Defaults to 1000.
+        random_state (int): The seed of the sample. Defaults to 42.
+        max_batch_tokens (int): The maximum number of tokens of a padded batch. Defaults to 8192.
+        max_batch_size (int): The maximum number of documents of a batch. Defaults to 64.
+        kwargs (dict): Additional arguments of the pipeline (e.g. `truncation`, `top_k`).
+
+    Returns
+    -------
+        dict: The size of the sample, the label agreement (of the best label for a multi-label model), the mean and maximum absolute difference of the scores, the throughputs in documents per second and the speedup.
+    """
+    sample = df[['processed_data']].dropna()
+    sample = sample.sample(n=min(sample_size, len(sample)), random_state=random_state)
+    docs = sample['processed_data'].astype(str).tolist()
+    if not docs:
+        raise ValueError("No document to score")
+
+    scores, labels, throughputs, lengths = {}, {}, {}, None
+    for name, quantization in (('fp32', None), (quantize, quantize)):
+        classifier = ClusteringMethod.load_model_huggingface(model_name, task, problem_type=problem_type, use_worker=False, quantize=quantization, **kwargs)
+        prediction = Prediction(sample, name, classifier, max_batch_tokens=max_batch_tokens, max_batch_size=max_batch_size, show_progress_bar=False)
+        if lengths is None:
+            lengths = prediction.token_lengths(docs)
+        # Warm up, so that the one-off costs are not counted
+        prediction.predict(docs[:min(len(docs), max_batch_size)], lengths=lengths[:max_batch_size])
+        start = time.perf_counter()
+        with torch.inference_mode():
+            predictions = prediction.predict(docs, lengths=lengths)
+        throughputs[name] = len(docs) / (time.perf_counter() - start)
+
+        # Compare the scores of every label; a single-label pipeline only returns the score of its best label, the
+        # other labels of a document count as 0
+        if isinstance(predictions[0], list):
+            label_names, matrix = scores_to_matrix(predictions, prediction.labels())
+        else:
+            label_names, matrix = scores_to_matrix([[item] for item in predictions], prediction.labels())
+            matrix = np.nan_to_num(matrix)
+        labels[name] = best_of(label_names, matrix)[0]
+        scores[name] = pd.DataFrame(matrix, columns=label_names)
+
+    reference, quantized = scores['fp32'], scores[quantize].reindex(columns=scores['fp32'].columns, fill_value=0)
+    differences = np.abs(reference.to_numpy() - quantized.to_numpy())
+    return {
+        'model_name': model_name,
+        'quantize': quantize,
+        'n_documents': len(docs),
+        'label_agreement': float(np.mean(labels['fp32'] == labels[quantize])),
+        'mean_abs_score_difference': float(differences.mean()),
+        'max_abs_score_difference': float(differences.max()),
+        'fp32_docs_per_s': throughputs['fp32'],
+        f'{quantize}_docs_per_s': throughputs[quantize],
+        'speedup': throughputs[quantize] / throughputs['fp32'],
+    }
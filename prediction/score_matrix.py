@@ -0,0 +1,150 @@
+import ast
+from operator import itemgetter
+from typing import List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+
+SEPARATOR = '__'
+
+
+def scores_to_matrix(predictions: list, labels: Union[List[str], None] = None) -> Tuple[List[str], np.ndarray]:
+    """
+    Gather the multi-label predictions of a pipeline into a dense score matrix.
+
+    Parameters
+    ----------
+        predictions (list): The predictions of the documents, each one a list of {'label', 'score'} dictionaries (the output of a pipeline with `top_k=None`) or a dictionary of label-score pairs.
+        labels (list): The labels, in the order of the columns, e.g. the `id2label` of the model. Labels of the predictions missing from this list are added after it, sorted. Defaults to None (the labels of the predictions, sorted). A label missing from the prediction of a document scores NaN.
+
+    Returns
+    -------
+        tuple: The labels and the (N, n_labels) float32 score matrix.
+    """
+    predictions = [prediction if isinstance(prediction, list) else [{'label': label, 'score': score} for label, score in prediction.items()] for prediction in predictions]
+    items = [item for prediction in predictions for item in prediction]
+    flat_labels = pd.Index(list(map(itemgetter('label'), items)), dtype=object)
+    labels = list(labels) if labels is not None else []
+    columns = pd.Index(labels, dtype=object).get_indexer(flat_labels)
+    if (columns < 0).any():
+        labels += sorted(set(flat_labels[columns < 0]))
+        columns = pd.Index(labels, dtype=object).get_indexer(flat_labels)
+
+    matrix = np.full((len(predictions), len(labels)), np.nan, dtype=np.float32)
+    rows = np.repeat(np.arange(len(predictions)), list(map(len, predictions)))
+    matrix[rows, columns] = np.fromiter(map(itemgetter('score'), items), dtype=np.float32, count=len(items))
+    return labels, matrix
+
+
+def score_columns(column: str, labels: List[str]) -> List[str]:
+    """
+    Get the names of the score columns of a multi-label prediction: `<column>__<label>`.
+    """
+    return [f'{column}{SEPARATOR}{label}' for label in labels]
+
+
+def best_of(labels: List[str], matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get the best label of every row of a score matrix and its score, with a vectorized argmax (None and NaN for rows without any score).
+    """
+    if matrix.shape[1] == 0:
+        return np.full(len(matrix), None, dtype=object), np.full(len(matrix), np.nan, dtype=np.float32)
+    no_score = np.isnan(matrix).all(axis=1)
+    filled = np.where(np.isnan(matrix), -np.inf, matrix)
+    best = filled.argmax(axis=1)
+    best_labels = np.asarray(labels, dtype=object)[best]
+    best_labels[no_score] = None
+    best_scores = filled[np.arange(len(matrix)), best].astype(np.float32)
+    best_scores[no_score] = np.nan
+    return best_labels, best_scores
+
+
+def score_matrix_frame(column: str, labels: List[str], matrix: np.ndarray, index=None) -> pd.DataFrame:
+    """
+    Build the columns of a multi-label prediction: one float32 score column per label (see `score_columns`), and the best label and its score in `best_<column>` and `best_<column>_score`.
+
+    Parameters
+    ----------
+        column (str): The name of the prediction.
+        labels (list): The labels, in the order of the columns of `matrix`.
+        matrix (numpy.ndarray): The (N, n_labels) scores.
+        index: The index of the DataFrame. Defaults to None.
+
+    Returns
+    -------
+        pd.DataFrame: The prediction columns.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    best_labels, best_scores = best_of(labels, matrix)
+    frame = pd.DataFrame(matrix, columns=score_columns(column, labels), index=index)
+    frame[f'best_{column}'] = best_labels
+    frame[f'best_{column}_score'] = best_scores
+    return frame
+
+
+def prediction_frame(column: str, predictions: list, labels: Union[List[str], None] = None, index=None) -> pd.DataFrame:
+    """
+    Build the prediction columns of a classifier, named as everywhere else: the label in `<column>` and its score in `score` for a single-label classifier, or the score matrix of a multi-label classifier (see `score_matrix_frame`).
+
+    Parameters
+    ----------
+        column (str): The name of the prediction.
+        predictions (list): The predictions of the documents: {'label', 'score'} dictionaries (single-label), or lists of them (multi-label).
+        labels (list): The labels of the classifier, in the order of its outputs (e.g. `Prediction.labels`), which orders the score columns of a multi-label prediction. Defaults to None (sorted).
+        index: The index of the DataFrame. Defaults to None.
+
+    Returns
+    -------
+        pd.DataFrame: The prediction columns.
+    """
+    if predictions and isinstance(predictions[0], list):
+        return score_matrix_frame(column, *scores_to_matrix(predictions, labels), index=index)
+    return pd.DataFrame({column: [prediction['label'] for prediction in predictions], 'score': [prediction['score'] for prediction in predictions]}, index=index)
+
+
+def read_score_matrix(df: pd.DataFrame, column: str) -> Tuple[List[str], np.ndarray]:
+    """
+    Read the score matrix of a multi-label prediction back from a DataFrame, e.g. after a round trip through CSV or Parquet.
+
+    Parameters
+    ----------
+        df (pd.DataFrame): The DataFrame with the score columns.
+        column (str): The name of the prediction.
+
+    Returns
+    -------
+        tuple: The labels and the (N, n_labels) float32 score matrix.
+    """
+    prefix = f'{column}{SEPARATOR}'
+    columns = [name for name in df.columns if isinstance(name, str) and name.startswith(prefix)]
+    if not columns:
+        raise ValueError(f"No score column of {column} found")
+    return [name[len(prefix):] for name in columns], df[columns].to_numpy(dtype=np.float32)
+
+
+def score_matrix_from_dicts(df: pd.DataFrame, dict_column: str, column: str, labels: Union[List[str], None] = None) -> pd.DataFrame:
+    """
+    Convert a former column of label-score dictionaries, stored as dictionaries or as their text in a CSV file (e.g. `proba_dict` in the files labelled before the score matrix), to the score matrix columns (see `score_matrix_frame`).
+
+    Parameters
+    ----------
+        df (pd.DataFrame): The DataFrame with the dictionary column.
+        dict_column (str): The column of the dictionaries. Empty cells get no score.
+        column (str): The name of the prediction.
+        labels (list): The labels, in the order of the columns. Defaults to None (sorted).
+
+    Returns
+    -------
+        pd.DataFrame: A copy of the DataFrame where the dictionary column is replaced by the score matrix columns.
+    """
+    cells = [ast.literal_eval(cell) if isinstance(cell, str) else cell if isinstance(cell, dict) else {} for cell in df[dict_column]]
+    frame = score_matrix_frame(column, *scores_to_matrix(cells, labels), index=df.index)
+    return pd.concat([df.drop(columns=[dict_column]), frame], axis=1)
+
+
+def score_dicts(labels: List[str], matrix: np.ndarray) -> List[dict]:
+    """
+    Convert a score matrix to one dictionary of label-score pairs per row, for the code still expecting the former dictionary cells.
+    """
+    return [{label: float(score) for label, score in zip(labels, row) if not np.isnan(score)} for row in matrix]
@@ -0,0 +1,241 @@
+import glob
+import json
+import os
+import time
+from typing import Iterable, Iterator, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from tqdm.auto import tqdm
+
+from prediction.prediction import Prediction
+from prediction.prediction_cache import PredictionCache
+
+
+class StreamingPrediction:
+    """
+    Score a dataset too large to be held in memory, chunk by chunk, and append the predictions to a Parquet sink, so that the memory stays flat and an interrupted run resumes where it stopped.
+
+    The sink is a directory of Parquet files, one per chunk (`part-<offset>.parquet`), that `pd.read_parquet(sink_path)` reads as one DataFrame. After each chunk is written, the offset of the next row to score is saved in the checkpoint file of the sink (`_checkpoint.json`). On restart, the rows before this offset are skipped without being scored, and the chunks written after the last checkpoint are overwritten.
+
+    Example
+    -------
+        classifier = ClusteringMethod.load_model_huggingface(model_name, 'text-classification', truncation=True, max_length=512)
+        streaming = StreamingPrediction('sentiment_label', classifier, 'outputs/sentiment', chunk_size=20000, cache='outputs/predictions.sqlite')
+        streaming.run('outputs/processed_data.parquet')
+        df_predicted = streaming.read()
+    """
+
+    CHECKPOINT = '_checkpoint.json'
+
+    def __init__(self,
+                 predicted_column_name: str,
+                 classifier,
+                 sink_path: str,
+                 chunk_size: int = 10000,
+                 max_batch_tokens: int = 8192,
+                 max_batch_size: int = 64,
+                 cache: Union[PredictionCache, str, None] = None,
+                 show_progress_bar: bool = True,
+                 long_texts: str = 'truncate',
+                 window_overlap: int = 64,
+                 window_aggregation: str = 'mean') -> None:
+        """
+        Parameters
+        ----------
+            predicted_column_name (str): The name of the prediction column (see `Prediction`).
+            classifier (pipeline): The Hugging Face pipeline, or the `RemotePipeline` returned by `ClusteringMethod.load_model_huggingface` when the inference worker is running.
+            sink_path (str): The directory of the Parquet sink, created if needed.
+            chunk_size (int): The number of rows read, scored and written at once. Defaults to 10000.
+            max_batch_tokens (int): The maximum number of tokens of a padded batch. Defaults to 8192.
+            max_batch_size (int): The maximum number of documents of a batch. Defaults to 64.
+            cache (PredictionCache | str): An optional cache of the predictions of the classifier, opened with the signature of the predictions (see `PredictionCache.for_prediction`), or the path of its SQLite database. Defaults to None (no cache).
+            show_progress_bar (bool): Whether to display the progress of the predictions. Defaults to True.
+            long_texts (str): How the documents longer than the maximum length of the model are scored (see `Prediction`). Defaults to 'truncate'.
+            window_overlap (int): The number of tokens shared by consecutive windows. Defaults to 64.
+            window_aggregation (str): How the scores of the windows of a document are combined. Defaults to 'mean'.
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be positive")
+        self.predicted_column_name = predicted_column_name
+        self.classifier = classifier
+        self.sink_path = sink_path
+        self.chunk_size = chunk_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.show_progress_bar = show_progress_bar
+        self.prediction_kwargs = {'long_texts': long_texts, 'window_overlap': window_overlap, 'window_aggregation': window_aggregation}
+        # The chunks are scored with the same settings, the cache and the sink are keyed by their signature
+        prediction = Prediction(pd.DataFrame({'processed_data': []}), predicted_column_name, classifier, **self.prediction_kwargs)
+        self.cache = PredictionCache.for_prediction(cache, prediction) if isinstance(cache, str) else cache
+        self.signature = {'predicted_column_name': predicted_column_name, 'classifier': prediction.signature()}
+
+    @property
+    def checkpoint_path(self) -> str:
+        return os.path.join(self.sink_path, self.CHECKPOINT)
+
+    def checkpoint(self) -> dict:
+        """
+        Read the checkpoint of the sink.
+
+        Returns
+        -------
+            dict: The offset of the next row to score, the number of chunks written, and whether the source was scored until its end. A new sink starts at offset 0.
+        """
+        if not os.path.exists(self.checkpoint_path):
+            return {'offset': 0, 'n_chunks': 0, 'completed': False, 'signature': self.signature}
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_checkpoint(self, checkpoint: dict) -> None:
+        # Replace the checkpoint atomically, so that a crash leaves either the previous one or the new one
+        temporary_path = f'{self.checkpoint_path}.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f, indent=2)
+        os.replace(temporary_path, self.checkpoint_path)
+
+    def part_paths(self) -> list:
+        """
+        Get the Parquet files of the sink, in the order of the rows.
+        """
+        return sorted(glob.glob(os.path.join(self.sink_path, 'part-*.parquet')))
+
+    @staticmethod
+    def iter_chunks(source: Union[str, pd.DataFrame, Iterable[pd.DataFrame]], chunk_size: int, offset: int = 0) -> Iterator[pd.DataFrame]:
+        """
+        Read a source chunk by chunk, from a row offset.
+
+        Parameters
+        ----------
+            source (str | pd.DataFrame | iterable): The path of a Parquet or CSV file, a DataFrame, or an iterable of DataFrames yielding the same rows in the same order at every run.
+            chunk_size (int): The number of rows of a chunk.
+            offset (int): The number of rows to skip. Defaults to 0.
+
+        Returns
+        -------
+            iterator: The chunks, as DataFrames indexed by the position of their rows in the source.
+        """
+        if isinstance(source, pd.DataFrame):
+            frames = (source.iloc[start:start + chunk_size] for start in range(offset, len(source), chunk_size))
+            position = offset
+        elif isinstance(source, str) and source.endswith('.parquet'):
+            parquet_file = pq.ParquetFile(source)
+            # Skip the row groups before the offset without reading them
+            position, row_group = 0, 0
+            while row_group < parquet_file.num_row_groups and position + parquet_file.metadata.row_group(row_group).num_rows <= offset:
+                position += parquet_file.metadata.row_group(row_group).num_rows
+                row_group += 1
+            row_groups = list(range(row_group, parquet_file.num_row_groups))
+            frames = (batch.to_pandas() for batch in parquet_file.iter_batches(batch_size=chunk_size, row_groups=row_groups)) if row_groups else iter(())
+        elif isinstance(source, str):
+            # The skipped rows of a CSV file are parsed, but not scored
+            frames = pd.read_csv(source, chunksize=chunk_size, skiprows=range(1, offset + 1))
+            position = offset
+        else:
+            frames = iter(source)
+            position = 0
+
+        buffer, buffered = [], 0
+        for frame in frames:
+            # Drop the rows before the offset
+            if position < offset:
+                skipped = min(offset - position, len(frame))
+                frame = frame.iloc[skipped:]
+                position += skipped
+            if frame.empty:
+                continue
+            buffer.append(frame)
+            buffered += len(frame)
+            while buffered >= chunk_size:
+                chunk = pd.concat(buffer) if len(buffer) > 1 else buffer[0]
+                yield chunk.iloc[:chunk_size].set_axis(pd.RangeIndex(position, position + chunk_size))
+                position += chunk_size
+                buffer, buffered = [chunk.iloc[chunk_size:]], buffered - chunk_size
+        if buffered:
+            chunk = pd.concat(buffer) if len(buffer) > 1 else buffer[0]
+            yield chunk.set_axis(pd.RangeIndex(position, position + buffered))
+
+    def run(self, source: Union[str, pd.DataFrame, Iterable[pd.DataFrame]], total: Union[int, None] = None) -> dict:
+        """
+        Score a source chunk by chunk, resuming from the checkpoint of the sink.
+
+        Parameters
+        ----------
+            source (str | pd.DataFrame | iterable): The documents, in a 'processed_data' column (see `iter_chunks`).
+            total (int): The number of rows of the source, for the progress bar. Defaults to None (read from the metadata of a Parquet file or the length of a DataFrame).
+
+        Returns
+        -------
+            dict: The checkpoint of the sink at the end of the run.
+        """
+        os.makedirs(self.sink_path, exist_ok=True)
+        checkpoint = self.checkpoint()
+        if checkpoint['signature'] != self.signature:
+            raise ValueError(f"The sink {self.sink_path} holds the predictions of another classifier or column")
+        if checkpoint['completed']:
+            return checkpoint
+
+        # Remove the chunks written after the last checkpoint, they are scored again
+        for path in self.part_paths()[checkpoint['n_chunks']:]:
+            os.remove(path)
+        parts = self.part_paths()
+        schema = pq.read_schema(parts[0]) if parts else None
+
+        if total is None:
+            if isinstance(source, pd.DataFrame):
+                total = len(source)
+            elif isinstance(source, str) and source.endswith('.parquet'):
+                total = pq.ParquetFile(source).metadata.num_rows
+
+        with tqdm(total=total, initial=checkpoint['offset'], desc=f"Predicting {self.predicted_column_name}", unit='rows', disable=not self.show_progress_bar) as progress_bar:
+            for chunk in self.iter_chunks(source, self.chunk_size, checkpoint['offset']):
+                start = time.perf_counter()
+                prediction = Prediction(chunk, self.predicted_column_name, self.classifier, max_batch_tokens=self.max_batch_tokens, max_batch_size=self.max_batch_size, show_progress_bar=False, cache=self.cache, **self.prediction_kwargs)
+                df_predicted = prediction.make_predictions_df()
+
+                # Every chunk is written with the schema of the first one, so that the sink is read as one table
+                if schema is None:
+                    table = pa.Table.from_pandas(df_predicted, preserve_index=False)
+                    schema = table.schema
+                else:
+                    unexpected_columns = set(df_predicted.columns) - set(schema.names)
+                    if unexpected_columns:
+                        raise ValueError(f"Chunk at offset {chunk.index[0]} has columns missing from the sink: {sorted(unexpected_columns)}")
+                    table = pa.Table.from_pandas(df_predicted.reindex(columns=schema.names), schema=schema, preserve_index=False)
+
+                part_path = os.path.join(self.sink_path, f'part-{chunk.index[0]:012d}.parquet')
+                temporary_path = os.path.join(self.sink_path, f'.part-{chunk.index[0]:012d}.parquet.tmp')
+                pq.write_table(table, temporary_path)
+                os.replace(temporary_path, part_path)
+
+                checkpoint = {
+                    'offset': int(chunk.index[-1]) + 1,
+                    'n_chunks': checkpoint['n_chunks'] + 1,
+                    'completed': False,
+                    'signature': self.signature,
+                    'last_chunk_time_s': time.perf_counter() - start,
+                }
+                self._write_checkpoint(checkpoint)
+                progress_bar.update(len(chunk))
+
+        checkpoint['completed'] = True
+        self._write_checkpoint(checkpoint)
+        return checkpoint
+
+    def read(self, columns: Union[list, None] = None) -> pd.DataFrame:
+        """
+        Read the predictions written to the sink.
+
+        Parameters
+        ----------
+            columns (list): The columns to read. Defaults to None (all the columns).
+
+        Returns
+        -------
+            pd.DataFrame: The rows scored so far, in the order of the source.
+        """
+        parts = self.part_paths()[:self.checkpoint()['n_chunks']]
+        if not parts:
+            return pd.DataFrame()
+        return pa.concat_tables([pq.read_table(path, columns=columns) for path in parts]).to_pandas()
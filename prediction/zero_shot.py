@@ -0,0 +1,196 @@
+from typing import Callable, Dict, List, Union
+
+import numpy as np
+import pandas as pd
+
+from clustering.centroids import normalize_rows
+
+
+class EmbeddingZeroShot:
+    """
+    Zero-shot labelling by embedding similarity: the descriptions of the labels (e.g. the seed lists `labels` of utils/schneider.py) are embedded once, and every document gets the labels whose descriptions are the most similar to its embedding, with one matrix multiplication for all the documents.
+
+    An NLI zero-shot pipeline can optionally re-rank the `nli_top_k` best labels of every document, so that it runs one pass per (document, candidate label) pair for these candidates only, instead of one pass per (document, label) pair.
+
+    Example
+    -------
+        clustering_method = ClusteringMethod(model_name, cache_dir=cache_dir)
+        zero_shot = EmbeddingZeroShot(clustering_method.encode, labels, label_names=['product', 'pricing', 'quality', 'delivery', 'customer support', 'technical support', 'response time', 'business relation'])
+        df_labelled = zero_shot.label_df(df, 'zero_shot_label', embeddings=clustering_method.embeddings)
+    """
+
+    AGGREGATIONS = ('mean', 'max')
+
+    def __init__(self,
+                 encode: Callable[[List[str]], np.ndarray],
+                 labels: Union[Dict[str, Union[str, List[str]]], List[List[str]]],
+                 label_names: Union[List[str], None] = None,
+                 aggregation: str = 'mean',
+                 temperature: float = 0.05) -> None:
+        """
+        Parameters
+        ----------
+            encode (callable): The function embedding texts with the sentence model of the documents, e.g. `ClusteringMethod.encode`, which reads the embeddings from the embedding cache.
+            labels (dict | list): The descriptions of the labels: either a dictionary mapping every label to a description or a list of seed words, or a list of seed lists (as the `labels` of utils/schneider.py).
+            label_names (list): The names of the labels when `labels` is a list. Defaults to None (the first seed word of every list).
+            aggregation (str): How the similarities to the seed words of a label are combined: 'mean' (similarity to the mean of their embeddings) or 'max' (similarity to the closest seed word). Defaults to 'mean'.
+            temperature (float): The temperature of the softmax turning the similarities into scores. Defaults to 0.05.
+        """
+        if aggregation not in self.AGGREGATIONS:
+            raise ValueError(f"Invalid aggregation. Must be one of {self.AGGREGATIONS}.")
+        if isinstance(labels, dict):
+            label_names = list(labels.keys())
+            seeds = [[description] if isinstance(description, str) else list(description) for description in labels.values()]
+        else:
+            seeds = [list(seed_list) for seed_list in labels]
+            label_names = list(label_names) if label_names is not None else [seed_list[0] for seed_list in seeds]
+        if len(label_names) != len(seeds):
+            raise ValueError("There must be one name per label")
+        if len(set(label_names)) != len(label_names):
+            raise ValueError("The names of the labels must be unique")
+
+        self.encode = encode
+        self.label_names = label_names
+        self.aggregation = aggregation
+        self.temperature = temperature
+
+        # Embed every seed word once
+        seed_texts = [seed for seed_list in seeds for seed in seed_list]
+        self.seed_embeddings = normalize_rows(np.asarray(encode(seed_texts), dtype=np.float32))
+        self.seed_labels = np.repeat(np.arange(len(seeds)), [len(seed_list) for seed_list in seeds])
+        self.label_embeddings = normalize_rows(np.vstack([self.seed_embeddings[self.seed_labels == label].mean(axis=0) for label in range(len(seeds))]))
+
+    def similarities(self, embeddings: np.ndarray, block_size: int = 16384) -> np.ndarray:
+        """
+        Compute the cosine similarities between documents and labels.
+
+        Parameters
+        ----------
+            embeddings (numpy.ndarray): The (N, dim) embeddings of the documents.
+            block_size (int): The number of documents processed at once, bounding the memory of the 'max' aggregation. Defaults to 16384.
+
+        Returns
+        -------
+            numpy.ndarray: The (N, n_labels) float32 similarities.
+        """
+        similarities = np.empty((len(embeddings), len(self.label_names)), dtype=np.float32)
+        for start in range(0, len(embeddings), block_size):
+            block = normalize_rows(np.asarray(embeddings[start:start + block_size], dtype=np.float32))
+            if self.aggregation == 'mean':
+                similarities[start:start + len(block)] = block @ self.label_embeddings.T
+            else:
+                seed_similarities = block @ self.seed_embeddings.T
+                for label in range(len(self.label_names)):
+                    similarities[start:start + len(block), label] = seed_similarities[:, self.seed_labels == label].max(axis=1)
+        return similarities
+
+    def scores(self, embeddings: np.ndarray) -> np.ndarray:
+        """
+        Compute the scores of the labels of every document: the softmax of the similarities divided by the temperature.
+
+        Returns
+        -------
+            numpy.ndarray: The (N, n_labels) float32 scores, summing to 1 for every document.
+        """
+        logits = self.similarities(embeddings) / self.temperature
+        logits = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return logits / logits.sum(axis=1, keepdims=True)
+
+    def refine(self, docs: List[str], scores: np.ndarray, nli_classifier, nli_top_k: int = 3, hypothesis_template: str = 'This example is {}.', label_hypotheses: Union[Dict[str, str], None] = None, batch_size: int = 16) -> np.ndarray:
+        """
+        Re-rank the best labels of every document with an NLI zero-shot pipeline.
+
+        The documents are grouped by their set of candidate labels, so that every group is classified by the pipeline in batches.
+
+        Parameters
+        ----------
+            docs (list): The documents.
+            scores (numpy.ndarray): The (N, n_labels) embedding scores of the documents (see `scores`).
+            nli_classifier (pipeline): A Hugging Face "zero-shot-classification" pipeline.
+            nli_top_k (int): The number of best labels of every document re-ranked by the pipeline. Defaults to 3.
+            hypothesis_template (str): The hypothesis of the pipeline. Defaults to 'This example is {}.'.
+            label_hypotheses (dict): The text used for every label in the hypothesis. Defaults to None (the label names).
+            batch_size (int): The batch size of the pipeline. Defaults to 16.
+
+        Returns
+        -------
+            numpy.ndarray: The (N, n_labels) scores, where the scores of the candidate labels of every document are the NLI scores (summing to 1) and the other labels score 0.
+        """
+        label_hypotheses = label_hypotheses or {}
+        hypotheses = [label_hypotheses.get(name, name) for name in self.label_names]
+        label_of_hypothesis = {hypothesis: label for label, hypothesis in enumerate(hypotheses)}
+        candidates = np.sort(np.argsort(-scores, axis=1)[:, :nli_top_k], axis=1)
+
+        refined = np.zeros_like(scores)
+        groups = pd.DataFrame(candidates).groupby(list(range(candidates.shape[1]))).indices
+        for candidate_labels, rows in groups.items():
+            candidate_labels = np.atleast_1d(candidate_labels)
+            outputs = nli_classifier([docs[row] for row in rows], candidate_labels=[hypotheses[label] for label in candidate_labels], hypothesis_template=hypothesis_template, batch_size=batch_size)
+            if isinstance(outputs, dict):
+                outputs = [outputs]
+            for row, output in zip(rows, outputs):
+                for hypothesis, score in zip(output['labels'], output['scores']):
+                    refined[row, label_of_hypothesis[hypothesis]] = score
+        return refined
+
+    def predict(self, docs: Union[List[str], None] = None, embeddings: Union[np.ndarray, None] = None, top_k: int = 3, nli_classifier=None, nli_top_k: int = 3, **nli_kwargs) -> list:
+        """
+        Label documents, in the output format of the Hugging Face zero-shot pipeline.
+
+        Parameters
+        ----------
+            docs (list): The documents. Only needed to embed them, or to refine the labels with an NLI pipeline. Defaults to None.
+            embeddings (numpy.ndarray): The embeddings of the documents, e.g. the ones computed by `ClusteringMethod.run_bertopic`. Defaults to None (computed with `encode`).
+            top_k (int): The number of labels returned per document. Defaults to 3.
+            nli_classifier (pipeline): An optional "zero-shot-classification" pipeline re-ranking the best labels (see `refine`). Defaults to None.
+            nli_top_k (int): The number of labels re-ranked by the pipeline. Defaults to 3.
+            nli_kwargs (dict): Additional keyword arguments to be passed to `refine`.
+
+        Returns
+        -------
+            list: One {'sequence', 'labels', 'scores'} dictionary per document, with its `top_k` best labels sorted by decreasing score.
+        """
+        if embeddings is None:
+            if docs is None:
+                raise ValueError("Either docs or embeddings must be provided")
+            embeddings = self.encode(docs)
+        scores = self.scores(embeddings)
+        if nli_classifier is not None:
+            if docs is None:
+                raise ValueError("The documents are needed to refine the labels with an NLI pipeline")
+            scores = self.refine(docs, scores, nli_classifier, nli_top_k=nli_top_k, **nli_kwargs)
+            top_k = min(top_k, nli_top_k)
+
+        top_k = min(top_k, len(self.label_names))
+        best = np.argsort(-scores, axis=1)[:, :top_k]
+        return [
+            {
+                'sequence': docs[row] if docs is not None else None,
+                'labels': [self.label_names[label] for label in best[row]],
+                'scores': [float(scores[row, label]) for label in best[row]],
+            }
+            for row in range(len(scores))
+        ]
+
+    def label_df(self, df: pd.DataFrame, predicted_column_name: str = 'zero_shot_label', embeddings: Union[np.ndarray, None] = None, text_column: str = 'processed_data', **kwargs) -> pd.DataFrame:
+        """
+        Add the best label of every document and its score to a DataFrame.
+
+        Parameters
+        ----------
+            df (pd.DataFrame): The DataFrame of the documents.
+            predicted_column_name (str): The name of the label column; the score is added as `<predicted_column_name>_score`. Defaults to 'zero_shot_label'.
+            embeddings (numpy.ndarray): The embeddings of the documents, in the order of `df`. Defaults to None (computed with `encode`).
+            text_column (str): The column of the documents. Defaults to 'processed_data'.
+            kwargs (dict): Additional keyword arguments to be passed to `predict` (e.g. `nli_classifier`).
+
+        Returns
+        -------
+            pd.DataFrame: A copy of the DataFrame with the label and score columns.
+        """
+        docs = df[text_column].astype(str).tolist()
+        predictions = self.predict(docs, embeddings=embeddings, top_k=1, **kwargs)
+        df_labelled = df.copy()
+        df_labelled[predicted_column_name] = [prediction['labels'][0] for prediction in predictions]
+        df_labelled[f'{predicted_column_name}_score'] = [prediction['scores'][0] for prediction in predictions]
+        return df_labelled
@@ -0,0 +1,106 @@
+import os
+import random
+import string
+import sys
+
+import pandas as pd
+import pytest
+
+# The modules of the repository are imported from its root, as in main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ['delivery', 'time', 'price', 'support', 'technical', 'quality', 'product', 'service', 'customer', 'late', 'good', 'bad', 'fast', 'slow', 'invoice', 'order', 'stock', 'response', 'answer', 'quick', 'sales', 'team', 'software', 'drive', 'manual', 'help', 'issue', 'repair', 'warranty', 'shipping', 'lead', 'date']
+GROUPS = [
+    ['delivery', 'time', 'late', 'shipping', 'lead', 'date', 'stock'],
+    ['price', 'invoice', 'order', 'sales', 'team'],
+    ['support', 'technical', 'help', 'response', 'answer', 'quick'],
+    ['quality', 'product', 'issue', 'repair', 'warranty', 'software', 'drive', 'manual'],
+]
+LABELS = ['negative', 'neutral', 'positive']
+EMOTIONS = ['anger', 'joy', 'sadness', 'surprise']
+
+
+def make_corpus(n: int = 240, seed: int = 1) -> pd.DataFrame:
+    """
+    Build a DataFrame of `n` short comments about four themes, with the columns used by the pipeline.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        group = GROUPS[i % len(GROUPS)]
+        words = rng.choices(group, k=8) + rng.choices(['good', 'bad', 'fast', 'slow', 'service', 'customer'], k=3)
+        rows.append({
+            'processed_data': ' '.join(words),
+            'theme': i % len(GROUPS),
+            'year': 2020 + i % 3,
+            'Zone': f'Z{i % 2}',
+            'year_month': f'2021-{1 + i % 6:02d}',
+        })
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture
+def corpus() -> pd.DataFrame:
+    return make_corpus()
+
+
+@pytest.fixture(scope='session')
+def tiny_models(tmp_path_factory) -> dict:
+    """
+    Build tiny randomly initialized models on disk: a SentenceTransformer, a 3-label classifier and a 4-label multi-label classifier, sharing a word-level tokenizer.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import BertConfig, BertForSequenceClassification, BertModel, BertTokenizerFast
+
+    torch.manual_seed(0)
+    root = tmp_path_factory.mktemp('models')
+    vocab = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + WORDS + list(string.ascii_lowercase) + ['##' + c for c in string.ascii_lowercase] + list('.,!?')
+    vocab_path = root / 'vocab.txt'
+    vocab_path.write_text('\n'.join(vocab))
+    tokenizer = BertTokenizerFast(str(vocab_path), do_lower_case=True, model_max_length=64)
+    config = dict(vocab_size=len(vocab), hidden_size=32, num_hidden_layers=2, num_attention_heads=2, intermediate_size=64, max_position_embeddings=64)
+
+    paths = {name: str(root / name) for name in ('bert', 'sentence', 'classifier', 'multi_label')}
+    BertModel(BertConfig(**config)).save_pretrained(paths['bert'])
+    tokenizer.save_pretrained(paths['bert'])
+    transformer = models.Transformer(paths['bert'], max_seq_length=64)
+    SentenceTransformer(modules=[transformer, models.Pooling(transformer.get_word_embedding_dimension())]).save(paths['sentence'])
+
+    BertForSequenceClassification(BertConfig(**config, num_labels=3, id2label=dict(enumerate(LABELS)), label2id={label: i for i, label in enumerate(LABELS)})).save_pretrained(paths['classifier'])
+    tokenizer.save_pretrained(paths['classifier'])
+    BertForSequenceClassification(BertConfig(**config, num_labels=4, id2label=dict(enumerate(EMOTIONS)), label2id={label: i for i, label in enumerate(EMOTIONS)}, problem_type='multi_label_classification')).save_pretrained(paths['multi_label'])
+    tokenizer.save_pretrained(paths['multi_label'])
+    return paths
+
+
+@pytest.fixture(scope='session')
+def classifier(tiny_models):
+    from clustering.clustering import ClusteringMethod
+    return ClusteringMethod.load_model_huggingface(tiny_models['classifier'], 'text-classification', use_worker=False, truncation=True)
+
+
+@pytest.fixture(scope='session')
+def multi_label_classifier(tiny_models):
+    from clustering.clustering import ClusteringMethod
+    return ClusteringMethod.load_model_huggingface(tiny_models['multi_label'], 'text-classification', problem_type='multi_label_classification', use_worker=False, truncation=True, top_k=None)
+
+
+def bertopic_kwargs(n_topics: int = 4) -> dict:
+    """
+    Fast and deterministic BERTopic components for the tests: PCA and k-means instead of UMAP and HDBSCAN.
+    """
+    from sklearn.cluster import KMeans
+    from sklearn.decomposition import PCA
+    return {'umap_model': PCA(n_components=5, random_state=0), 'hdbscan_model': KMeans(n_clusters=n_topics, n_init=3, random_state=0)}
+
+
+@pytest.fixture
+def fitted(tiny_models, tmp_path):
+    """
+    A `ClusteringMethod` fitted on the test corpus, with an embedding cache.
+    """
+    from clustering.clustering import ClusteringMethod
+    clustering_method = ClusteringMethod(tiny_models['sentence'], cache_dir=str(tmp_path / 'cache'), use_worker=False)
+    clustering_method.run_bertopic(make_corpus(), **bertopic_kwargs())
+    return clustering_method
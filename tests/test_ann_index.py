@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from clustering.ann_index import IVFIndex
+from clustering.centroids import normalize_rows
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(8, 16))
+    topics = rng.integers(0, 8, size=2000)
+    embeddings = (centers[topics] + rng.normal(scale=0.5, size=(2000, 16))).astype(np.float32)
+    return embeddings, topics
+
+
+def test_search_finds_the_nearest_neighbours(data):
+    embeddings, topics = data
+    index = IVFIndex.build(embeddings, topics, n_lists=20, n_probe=4, dtype=np.float32)
+    queries = embeddings[:20]
+    rows, scores = index.search(queries, k=5)
+
+    exact = np.argsort(-(normalize_rows(queries) @ normalize_rows(embeddings).T), axis=1)[:, :5]
+    recall = np.mean([len(set(found) & set(expected)) / 5 for found, expected in zip(rows, exact)])
+    assert recall > 0.9
+    assert (rows[:, 0] == np.arange(20)).all()
+    assert (np.diff(scores, axis=1) <= 1e-6).all()
+
+
+def test_filters_only_return_matching_documents(data):
+    embeddings, topics = data
+    index = IVFIndex.build(embeddings, topics, n_lists=20, n_probe=1)
+    rows, _ = index.search(embeddings[0], k=30, topics=[3, 5])
+    # More lists are probed until k documents pass the filter
+    assert (rows >= 0).all()
+    assert set(topics[rows]) <= {3, 5}
+
+    mask = np.arange(len(embeddings)) % 2 == 0
+    rows, _ = index.search(embeddings[:3], k=10, topics=1, mask=mask)
+    assert (topics[rows] == 1).all() and mask[rows].all()
+
+    # Missing results when fewer documents pass the filter
+    rows, scores = index.search(embeddings[0], k=5, mask=np.arange(len(embeddings)) < 2)
+    assert sorted(rows[:2].tolist()) == [0, 1] and (rows[2:] == -1).all() and np.isnan(scores[2:]).all()
+    with pytest.raises(ValueError):
+        IVFIndex.build(embeddings, n_lists=4).search(embeddings[0], topics=1)
+
+
+def test_positions_and_save_round_trip(data, tmp_path):
+    embeddings, topics = data
+    index = IVFIndex.build(embeddings, topics, n_lists=20)
+    assert (index.ids[index.positions] == np.arange(len(embeddings))).all()
+    assert np.allclose(index.vector(123), normalize_rows(embeddings[[123]])[0], atol=1e-3)
+
+    path = str(tmp_path / 'index')
+    index.save(path)
+    loaded = IVFIndex.load(path)
+    assert isinstance(loaded.vectors, np.memmap)
+    for result, expected in zip(loaded.search(embeddings[:5], k=5, topics=2), index.search(embeddings[:5], k=5, topics=2)):
+        assert np.array_equal(result, expected, equal_nan=True)
+    assert np.array_equal(loaded.vector(123), index.vector(123))
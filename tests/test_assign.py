@@ -0,0 +1,73 @@
+import numpy as np
+
+from clustering.clustering import ClusteringMethod
+from clustering.embedding_cache import EmbeddingCache
+from conftest import make_corpus
+
+
+class CountingModel:
+    """
+    A sentence model stand-in recording the documents it embeds.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.encoded = []
+
+    def encode(self, docs, **kwargs):
+        self.encoded.extend(docs)
+        return self.model.encode(docs, **kwargs)
+
+
+def test_assign_matches_transform_whatever_the_batch_size(fitted):
+    texts = make_corpus(50, seed=7)['processed_data'].tolist()
+    expected_topics, _ = fitted.topic_model.transform(texts, fitted.encode(texts))
+
+    for batch_size in (7, 1024):
+        assigned = fitted.assign(texts, batch_size=batch_size, top_k=2)
+        assert assigned['topic'].tolist() == list(expected_topics)
+        assert assigned['topic_label'].notna().all()
+        assert list(assigned.columns) == ['topic', 'topic_label', 'topic_1', 'probability_1', 'topic_2', 'probability_2']
+
+
+def test_top_k_probabilities_are_sorted():
+    probs = np.array([[0.1, 0.6, 0.3], [0.5, 0.2, 0.3]])
+    topics, top_probs = ClusteringMethod._top_k_probabilities([1, 0], probs, 2)
+    assert topics.tolist() == [[1, 2], [0, 2]]
+    assert np.allclose(top_probs, [[0.6, 0.3], [0.5, 0.3]])
+
+    # Only the probability of the assigned topic is known
+    topics, top_probs = ClusteringMethod._top_k_probabilities([3], np.array([0.9]), 2)
+    assert topics.tolist() == [[3, -1]]
+    assert np.isnan(top_probs[0, 1])
+
+
+def test_embedding_cache_only_embeds_new_documents(tiny_models, tmp_path):
+    from sentence_transformers import SentenceTransformer
+    model = CountingModel(SentenceTransformer(tiny_models['sentence']))
+    cache = EmbeddingCache(str(tmp_path), 'tiny')
+    first = cache.encode(model, ['late delivery', 'good price', 'late delivery'])
+    assert model.encoded == ['late delivery', 'good price']
+
+    # A new instance reads the shards written on disk
+    cache = EmbeddingCache(str(tmp_path), 'tiny')
+    second = cache.encode(model, ['good price', 'quick answer', 'late delivery'])
+    assert model.encoded == ['late delivery', 'good price', 'quick answer']
+    assert np.allclose(second[0], first[1]) and np.allclose(second[2], first[0])
+    assert len(cache) == 3 and 'quick answer' in cache
+
+
+def test_embedding_cache_edge_cases(tiny_models, tmp_path):
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(tiny_models['sentence'])
+    dim = model.get_sentence_embedding_dimension()
+    empty = EmbeddingCache(str(tmp_path), 'tiny').encode(CountingModel(model), [])
+    assert empty.shape == (0, dim) and empty.dtype == np.float32
+
+    # Two processes opening the same cache directory do not overwrite each other's shards
+    first, second = EmbeddingCache(str(tmp_path), 'tiny'), EmbeddingCache(str(tmp_path), 'tiny')
+    first.encode(model, ['late delivery'])
+    second.encode(model, ['good price'])
+    cache = EmbeddingCache(str(tmp_path), 'tiny')
+    assert len(cache) == 2 and 'late delivery' in cache and 'good price' in cache
+    assert cache.encode(model, []).shape == (0, dim)
@@ -0,0 +1,60 @@
+import numpy as np
+
+from clustering.centroids import nearest_centroids, normalize_rows, topic_centroids
+from clustering.clustering import ClusteringMethod
+from clustering.model_bundle import ModelBundle
+from clustering.probabilities import TopKProbabilities
+
+
+def test_centroids_and_nearest_centroids():
+    embeddings = np.array([[1, 0], [2, 0], [0, 1], [0, 3], [1, 1]], dtype=np.float32)
+    labels, centroids = topic_centroids(embeddings, np.array([0, 0, 1, 1, -1]), block_size=2)
+    assert labels.tolist() == [0, 1]
+    assert np.allclose(centroids, [[1, 0], [0, 1]])
+
+    nearest, similarities = nearest_centroids(embeddings, centroids, block_size=2)
+    assert nearest.tolist() == [0, 0, 1, 1, 0]
+    assert np.allclose(similarities, [1, 1, 1, 1, np.sqrt(0.5)])
+    # Only the requested rows are compared
+    nearest, similarities = nearest_centroids(embeddings, centroids, block_size=1, rows=np.array([3, 4]))
+    assert nearest.tolist() == [1, 0] and np.allclose(similarities, [1, np.sqrt(0.5)])
+    assert np.allclose(np.linalg.norm(normalize_rows(embeddings), axis=1), 1)
+
+
+def test_reassign_outliers(fitted):
+    topics = np.array(fitted.topics)
+    outliers = np.nonzero(topics == 0)[0][:5]
+    fitted.topics = np.where(np.isin(np.arange(len(topics)), outliers), -1, topics).tolist()
+    fitted.probs = TopKProbabilities.from_dense(np.full((len(topics), 4), 0.25), k=2)
+
+    assert fitted.reassign_outliers(threshold=1.1) == 0
+    assert fitted.reassign_outliers(threshold=-1.0, block_size=2) == 5
+
+    labels, centroids = topic_centroids(fitted.embeddings, np.where(np.isin(np.arange(len(topics)), outliers), -1, topics))
+    expected = labels[nearest_centroids(fitted.embeddings[outliers], centroids)[0]]
+    assert np.array(fitted.topics)[outliers].tolist() == expected.tolist()
+    assert fitted.topic_model.topic_sizes_[-1] == 0
+    # The most probable topic of a reassigned document is its new topic
+    assert fitted.probs.indices[outliers, 0].tolist() == expected.tolist()
+
+
+def test_reassign_outliers_detaches_the_loaded_bundle(fitted, tiny_models, tmp_path):
+    topics = np.array(fitted.topics)
+    topics[:3] = -1
+    fitted.topics = topics.tolist()
+    fitted.build_topic_tree()
+    fitted.build_ann_index(n_lists=4)
+    path = str(tmp_path / 'bundle')
+    fitted.save(path)
+
+    clustering = ClusteringMethod(tiny_models['sentence'])
+    clustering.load(path)
+    assert clustering.reassign_outliers(threshold=-1.0) == 3
+    assert clustering.bundle is None and clustering.topic_tree is None
+    assert (clustering.ann_index.topics != -1).all()
+    # The bundle keeps the former topics until the model is saved again
+    clustering.build_topic_tree()
+    assert ModelBundle(path).topics[:3] == [-1, -1, -1] and (ModelBundle(path).ann_index.topics[:3] == -1).all()
+    clustering.save(path)
+    assert -1 not in ModelBundle(path).topics and (ModelBundle(path).ann_index.topics != -1).all()
+    assert ModelBundle(path).topic_tree.n_topics == clustering.topic_tree.n_topics
@@ -0,0 +1,45 @@
+import pytest
+
+from clustering.doc_term_matrix import compute_doc_term_matrix, load_doc_term_matrix, save_doc_term_matrix, topics_per_class_from_matrix
+from conftest import make_corpus
+from visualization.Bertopic.Barchart.bertopic_barchart import BertopicBarchart
+
+
+def test_matrix_matches_the_vectorizer(fitted, tmp_path):
+    model = fitted.topic_model
+    matrix = compute_doc_term_matrix(model, fitted.docs, batch_size=50)
+    assert (matrix != model.vectorizer_model.transform(fitted.docs)).nnz == 0
+    assert compute_doc_term_matrix(model, []).shape == (0, matrix.shape[1])
+
+    path = str(tmp_path / 'matrix.npz')
+    save_doc_term_matrix(path, matrix)
+    assert (load_doc_term_matrix(path) != matrix).nnz == 0
+
+
+def test_topics_per_class_matches_bertopic(fitted):
+    model = fitted.topic_model
+    classes = make_corpus()['Zone'].tolist()
+    from_matrix = topics_per_class_from_matrix(model, fitted.get_doc_term_matrix(), model.topics_, classes)
+    expected = model.topics_per_class(fitted.docs, classes=classes)
+    key = ['Class', 'Topic']
+    assert from_matrix.sort_values(key)[key + ['Frequency']].values.tolist() == expected.sort_values(key)[key + ['Frequency']].values.tolist()
+
+
+def test_barchart_selects_the_rows_of_the_documents(fitted):
+    df = make_corpus()
+    df['topic'] = fitted.topics
+    subset = df[df.year == df.year.iloc[0]]
+    barchart = BertopicBarchart(fitted.topic_model, fitted.get_doc_term_matrix())
+    expected = barchart.create_topics_per_class_df(subset, 'Zone')
+
+    # An index which is not the positions of the documents must come with them
+    reindexed = subset.reset_index(drop=True)
+    reindexed.index = reindexed.index + len(df)
+    with pytest.raises(ValueError):
+        barchart.create_topics_per_class_df(reindexed, 'Zone')
+    positions = barchart.create_topics_per_class_df(reindexed, 'Zone', positions=subset.index.to_numpy())
+    assert positions.equals(expected)
+    assert expected['Frequency'].sum() == len(subset)
+
+    with pytest.raises(ValueError):
+        BertopicBarchart(fitted.topic_model, fitted.get_doc_term_matrix()[:10])
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sentence_transformers import SentenceTransformer
+
+from conftest import LABELS, make_corpus
+from prediction.embedding_heads import CascadeClassifier, EmbeddingHead
+from prediction.prediction import Prediction
+
+
+@pytest.fixture
+def encode(tiny_models):
+    model = SentenceTransformer(tiny_models['sentence'])
+    return lambda docs: model.encode(docs, show_progress_bar=False)
+
+
+@pytest.fixture
+def head(classifier, encode):
+    docs = make_corpus(120)['processed_data'].tolist()
+    return EmbeddingHead().fit(encode(docs), classifier(docs))
+
+
+def test_head_round_trip(head, encode, tmp_path):
+    embeddings = encode(make_corpus(10)['processed_data'].tolist())
+    head.save(str(tmp_path / 'head.npz'))
+    loaded = EmbeddingHead.load(str(tmp_path / 'head.npz'))
+    assert loaded.labels == head.labels and loaded.fingerprint() == head.fingerprint()
+    assert np.allclose(loaded.predict_scores(embeddings), head.predict_scores(embeddings))
+    with pytest.raises(ValueError):
+        EmbeddingHead(kind='tree')
+
+
+def test_cascade_honors_top_k(head, classifier, encode):
+    docs = make_corpus(20)['processed_data'].tolist()
+    answered = CascadeClassifier(head, classifier, encode, threshold=0.0)
+    assert all(isinstance(prediction, dict) for prediction in answered(docs))
+
+    ranked = answered(docs, top_k=None)
+    assert answered.report['n_routed'] == 0
+    for prediction in ranked:
+        assert [item['label'] for item in prediction] and len(prediction) == len(head.labels)
+        assert [item['score'] for item in prediction] == sorted([item['score'] for item in prediction], reverse=True)
+    assert [len(prediction) for prediction in answered(docs, top_k=1)] == [1] * len(docs)
+
+    # The routed documents and the answers of the head have the same format
+    routed = CascadeClassifier(head, classifier, encode, threshold=1.1)(docs, top_k=None)
+    assert all(isinstance(prediction, list) and {item['label'] for item in prediction} == set(LABELS) for prediction in routed)
+
+
+def test_cascade_scores_long_documents_with_windows(head, classifier, encode):
+    docs = make_corpus(40)['processed_data'].tolist()
+    long_docs = [' '.join(docs[start:start + 10]) for start in range(0, 40, 10)]
+    cascade = CascadeClassifier(head, classifier, encode, threshold=0.0)
+    prediction = Prediction(pd.DataFrame({'processed_data': long_docs + docs[:5]}), 'sentiment', cascade, long_texts='windows', show_progress_bar=False)
+    assert (prediction.token_lengths(long_docs) >= prediction.max_length()).all()
+    df_predicted = prediction.make_predictions_df()
+    assert df_predicted['sentiment'].isin(head.labels).all()
+    assert df_predicted['score'].between(0, 1).all()
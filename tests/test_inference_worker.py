@@ -0,0 +1,61 @@
+import threading
+from http.server import ThreadingHTTPServer
+
+import numpy as np
+import pytest
+from sentence_transformers import SentenceTransformer
+
+from clustering.clustering import ClusteringMethod
+from inference.client import WORKER_URL_VARIABLE, RemotePipeline, WorkerClient, WorkerUnavailable
+from inference.embedder import RemoteSentenceModel
+from inference.worker import ModelRegistry, WorkerRequestHandler, decode_array, encode_array
+
+
+@pytest.fixture
+def worker_url(monkeypatch):
+    handler = type('Handler', (WorkerRequestHandler,), {'registry': ModelRegistry()})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f'http://127.0.0.1:{server.server_address[1]}'
+    monkeypatch.setenv(WORKER_URL_VARIABLE, url)
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+def test_arrays_round_trip():
+    array = np.arange(12, dtype=np.float16).reshape(3, 4)
+    decoded = decode_array(encode_array(array[:, 1:]))
+    assert decoded.dtype == np.float16 and np.array_equal(decoded, array[:, 1:])
+
+
+def test_worker_is_opt_in(tiny_models, worker_url):
+    assert isinstance(ClusteringMethod(tiny_models['sentence']).get_sentence_model(), SentenceTransformer)
+    assert not isinstance(ClusteringMethod.load_model_huggingface(tiny_models['classifier'], 'text-classification'), RemotePipeline)
+
+
+def test_worker_serves_the_models(tiny_models, worker_url):
+    docs = ['late delivery', 'good price', 'quick answer']
+    model = ClusteringMethod(tiny_models['sentence'], use_worker=True).get_sentence_model()
+    assert isinstance(model, RemoteSentenceModel)
+    assert np.allclose(model.encode(docs), SentenceTransformer(tiny_models['sentence']).encode(docs), atol=1e-5)
+
+    classifier = ClusteringMethod.load_model_huggingface(tiny_models['classifier'], 'text-classification', use_worker=True, truncation=True)
+    local = ClusteringMethod.load_model_huggingface(tiny_models['classifier'], 'text-classification', truncation=True)
+    assert isinstance(classifier, RemotePipeline)
+    remote = classifier(docs)
+    assert [prediction['label'] for prediction in remote] == [prediction['label'] for prediction in local(docs)]
+    assert np.allclose([prediction['score'] for prediction in remote], [prediction['score'] for prediction in local(docs)], atol=1e-5)
+
+
+def test_remote_models_fall_back_to_local_models(tiny_models):
+    client = WorkerClient('http://127.0.0.1:9')
+    assert not client.available()
+    with pytest.raises(WorkerUnavailable):
+        RemoteSentenceModel(client, tiny_models['sentence']).encode(['late delivery'])
+
+    model = RemoteSentenceModel(client, tiny_models['sentence'], fallback=lambda: SentenceTransformer(tiny_models['sentence']))
+    assert model.encode('late delivery').shape == (32,)
+    classifier = RemotePipeline(client, tiny_models['classifier'], 'text-classification', fallback=lambda: ClusteringMethod.load_model_huggingface(tiny_models['classifier'], 'text-classification'))
+    assert set(classifier('late delivery')) == {'label', 'score'}
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import EMOTIONS, make_corpus
+from prediction.prediction import Prediction
+
+
+def long_document(n_docs: int = 12) -> str:
+    return ' '.join(make_corpus(n_docs)['processed_data'])
+
+
+@pytest.mark.parametrize('overlap', [0, 16])
+def test_windows_cover_the_document(classifier, overlap):
+    prediction = Prediction(pd.DataFrame({'processed_data': []}), 'sentiment', classifier, long_texts='windows', window_overlap=overlap)
+    tokenizer = classifier.tokenizer
+    doc = long_document()
+    ids = tokenizer(doc, add_special_tokens=False)['input_ids']
+    texts, lengths = prediction.split_windows(doc, 64)
+
+    assert len(texts) > 1 and lengths == [64] * len(texts)
+    window_ids = [tokenizer(text, add_special_tokens=False)['input_ids'] for text in texts]
+    assert all(len(tokens) + tokenizer.num_special_tokens_to_add() <= 64 for tokens in window_ids)
+    # The first window starts the document and the last one ends it
+    assert doc.startswith(texts[0]) and doc.endswith(texts[-1])
+    assert window_ids[0] == ids[:len(window_ids[0])] and window_ids[-1] == ids[-len(window_ids[-1]):]
+    # Consecutive windows share at least `overlap` tokens
+    for previous, current in zip(window_ids, window_ids[1:]):
+        shared = max(size for size in range(len(current) + 1) if previous[len(previous) - size:] == current[:size])
+        assert shared >= overlap
+
+    short = 'delivery time'
+    assert prediction.split_windows(short, 64)[0] == [short]
+
+
+def test_aggregate_windows(classifier, multi_label_classifier):
+    window_predictions = [
+        [{'label': 'joy', 'score': 0.9}, {'label': 'anger', 'score': 0.1}, {'label': 'sadness', 'score': 0.2}, {'label': 'surprise', 'score': 0.0}],
+        [{'label': 'anger', 'score': 0.7}, {'label': 'joy', 'score': 0.3}, {'label': 'sadness', 'score': 0.2}, {'label': 'surprise', 'score': 0.0}],
+        [{'label': 'surprise', 'score': 0.6}, {'label': 'joy', 'score': 0.5}, {'label': 'anger', 'score': 0.1}, {'label': 'sadness', 'score': 0.0}],
+    ]
+    lengths, n_windows = np.array([30, 10, 20]), [2, 1]
+
+    mean = Prediction(pd.DataFrame({'processed_data': []}), 'emotion', multi_label_classifier, long_texts='windows').aggregate_windows(window_predictions, lengths, n_windows)
+    assert [len(prediction) for prediction in mean] == [len(EMOTIONS)] * 2
+    first = {item['label']: item['score'] for item in mean[0]}
+    assert first['joy'] == pytest.approx((0.9 * 30 + 0.3 * 10) / 40) and first['anger'] == pytest.approx((0.1 * 30 + 0.7 * 10) / 40)
+    assert [item['score'] for item in mean[0]] == sorted(first.values(), reverse=True)
+
+    maximum = Prediction(pd.DataFrame({'processed_data': []}), 'emotion', multi_label_classifier, long_texts='windows', window_aggregation='max').aggregate_windows(window_predictions, lengths, n_windows)
+    assert {item['label']: item['score'] for item in maximum[0]} == pytest.approx({'anger': 0.7, 'joy': 0.9, 'sadness': 0.2, 'surprise': 0.0})
+    assert maximum[1][0] == pytest.approx({'label': 'surprise', 'score': 0.6})
+
+    # A single-label pipeline gets one {'label', 'score'} dictionary per document
+    single = Prediction(pd.DataFrame({'processed_data': []}), 'sentiment', classifier, long_texts='windows').aggregate_windows(
+        [[{'label': 'positive', 'score': 0.8}, {'label': 'negative', 'score': 0.2}], [{'label': 'negative', 'score': 0.9}, {'label': 'positive', 'score': 0.1}]],
+        np.array([10, 10]), [2],
+    )
+    assert single[0]['label'] == 'negative' and single[0]['score'] == pytest.approx(0.55)
+
+
+def test_only_the_long_documents_are_split(classifier):
+    docs = make_corpus(6)['processed_data'].tolist() + [long_document()]
+    df = pd.DataFrame({'processed_data': docs})
+    truncated = Prediction(df, 'sentiment', classifier, show_progress_bar=False).make_predictions_df()
+    windowed = Prediction(df, 'sentiment', classifier, long_texts='windows', show_progress_bar=False).make_predictions_df()
+    assert np.allclose(windowed['score'][:6], truncated['score'][:6], atol=1e-5)
+    assert windowed['sentiment'].notna().all()
+    # The long document gets the mean of the scores of its windows
+    prediction = Prediction(df, 'sentiment', classifier, long_texts='windows')
+    texts, _ = prediction.split_windows(docs[6], prediction.max_length())
+    window_scores = [{item['label']: item['score'] for item in scores} for scores in classifier(texts, top_k=None, truncation=True)]
+    best = windowed['sentiment'].iloc[6]
+    assert windowed['score'].iloc[6] == pytest.approx(np.mean([scores[best] for scores in window_scores]), abs=1e-5)
@@ -0,0 +1,42 @@
+import numpy as np
+
+from clustering.clustering import ClusteringMethod
+from clustering.merged_model import MergedModelBuilder
+
+
+def test_merge_mapping():
+    assert MergedModelBuilder.merge_mapping([-1, 0, 1, 2], [[0, 2]]) == {-1: -1, 0: 0, 1: 1, 2: 0}
+    assert MergedModelBuilder.merge_mapping([0, 1, 2], [1, 2]) == {0: 0, 1: 1, 2: 1}
+    assert MergedModelBuilder.merge_mapping([0, 1], {1: 0}) == {0: 0, 1: 0}
+
+
+def test_lightweight_merge_matches_merge_topics(fitted):
+    docs, model = fitted.docs, fitted.topic_model
+    labels = ['outliers', 'first', 'second', 'third']
+    merged = ClusteringMethod.create_merged_model(docs, model, [[0, 2]], labels)
+    lightweight = ClusteringMethod.create_merged_model(docs, model, [[0, 2]], labels, lightweight=True)
+
+    assert lightweight.topics_ == merged.topics_
+    assert dict(lightweight.topic_sizes_) == dict(merged.topic_sizes_)
+    assert lightweight.custom_labels_ == merged.custom_labels_
+    # Same c-TF-IDF scores, the words of equal scores being in any order
+    for topic in set(merged.topics_):
+        assert np.allclose([score for _, score in lightweight.get_topic(topic)], [score for _, score in merged.get_topic(topic)])
+        assert lightweight.get_topic(topic)[0][0] == merged.get_topic(topic)[0][0]
+    # The base model is left untouched
+    assert model.topics_ == list(fitted.topics)
+
+
+def test_updating_a_merged_model_leaves_the_base_model_untouched(fitted):
+    model = fitted.topic_model
+    vocabulary = model.vectorizer_model.get_feature_names_out().tolist()
+    representations = dict(model.topic_representations_)
+
+    merged = MergedModelBuilder(model, fitted.docs).merge([[0, 1]])
+    assert merged.vectorizer_model is not model.vectorizer_model
+    merged.vectorizer_model.set_params(ngram_range=(1, 2))
+    merged.update_topics(fitted.docs)
+
+    assert model.vectorizer_model.get_feature_names_out().tolist() == vocabulary
+    assert model.topic_representations_ == representations
+    assert np.array_equal(model.topics_, fitted.topics)
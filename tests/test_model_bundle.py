@@ -0,0 +1,101 @@
+import os
+
+import numpy as np
+import pytest
+
+from clustering.clustering import ClusteringMethod
+from clustering.model_bundle import ModelBundle
+from conftest import bertopic_kwargs, make_corpus
+
+
+def test_round_trip_keeps_the_topics(fitted, tiny_models, tmp_path):
+    path = str(tmp_path / 'bundle')
+    fitted.save(path, serialization='pickle')
+
+    loaded = ClusteringMethod(tiny_models['sentence'], use_worker=False)
+    bundle = loaded.load(path)
+    assert bundle.manifest['serialization'] == 'pickle'
+    assert loaded.topics == list(fitted.topics)
+    assert np.allclose(loaded.embeddings, fitted.embeddings)
+    assert loaded.docs == list(fitted.docs)
+
+    # The pickled model keeps the fitted reduction and clustering, so it assigns new documents as the fitted one
+    texts = make_corpus(40, seed=3)['processed_data'].tolist()
+    expected = fitted.assign(texts, top_k=1)
+    assigned = ClusteringMethod(tiny_models['sentence'], use_worker=False).assign(texts, top_k=1, model_path=path)
+    assert assigned['topic'].tolist() == expected['topic'].tolist()
+
+
+def test_save_replaces_an_existing_bundle(fitted, tmp_path):
+    path = str(tmp_path / 'bundle')
+    fitted.save(path)
+    fitted.save(path, probs_storage='float16')
+    assert ModelBundle(path).topics == list(fitted.topics)
+    assert sorted(os.listdir(tmp_path)) == ['bundle', 'cache']
+
+
+def test_interrupted_save_restores_the_previous_bundle(fitted, tmp_path):
+    path = str(tmp_path / 'bundle')
+    fitted.save(path)
+    # The state left by a save interrupted between its two renames
+    os.rename(path, path + '.old')
+    assert ModelBundle(path).topics == list(fitted.topics)
+    assert not os.path.exists(path + '.old')
+
+    with pytest.raises(FileNotFoundError):
+        ModelBundle(str(tmp_path / 'missing'))
+
+
+def test_refit_detaches_the_loaded_bundle(fitted, tiny_models, tmp_path):
+    path = str(tmp_path / 'bundle')
+    fitted.get_doc_term_matrix()
+    fitted.save(path)
+
+    clustering = ClusteringMethod(tiny_models['sentence'], cache_dir=str(tmp_path / 'cache'))
+    clustering.load(path)
+    clustering.run_bertopic(make_corpus(100), **bertopic_kwargs(n_topics=3))
+    assert clustering.bundle is None
+    assert clustering.get_doc_term_matrix().shape[0] == 100
+    assert ModelBundle(path).doc_term_matrix.shape[0] == len(fitted.docs)
+
+    # A bundle whose term counts do not match its documents is rejected
+    clustering.load(path)
+    clustering.docs = clustering.docs[:100]
+    with pytest.raises(ValueError):
+        clustering.get_doc_term_matrix()
+
+
+def test_refit_discards_the_topic_tree(fitted, tiny_models, tmp_path):
+    path = str(tmp_path / 'bundle')
+    fitted.build_topic_tree()
+    fitted.save(path)
+    n_tree_topics = ModelBundle(path).topic_tree.n_topics
+
+    clustering = ClusteringMethod(tiny_models['sentence'], cache_dir=str(tmp_path / 'cache'))
+    clustering.load(path)
+    clustering.run_bertopic(make_corpus(100), **bertopic_kwargs(n_topics=3))
+    assert clustering.topic_tree is None
+    refit_path = str(tmp_path / 'refit')
+    clustering.save(refit_path)
+    assert ModelBundle(refit_path).topic_tree is None
+
+    # The tree of the new model is not written into the former bundle
+    tree = clustering.build_topic_tree()
+    assert ModelBundle(path).topic_tree.n_topics == n_tree_topics
+    assert sorted(tree.leaf_topics.tolist()) == sorted(set(clustering.topics) - {-1})
+
+
+def test_refit_does_not_write_the_index_into_the_former_bundle(fitted, tiny_models, tmp_path):
+    path = str(tmp_path / 'bundle')
+    fitted.save(path)
+
+    clustering = ClusteringMethod(tiny_models['sentence'], cache_dir=str(tmp_path / 'cache'))
+    clustering.load(path)
+    clustering.build_ann_index(n_lists=4)
+    assert len(ModelBundle(path).ann_index.ids) == len(fitted.docs)
+
+    clustering.run_bertopic(make_corpus(100), **bertopic_kwargs(n_topics=3))
+    assert clustering.ann_index is None
+    clustering.build_ann_index(n_lists=4)
+    assert len(clustering.ann_index.ids) == 100
+    assert len(ModelBundle(path).ann_index.ids) == len(fitted.docs)
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import EMOTIONS, make_corpus
+from prediction.multi_model import MemoryBudget, MultiModelPredictor
+from prediction.prediction import Prediction
+from prediction.score_matrix import prediction_frame
+
+
+def test_prediction_frame_follows_the_order_of_the_labels():
+    predictions = [[{'label': 'b', 'score': 0.9}, {'label': 'a', 'score': 0.2}], [{'label': 'a', 'score': 0.6}, {'label': 'b', 'score': 0.1}]]
+    frame = prediction_frame('emotion', predictions, ['b', 'a'])
+    assert list(frame.columns) == ['emotion__b', 'emotion__a', 'best_emotion', 'best_emotion_score']
+    assert frame['best_emotion'].tolist() == ['b', 'a']
+
+    single = prediction_frame('sentiment', [{'label': 'positive', 'score': 0.7}], index=[5])
+    assert list(single.columns) == ['sentiment', 'score'] and single.index.tolist() == [5]
+
+
+def test_columns_match_the_single_model_predictions(tiny_models, classifier, multi_label_classifier, tmp_path):
+    df = make_corpus(40)
+    df = pd.concat([df, df.iloc[:10]], ignore_index=True)
+    predictor = MultiModelPredictor([
+        ('sentiment', tiny_models['classifier'], 'text-classification', {'truncation': True}),
+        ('emotion', tiny_models['multi_label'], 'text-classification', {'problem_type': 'multi_label_classification', 'top_k': None, 'truncation': True}),
+    ], n_jobs=2, cache=str(tmp_path / 'predictions.sqlite'), show_progress_bar=False)
+    df_predicted = predictor.run(df)
+
+    single = Prediction(df, 'sentiment', classifier, show_progress_bar=False).make_predictions_df()
+    multi = Prediction(df, 'emotion', multi_label_classifier, show_progress_bar=False).make_predictions_df()
+    expected = pd.concat([single, multi[multi.columns[len(df.columns):]]], axis=1)
+    assert list(df_predicted.columns) == list(expected.columns)
+    assert (df_predicted['sentiment'] == expected['sentiment']).all()
+    score_columns = ['score'] + [f'emotion__{label}' for label in EMOTIONS]
+    assert np.allclose(df_predicted[score_columns].to_numpy(dtype=float), expected[score_columns].to_numpy(dtype=float), atol=1e-5)
+
+    reports = predictor.run_report['models']
+    assert predictor.run_report['n_unique_documents'] == 40
+    assert [report['n_cached'] for report in reports] == [0, 0]
+    assert all(report['load_time_s'] is not None and report['predict_time_s'] is not None for report in reports)
+
+    # The second run reads every prediction from the cache
+    predictor.run(df)
+    assert [report['n_cached'] for report in predictor.run_report['models']] == [40, 40]
+
+
+def test_single_label_columns_cannot_collide(tiny_models):
+    with pytest.raises(ValueError):
+        MultiModelPredictor([('sentiment', tiny_models['classifier'], 'text-classification'), ('tone', tiny_models['classifier'], 'text-classification')])
+    with pytest.raises(ValueError):
+        MultiModelPredictor([('sentiment', tiny_models['classifier'], 'text-classification'), ('sentiment', tiny_models['multi_label'], 'text-classification', {'top_k': None})])
+
+
+def test_memory_budget_lets_a_large_model_run_alone():
+    budget = MemoryBudget(100)
+    budget.acquire(60)
+    budget.release(60)
+    budget.acquire(500)
+    assert budget.used_mb == 500
+    budget.release(500)
+    assert budget.used_mb == 0
@@ -0,0 +1,25 @@
+from bertopic.representation import KeyBERTInspired, MaximalMarginalRelevance
+
+from clustering.clustering import ClusteringMethod
+from clustering.parallel_representation import ParallelRepresentation
+from conftest import bertopic_kwargs, make_corpus
+
+
+def fit_with_representation(tiny_models, tmp_path, representation_jobs):
+    clustering = ClusteringMethod(tiny_models['sentence'], cache_dir=str(tmp_path), representation_jobs=representation_jobs)
+    representation_model = [KeyBERTInspired(top_n_words=5, nr_repr_docs=3, nr_samples=20), MaximalMarginalRelevance(diversity=0.3, top_n_words=4)]
+    _, _, topic_model, _ = clustering.run_bertopic(make_corpus(), representation_model=representation_model, **bertopic_kwargs())
+    return topic_model
+
+
+def test_representations_do_not_depend_on_the_number_of_threads(tiny_models, tmp_path):
+    parallel = fit_with_representation(tiny_models, tmp_path, 4)
+    assert isinstance(parallel.representation_model, ParallelRepresentation)
+    assert parallel.representation_model.n_jobs == 4
+    # The documents and embeddings are not pickled with the model
+    assert parallel.representation_model.__getstate__()['embeddings'] is None
+
+    two_threads = fit_with_representation(tiny_models, tmp_path, 2)
+    assert parallel.topic_representations_ == two_threads.topic_representations_
+    for words in parallel.topic_representations_.values():
+        assert len([word for word, _ in words if word]) == 4
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import EMOTIONS, LABELS, make_corpus
+from prediction.prediction import Prediction, count_tokens
+
+
+def test_batches_respect_the_token_budget(classifier):
+    prediction = Prediction(pd.DataFrame({'processed_data': []}), 'sentiment', classifier, max_batch_tokens=100, max_batch_size=8)
+    lengths = np.random.default_rng(0).integers(1, 64, size=200)
+    batches = prediction.make_batches(lengths)
+
+    assert sorted(np.concatenate(batches).tolist()) == list(range(200))
+    for batch in batches:
+        assert len(batch) <= 8
+        assert len(batch) == 1 or len(batch) * lengths[batch].max() <= 100
+    # The longest documents come first
+    assert lengths[batches[0][0]] == lengths.max()
+
+
+def test_predictions_do_not_depend_on_the_batches(classifier):
+    docs = make_corpus(60)['processed_data'].tolist()
+    prediction = Prediction(pd.DataFrame({'processed_data': docs}), 'sentiment', classifier, max_batch_tokens=200, show_progress_bar=False)
+    lengths = prediction.token_lengths(docs)
+    assert np.array_equal(lengths, np.minimum(count_tokens(classifier.tokenizer, docs), 64))
+
+    batched = prediction.predict(docs, lengths=lengths)
+    one_by_one = [classifier(doc)[0] for doc in docs]
+    assert [item['label'] for item in batched] == [item['label'] for item in one_by_one]
+    assert np.allclose([item['score'] for item in batched], [item['score'] for item in one_by_one], atol=1e-5)
+
+
+def test_prediction_columns(classifier, multi_label_classifier):
+    df = make_corpus(20).set_index(np.arange(100, 120))
+    single = Prediction(df, 'sentiment', classifier, show_progress_bar=False).make_predictions_df()
+    assert single['sentiment'].isin(LABELS).all() and single['score'].between(0, 1).all()
+    assert single.index.equals(df.index)
+
+    multi = Prediction(df, 'emotion', multi_label_classifier, show_progress_bar=False).make_predictions_df()
+    assert list(multi.columns[len(df.columns):]) == [f'emotion__{label}' for label in EMOTIONS] + ['best_emotion', 'best_emotion_score']
+    scores = multi[[f'emotion__{label}' for label in EMOTIONS]].to_numpy()
+    assert (multi['best_emotion'] == np.array(EMOTIONS)[scores.argmax(axis=1)]).all()
+
+
+def test_invalid_options(classifier):
+    with pytest.raises(ValueError):
+        Prediction(pd.DataFrame({'processed_data': []}), 'sentiment', classifier, long_texts='split')
+    with pytest.raises(ValueError):
+        Prediction(pd.DataFrame({'processed_data': []}), 'sentiment', classifier, window_aggregation='median')
@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+
+from conftest import make_corpus
+from prediction.prediction import Prediction
+from prediction.prediction_cache import PredictionCache, pipeline_signature
+from prediction.streaming import StreamingPrediction
+
+
+def test_only_the_missing_documents_are_predicted(tmp_path):
+    cache = PredictionCache(str(tmp_path / 'predictions.sqlite'), {'model_name': 'fake'})
+    calls = []
+
+    def predict(docs):
+        calls.append(list(docs))
+        return [{'label': doc.upper(), 'score': 1.0} for doc in docs]
+
+    assert cache.predict(predict, ['a', 'b', 'a']) == [{'label': 'A', 'score': 1.0}, {'label': 'B', 'score': 1.0}, {'label': 'A', 'score': 1.0}]
+    assert calls == [['a', 'b']]
+    assert 'a' in cache and len(cache) == 2
+
+    assert [item['label'] for item in cache.predict(predict, ['b', 'c', 'c'])] == ['B', 'C', 'C']
+    assert calls[-1] == ['c']
+
+    # The predictions of another model are not shared
+    other = PredictionCache(cache.path, {'model_name': 'other'})
+    assert other.get(['a'])[1] == [0] and len(other) == 0
+
+
+def test_window_settings_are_part_of_the_cache_key(classifier, tmp_path):
+    path = str(tmp_path / 'predictions.sqlite')
+    empty = pd.DataFrame({'processed_data': []})
+    truncate = Prediction(empty, 'sentiment', classifier, cache=path)
+    windows = Prediction(empty, 'sentiment', classifier, cache=path, long_texts='windows')
+    assert truncate.signature() == pipeline_signature(classifier)
+    assert windows.cache.model_key != truncate.cache.model_key
+    assert Prediction(empty, 'sentiment', classifier, cache=path, long_texts='windows', window_overlap=8).cache.model_key != windows.cache.model_key
+
+    # A cache opened for other settings is rejected
+    with pytest.raises(ValueError):
+        Prediction(empty, 'sentiment', classifier, cache=truncate.cache, long_texts='windows')
+
+
+def test_streaming_and_in_memory_predictions_share_the_cache(classifier, tmp_path):
+    path = str(tmp_path / 'predictions.sqlite')
+    df = make_corpus(30)
+    streaming = StreamingPrediction('sentiment', classifier, str(tmp_path / 'sink'), chunk_size=10, cache=path, show_progress_bar=False, long_texts='windows')
+    streaming.run(df)
+
+    prediction = Prediction(df, 'sentiment', classifier, cache=path, long_texts='windows', show_progress_bar=False)
+    assert prediction.cache.model_key == streaming.cache.model_key
+    assert len(prediction.cache) == df['processed_data'].nunique()
+    prediction.predict = lambda docs, lengths=None: pytest.fail('the documents should be read from the cache')
+    df_predicted = prediction.make_predictions_df()
+    assert df_predicted['sentiment'].tolist() == streaming.read()['sentiment'].tolist()
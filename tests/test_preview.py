@@ -0,0 +1,28 @@
+import numpy as np
+
+from clustering.clustering import ClusteringMethod
+from conftest import GROUPS, make_corpus
+
+
+def test_preview_assigns_every_document(tiny_models, tmp_path):
+    clustering = ClusteringMethod(tiny_models['sentence'], cache_dir=str(tmp_path))
+    seed_topic_list = [words[:2] for words in GROUPS]
+    topics, probs, topic_model, embeddings = clustering.run_bertopic_preview(make_corpus(120), n_components=5, seed_topic_list=seed_topic_list)
+
+    # One cluster per seed topic, no outliers
+    assert sorted(set(topics)) == list(range(len(seed_topic_list)))
+    assert probs.shape == (120, len(seed_topic_list)) and embeddings.shape[0] == 120
+    assert np.allclose(probs.sum(axis=1), 1, atol=1e-5)
+    assert (probs.argmax(axis=1) == np.asarray(topics)).mean() > 0.9
+    assert topic_model.get_topic_info()['Count'].sum() == 120
+
+
+def test_preview_reuses_the_cached_embeddings(tiny_models, tmp_path):
+    df = make_corpus(60)
+    first = ClusteringMethod(tiny_models['sentence'], cache_dir=str(tmp_path))
+    first.run_bertopic_preview(df, n_clusters=3, n_components=5)
+    second = ClusteringMethod(tiny_models['sentence'], cache_dir=str(tmp_path))
+    topics, _, _, embeddings = second.run_bertopic_preview(df, n_clusters=3, n_components=5)
+    assert np.array_equal(embeddings, first.embeddings)
+    assert list(topics) == list(first.topics)
+    assert len(second.embedding_cache) == len(set(df['processed_data']))
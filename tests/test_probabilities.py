@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from clustering.probabilities import TopKProbabilities, compress_probabilities, top_two_margin, topic_column
+
+
+@pytest.fixture
+def probs():
+    return np.random.default_rng(0).dirichlet(np.ones(6), size=20)
+
+
+def test_top_k_keeps_the_highest_probabilities_sorted(probs):
+    top_k = TopKProbabilities.from_dense(probs, k=3, block_size=7)
+    assert top_k.shape == (20, 6) and top_k.k == 3 and top_k.indices.dtype == np.int16
+    assert np.array_equal(top_k.indices, np.argsort(-probs, axis=1)[:, :3])
+    assert np.allclose(top_k.values, -np.sort(-probs, axis=1)[:, :3], atol=1e-3)
+
+    # The dense matrix is 0 outside of the top-k probabilities
+    dense = top_k.toarray()
+    kept = np.zeros_like(probs, dtype=bool)
+    np.put_along_axis(kept, np.argsort(-probs, axis=1)[:, :3], True, axis=1)
+    assert np.allclose(dense[kept], probs[kept], atol=1e-3)
+    assert (dense[~kept] == 0).all()
+
+
+def test_top_k_indexing_matches_the_dense_matrix(probs):
+    top_k = TopKProbabilities.from_dense(probs, k=6)
+    rows = np.array([1, 4, 7])
+    assert np.allclose(top_k[rows].toarray(), probs[rows], atol=1e-3)
+    assert np.allclose(top_k[rows, 2], probs[rows, 2], atol=1e-3)
+    assert np.allclose(topic_column(top_k, 5), topic_column(probs, 5), atol=1e-3)
+    assert np.allclose(top_two_margin(top_k), top_two_margin(probs, block_size=7), atol=1e-3)
+
+
+def test_compress_probabilities(probs):
+    assert compress_probabilities(probs, 'float16').dtype == np.float16
+    assert isinstance(compress_probabilities(probs, 'topk', top_k=2), TopKProbabilities)
+    # The probability of the assigned topic only stays a vector
+    assert compress_probabilities(probs[:, 0], 'topk').shape == (20,)
+    assert compress_probabilities(None, 'topk') is None
+    with pytest.raises(ValueError):
+        compress_probabilities(probs, 'int8')
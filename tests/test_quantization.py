@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from clustering.clustering import ClusteringMethod
+from conftest import make_corpus
+from prediction.prediction_cache import pipeline_signature
+from prediction.quantization import quantization_report
+
+
+def test_invalid_quantization(tiny_models):
+    with pytest.raises(ValueError):
+        ClusteringMethod.load_model_huggingface(tiny_models['classifier'], 'text-classification', quantize='int4')
+
+
+def test_int8_classifier(tiny_models, classifier):
+    quantized = ClusteringMethod.load_model_huggingface(tiny_models['classifier'], 'text-classification', quantize='int8', truncation=True)
+    assert quantized.model.quantization == 'int8'
+    # The quantized predictions are cached apart from the full-precision ones
+    assert pipeline_signature(quantized)['pipeline_kwargs']['quantize'] == 'int8'
+    assert 'quantize' not in pipeline_signature(classifier)['pipeline_kwargs']
+
+    docs = make_corpus(10)['processed_data'].tolist()
+    scores = [prediction['score'] for prediction in quantized(docs)]
+    assert np.allclose(scores, [prediction['score'] for prediction in classifier(docs)], atol=0.1)
+
+
+def test_quantization_report(tiny_models):
+    report = quantization_report(make_corpus(40), tiny_models['multi_label'], problem_type='multi_label_classification', sample_size=20, truncation=True, top_k=None)
+    assert report['n_documents'] == 20 and report['quantize'] == 'int8'
+    assert 0 <= report['label_agreement'] <= 1
+    assert 0 <= report['mean_abs_score_difference'] <= report['max_abs_score_difference'] < 0.5
+    assert report['speedup'] > 0 and report['int8_docs_per_s'] > 0
+    with pytest.raises(ValueError):
+        quantization_report(make_corpus(5).iloc[:0], tiny_models['classifier'])
@@ -0,0 +1,54 @@
+import pickle
+
+import numpy as np
+from sklearn.decomposition import PCA
+
+from clustering.reduction_cache import CachedUMAP, array_hash
+
+
+class CountingPCA(PCA):
+    """
+    A PCA counting its fits.
+    """
+
+    n_fits = 0
+
+    def fit(self, X, y=None):
+        CountingPCA.n_fits += 1
+        return super().fit(X)
+
+
+def test_array_hash_depends_on_content_shape_and_dtype():
+    array = np.arange(6, dtype=np.float32)
+    assert array_hash(array) == array_hash(array.copy())
+    assert array_hash(array) != array_hash(array.reshape(2, 3))
+    assert array_hash(array) != array_hash(array.astype(np.float64))
+
+
+def test_reduced_embeddings_are_reused(tmp_path):
+    CountingPCA.n_fits = 0
+    embeddings = np.random.default_rng(0).normal(size=(50, 8))
+    first = CachedUMAP(CountingPCA(n_components=3), str(tmp_path)).fit_transform(embeddings)
+
+    # Same embeddings and parameters: nothing is fitted again
+    cached = CachedUMAP(CountingPCA(n_components=3), str(tmp_path))
+    assert np.allclose(cached.fit_transform(embeddings), first)
+    assert CountingPCA.n_fits == 1
+
+    # New documents are transformed by the cached fitted model
+    new = np.random.default_rng(1).normal(size=(5, 8))
+    assert np.allclose(cached.transform(new), PCA(n_components=3).fit(embeddings).transform(new))
+
+    # Other parameters are another cache entry
+    CachedUMAP(CountingPCA(n_components=2), str(tmp_path)).fit(embeddings)
+    assert CountingPCA.n_fits == 2
+
+
+def test_pickled_model_keeps_the_fitted_model(tmp_path):
+    embeddings = np.random.default_rng(0).normal(size=(50, 8))
+    CachedUMAP(PCA(n_components=3), str(tmp_path)).fit(embeddings)
+    cached = CachedUMAP(PCA(n_components=3), str(tmp_path)).fit(embeddings)
+
+    restored = pickle.loads(pickle.dumps(cached))
+    assert restored.embedding_ is None
+    assert np.allclose(restored.transform(embeddings), cached.transform(embeddings))
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from clustering.clustering import ClusteringMethod
+from clustering.sampling import stratified_sample_indices
+from conftest import bertopic_kwargs, make_corpus
+
+
+def test_sample_keeps_the_proportion_of_every_stratum():
+    df = pd.DataFrame({'year': [2021] * 60 + [2022] * 30 + [2023] * 10})
+    sample = stratified_sample_indices(df, 20, ['year'])
+    assert len(sample) == 20 and len(set(sample)) == 20
+    assert df.iloc[sample]['year'].value_counts().to_dict() == {2021: 12, 2022: 6, 2023: 2}
+
+
+def test_fractions_and_counts():
+    df = pd.DataFrame({'year': [2021] * 60 + [2022] * 40})
+    assert len(stratified_sample_indices(df, 0.25, ['year'])) == 25
+    # A float of 1 is the whole DataFrame, an int of 1 a single row
+    assert np.array_equal(stratified_sample_indices(df, 1.0, ['year']), np.arange(100))
+    assert len(stratified_sample_indices(df, 1)) == 1
+    assert len(stratified_sample_indices(df, 500.0)) == 100
+    with pytest.raises(ValueError):
+        stratified_sample_indices(df, 0)
+
+
+def test_small_strata_never_exceed_the_sample_size():
+    df = pd.DataFrame({'zone': ['large'] * 100 + ['a', 'b', 'c']})
+    sample = stratified_sample_indices(df, 4, ['zone'])
+    assert len(sample) == 4
+    assert set(df.iloc[sample]['zone']) == {'large', 'a', 'b', 'c'}
+
+    # More strata than rows to sample: only the largest ones are represented
+    sample = stratified_sample_indices(df, 2, ['zone'])
+    assert len(sample) == 2
+    assert 'large' in set(df.iloc[sample]['zone'])
+
+
+def test_sampled_run_assigns_every_document(tiny_models, tmp_path):
+    df = make_corpus(200)
+    clustering = ClusteringMethod(tiny_models['sentence'], cache_dir=str(tmp_path), use_worker=False)
+    topics, _, topic_model, embeddings = clustering.run_bertopic_sampled(df, 0.5, strata=['year', 'Zone'], batch_size=30, **bertopic_kwargs())
+
+    assert clustering.sampling_report['sample_size'] == 100
+    assert len(topics) == len(embeddings) == 200
+    assert sum(topic_model.topic_sizes_.values()) == 200
+    # The documents out of the sample get the topic the fitted model assigns them
+    expected, _ = topic_model.transform(df['processed_data'].tolist(), embeddings)
+    assert list(topics) == list(expected)
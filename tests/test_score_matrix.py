@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from prediction.score_matrix import best_of, read_score_matrix, score_dicts, score_matrix_frame, score_matrix_from_dicts, scores_to_matrix
+
+PREDICTIONS = [
+    [{'label': 'joy', 'score': 0.8}, {'label': 'anger', 'score': 0.1}],
+    {'anger': 0.6, 'joy': 0.3, 'fear': 0.2},
+    [],
+]
+
+
+def test_scores_to_matrix_follows_the_given_labels():
+    labels, matrix = scores_to_matrix(PREDICTIONS, ['joy', 'anger'])
+    # Labels missing from the given ones are appended, missing scores are NaN
+    assert labels == ['joy', 'anger', 'fear'] and matrix.dtype == np.float32
+    assert np.allclose(matrix[:2], [[0.8, 0.1, np.nan], [0.3, 0.6, 0.2]], equal_nan=True)
+    assert np.isnan(matrix[2]).all()
+    assert scores_to_matrix(PREDICTIONS)[0] == ['anger', 'fear', 'joy']
+
+
+def test_best_of_skips_the_rows_without_scores():
+    labels, matrix = scores_to_matrix(PREDICTIONS, ['joy', 'anger'])
+    best_labels, best_scores = best_of(labels, matrix)
+    assert best_labels.tolist() == ['joy', 'anger', None]
+    assert np.allclose(best_scores, [0.8, 0.6, np.nan], equal_nan=True)
+
+
+@pytest.mark.parametrize('extension', ['csv', 'parquet'])
+def test_score_matrix_round_trip(extension, tmp_path):
+    labels, matrix = scores_to_matrix(PREDICTIONS, ['joy', 'anger'])
+    df = pd.concat([pd.DataFrame({'emotion_text': ['a', 'b', 'c']}), score_matrix_frame('emotion', labels, matrix)], axis=1)
+    assert list(df.columns) == ['emotion_text', 'emotion__joy', 'emotion__anger', 'emotion__fear', 'best_emotion', 'best_emotion_score']
+
+    path = str(tmp_path / f'predictions.{extension}')
+    if extension == 'csv':
+        df.to_csv(path, index=False)
+        loaded = pd.read_csv(path)
+    else:
+        df.to_parquet(path, index=False)
+        loaded = pd.read_parquet(path)
+    loaded_labels, loaded_matrix = read_score_matrix(loaded, 'emotion')
+    assert loaded_labels == labels
+    assert np.array_equal(loaded_matrix, matrix, equal_nan=True)
+    assert score_dicts(loaded_labels, loaded_matrix)[1] == pytest.approx({'joy': 0.3, 'anger': 0.6, 'fear': 0.2})
+    assert score_dicts(loaded_labels, loaded_matrix)[2] == {}
+    with pytest.raises(ValueError):
+        read_score_matrix(loaded, 'sentiment')
+
+
+def test_former_dictionary_column_is_converted(tmp_path):
+    path = str(tmp_path / 'df_all_labelled.csv')
+    pd.DataFrame({'Survey ID': [1, 2, 3], 'proba_dict': [{'joy': 0.8, 'anger': 0.1}, {'anger': 0.6}, None]}).to_csv(path, index=False)
+    converted = score_matrix_from_dicts(pd.read_csv(path), 'proba_dict', 'emotion')
+    assert list(converted.columns) == ['Survey ID', 'emotion__anger', 'emotion__joy', 'best_emotion', 'best_emotion_score']
+    labels, matrix = read_score_matrix(converted, 'emotion')
+    assert np.allclose(matrix, [[0.1, 0.8], [0.6, np.nan], [np.nan, np.nan]], equal_nan=True)
+    assert converted['best_emotion'][:2].tolist() == ['joy', 'anger'] and pd.isna(converted['best_emotion'][2])
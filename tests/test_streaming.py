@@ -0,0 +1,81 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from conftest import make_corpus
+from prediction.prediction import Prediction
+from prediction.streaming import StreamingPrediction
+
+
+class CrashingClassifier:
+    """
+    Wrap a pipeline to raise after a number of calls, as an interrupted run.
+    """
+
+    def __init__(self, classifier, n_calls):
+        self.classifier = classifier
+        self.n_calls = n_calls
+
+    def __getattr__(self, name):
+        return getattr(self.__dict__['classifier'], name)
+
+    def __call__(self, docs, **kwargs):
+        if self.n_calls == 0:
+            raise RuntimeError('crash')
+        self.n_calls -= 1
+        return self.classifier(docs, **kwargs)
+
+
+def test_resume_after_a_crash_without_duplicates(classifier, tmp_path):
+    df = make_corpus(50)
+    sink = str(tmp_path / 'sink')
+    # One batch per chunk: the third chunk crashes
+    crashing = StreamingPrediction('sentiment', CrashingClassifier(classifier, 2), sink, chunk_size=10, show_progress_bar=False)
+    with pytest.raises(RuntimeError):
+        crashing.run(df)
+    assert crashing.checkpoint()['offset'] == 20 and len(crashing.read()) == 20
+    # A part written after the last checkpoint is overwritten
+    pd.DataFrame({'processed_data': ['stale']}).to_parquet(os.path.join(sink, 'part-000000000020.parquet'))
+
+    streaming = StreamingPrediction('sentiment', classifier, sink, chunk_size=10, show_progress_bar=False)
+    checkpoint = streaming.run(df)
+    assert checkpoint['completed'] and checkpoint['offset'] == 50 and checkpoint['n_chunks'] == 5
+
+    df_streamed = streaming.read()
+    expected = Prediction(df, 'sentiment', classifier, show_progress_bar=False).make_predictions_df()
+    assert df_streamed['processed_data'].tolist() == df['processed_data'].tolist()
+    assert df_streamed['sentiment'].tolist() == expected['sentiment'].tolist()
+    # A completed sink is not scored again
+    assert streaming.run(df)['n_chunks'] == 5
+
+
+def test_parquet_source_is_read_from_the_offset(classifier, tmp_path):
+    df = make_corpus(30)
+    source = str(tmp_path / 'source.parquet')
+    df.to_parquet(source, row_group_size=7)
+    chunks = list(StreamingPrediction.iter_chunks(source, 10, offset=12))
+    assert [chunk.index[0] for chunk in chunks] == [12, 22]
+    assert pd.concat(chunks)['processed_data'].tolist() == df['processed_data'].tolist()[12:]
+
+    streaming = StreamingPrediction('sentiment', classifier, str(tmp_path / 'sink'), chunk_size=10, show_progress_bar=False)
+    streaming.run(source)
+    assert len(streaming.read(columns=['sentiment'])) == 30
+
+
+def test_signature_mismatch_raises(classifier, multi_label_classifier, tmp_path):
+    sink = str(tmp_path / 'sink')
+    df = make_corpus(10)
+    StreamingPrediction('sentiment', classifier, sink, chunk_size=5, show_progress_bar=False).run(df)
+    with open(os.path.join(sink, StreamingPrediction.CHECKPOINT), 'r', encoding='utf-8') as f:
+        assert json.load(f)['signature']['predicted_column_name'] == 'sentiment'
+
+    with pytest.raises(ValueError):
+        StreamingPrediction('emotion', classifier, sink, show_progress_bar=False).run(df)
+    with pytest.raises(ValueError):
+        StreamingPrediction('sentiment', multi_label_classifier, sink, show_progress_bar=False).run(df)
+    with pytest.raises(ValueError):
+        StreamingPrediction('sentiment', classifier, sink, show_progress_bar=False, long_texts='windows').run(df)
+    with pytest.raises(ValueError):
+        StreamingPrediction('sentiment', classifier, sink, chunk_size=0)
@@ -0,0 +1,39 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.cluster import KMeans
+
+from clustering.sweep import BertopicSweep, topic_coherence, topic_diversity
+from conftest import bertopic_kwargs, make_corpus
+
+
+def test_topic_metrics():
+    vocabulary = {'late': 0, 'delivery': 1, 'price': 2}
+    doc_term_matrix = csr_matrix(np.array([[1, 1, 0], [1, 1, 0], [0, 0, 1], [0, 0, 1]]))
+    # Words which always co-occur are perfectly coherent, words which never do are not
+    assert topic_coherence({0: ['late', 'delivery']}, doc_term_matrix, vocabulary) == 1.0
+    assert topic_coherence({0: ['late', 'price']}, doc_term_matrix, vocabulary) == -1.0
+    assert np.isnan(topic_coherence({0: ['late', 'unknown']}, doc_term_matrix, vocabulary))
+
+    assert topic_diversity({0: ['late', 'delivery'], 1: ['price', 'quality']}) == 1.0
+    assert topic_diversity({0: ['late', 'delivery'], 1: ['late', 'delivery']}) == 0.5
+
+
+def test_expand_grid():
+    assert BertopicSweep.expand_grid({'top_n_words': [5, 10], 'nr_topics': [None]}) == [
+        {'top_n_words': 5, 'nr_topics': None},
+        {'top_n_words': 10, 'nr_topics': None},
+    ]
+    assert BertopicSweep.expand_grid([{'top_n_words': 5}]) == [{'top_n_words': 5}]
+
+
+def test_run_reports_every_configuration(tiny_models, tmp_path):
+    kwargs = bertopic_kwargs()
+    sweep = BertopicSweep(tiny_models['sentence'], str(tmp_path), base_kwargs={'umap_model': kwargs['umap_model']}, n_jobs=1)
+    results = sweep.run(make_corpus(120), [
+        {'hdbscan_model': KMeans(n_clusters=3, n_init=3, random_state=0)},
+        {'hdbscan_model': 'not a model'},
+    ])
+    assert len(results) == 2
+    assert results['n_topics'][0] == 3
+    assert results[['coherence_npmi', 'diversity']].iloc[0].notna().all()
+    assert results['error'].isna().tolist() == [True, False]
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import threading
+
+from inference.tagging_server import LatencyStats, MicroBatcher, TaggingServer
+
+
+class FakeClassifier:
+    """
+    A pipeline upper-casing the texts, recording the sizes of its batches and failing on the texts 'fail'.
+    """
+
+    def __init__(self):
+        self.batch_sizes = []
+        self.threads = set()
+
+    def __call__(self, texts, batch_size):
+        self.batch_sizes.append(len(texts))
+        self.threads.add(threading.get_ident())
+        if 'fail' in texts:
+            raise RuntimeError('failed batch')
+        return [{'label': text.upper(), 'score': 1.0} for text in texts]
+
+
+async def submit_all(batcher, texts):
+    batcher.start()
+    try:
+        return await asyncio.gather(*(batcher.submit(text) for text in texts), return_exceptions=True)
+    finally:
+        await batcher.stop()
+
+
+def test_requests_are_batched_up_to_the_maximum_size():
+    classifier = FakeClassifier()
+    batcher = MicroBatcher(classifier, max_batch_size=8, max_latency_ms=50)
+    texts = [f'text {i}' for i in range(30)]
+    results = asyncio.run(submit_all(batcher, texts))
+
+    assert [prediction['label'] for prediction, _ in results] == [text.upper() for text in texts]
+    assert sum(classifier.batch_sizes) == 30 and max(classifier.batch_sizes) == 8
+    assert len(classifier.threads) == 1
+    stats = batcher.stats.describe()
+    assert stats['n_requests'] == 30 and stats['n_batches'] == len(classifier.batch_sizes)
+    assert sum(int(size) * count for size, count in stats['batch_size_histogram'].items()) == 30
+    assert stats['latency_p50_ms'] >= stats['queue_p50_ms'] >= 0
+
+
+def test_a_failed_batch_only_fails_its_requests():
+    classifier = FakeClassifier()
+    batcher = MicroBatcher(classifier, max_batch_size=1, max_latency_ms=1)
+    results = asyncio.run(submit_all(batcher, ['ok', 'fail', 'fine']))
+    assert results[0][0]['label'] == 'OK' and results[2][0]['label'] == 'FINE'
+    assert isinstance(results[1], RuntimeError)
+    assert batcher.stats.n_requests == 2
+
+
+def test_latency_stats_without_requests():
+    assert LatencyStats().describe()['latency_p99_ms'] is None
+
+
+def test_classify_endpoint():
+    async def scenario():
+        server = TaggingServer(max_batch_size=4, max_latency_ms=1)
+        key = ('fake-model', 'text-classification', None, json.dumps({}, sort_keys=True))
+        server.batchers[key] = MicroBatcher(FakeClassifier(), 4, 1)
+        server.batchers[key].start()
+        try:
+            body = json.dumps({'model_name': 'fake-model', 'task': 'text-classification', 'text': 'hello'}).encode('utf-8')
+            status, payload = await server.handle('POST', '/classify', body)
+            assert status == 200 and payload['prediction']['label'] == 'HELLO' and payload['batch_size'] == 1
+            status, _ = await server.handle('POST', '/classify', json.dumps({'model_name': 'fake-model', 'task': 'text-classification', 'text': ['a']}).encode('utf-8'))
+            assert status == 400
+            assert (await server.handle('GET', '/unknown', b''))[0] == 404
+            status, payload = await server.handle('GET', '/metrics', b'')
+            assert status == 200 and payload['models'][0]['n_requests'] == 1
+        finally:
+            for batcher in server.batchers.values():
+                await batcher.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from clustering.merged_model import MergedModelBuilder
+from clustering.topic_tree import TopicTree
+
+
+@pytest.fixture
+def tree(fitted):
+    return TopicTree.from_model(fitted.topic_model, fitted.docs)
+
+
+def test_cut_covers_every_topic(tree, fitted):
+    topics = sorted(set(fitted.topics))
+    assert sorted(topic for group in tree.cut(n_topics=2) for topic in group) == topics
+    assert len(tree.cut(n_topics=2)) == 2
+    assert len(tree.cut(distance=0)) == len(topics)
+    with pytest.raises(ValueError):
+        tree.cut()
+
+
+def test_evaluate_matches_the_merged_model(tree, fitted):
+    plan = tree.cut(n_topics=2)
+    evaluation = tree.evaluate(plan)
+    merged = MergedModelBuilder(fitted.topic_model, fitted.docs).merge(plan)
+
+    assert evaluation['Count'].tolist() == [merged.topic_sizes_[topic] for topic in evaluation['Topic']]
+    for topic, words in zip(evaluation['Topic'], evaluation['Representation']):
+        assert words[0] == merged.get_topic(topic)[0][0]
+
+
+def test_hierarchy_and_save_round_trip(tree, tmp_path):
+    hierarchy = tree.to_hierarchical_topics()
+    assert len(hierarchy) == tree.n_topics - 1
+    assert sorted(hierarchy.iloc[0]['Topics']) == sorted(tree.leaf_topics.tolist())
+
+    path = str(tmp_path / 'tree.npz')
+    tree.save(path)
+    loaded = TopicTree.load(path)
+    assert np.array_equal(loaded.linkage, tree.linkage)
+    assert loaded.evaluate(tree.cut(n_topics=2)).equals(tree.evaluate(tree.cut(n_topics=2)))
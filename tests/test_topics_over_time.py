@@ -0,0 +1,36 @@
+import pandas as pd
+
+from clustering.topics_over_time import IncrementalTopicsOverTime
+from conftest import make_corpus
+
+
+def test_incremental_update_matches_a_single_update(fitted, tmp_path):
+    df = make_corpus().assign(topic=fitted.topics)
+    single = fitted.update_topics_over_time(df, str(tmp_path / 'single'))
+
+    path = str(tmp_path / 'incremental')
+    fitted.update_topics_over_time(df[df.year_month <= '2021-03'], path)
+    incremental = fitted.update_topics_over_time(df, path)
+    pd.testing.assert_frame_equal(incremental, single)
+
+    expected = df.groupby(['year_month', 'topic']).size()
+    frequencies = IncrementalTopicsOverTime(path).frequencies()
+    assert {(month, topic): count for month, counts in frequencies.items() for topic, count in counts.items()} == expected.to_dict()
+
+
+def test_latest_month_is_recomputed(fitted, tmp_path):
+    df = make_corpus().assign(topic=fitted.topics)
+    june = df[df.year_month == '2021-06']
+    # June processed in the middle of the month
+    partial = pd.concat([df[df.year_month < '2021-06'], june.iloc[:10]])
+
+    frozen = str(tmp_path / 'frozen')
+    fitted.update_topics_over_time(partial, frozen)
+    fitted.update_topics_over_time(df, frozen, recompute=[])
+    assert sum(IncrementalTopicsOverTime(frozen).frequencies()['2021-06'].values()) == 10
+
+    path = str(tmp_path / 'recomputed')
+    fitted.update_topics_over_time(partial, path)
+    fitted.update_topics_over_time(df, path)
+    assert sum(IncrementalTopicsOverTime(path).frequencies()['2021-06'].values()) == len(june)
+    pd.testing.assert_frame_equal(IncrementalTopicsOverTime(path).to_dataframe(), fitted.update_topics_over_time(df, str(tmp_path / 'single')))
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from conftest import GROUPS, WORDS, make_corpus
+from prediction.zero_shot import EmbeddingZeroShot
+
+NAMES = ['delivery', 'pricing', 'support', 'quality']
+
+
+def encode(texts):
+    # A bag of words: the documents of a theme are the closest to its seed words
+    return np.array([[text.split().count(word) + 0.01 for word in WORDS] for text in texts], dtype=np.float32)
+
+
+class FakeNLI:
+    """
+    A zero-shot pipeline preferring the last candidate label, recording the candidate labels of every call.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, docs, candidate_labels, hypothesis_template, batch_size):
+        self.calls.append((len(docs), list(candidate_labels)))
+        scores = np.arange(1, len(candidate_labels) + 1, dtype=float)
+        scores /= scores.sum()
+        return [{'sequence': doc, 'labels': list(candidate_labels)[::-1], 'scores': scores[::-1].tolist()} for doc in docs]
+
+
+@pytest.mark.parametrize('aggregation', EmbeddingZeroShot.AGGREGATIONS)
+def test_documents_get_the_label_of_their_theme(aggregation):
+    df = make_corpus(40)
+    zero_shot = EmbeddingZeroShot(encode, GROUPS, label_names=NAMES, aggregation=aggregation)
+    scores = zero_shot.scores(encode(df['processed_data'].tolist()))
+    assert scores.shape == (40, 4) and np.allclose(scores.sum(axis=1), 1, atol=1e-5)
+
+    df_labelled = zero_shot.label_df(df)
+    assert (df_labelled['zero_shot_label'] == [NAMES[theme] for theme in df['theme']]).all()
+    assert df_labelled['zero_shot_label_score'].between(0, 1).all()
+    assert 'zero_shot_label' not in df.columns
+
+
+def test_predict_formats_like_the_pipeline():
+    zero_shot = EmbeddingZeroShot(encode, dict(zip(NAMES, GROUPS)))
+    docs = make_corpus(8)['processed_data'].tolist()
+    predictions = zero_shot.predict(docs, top_k=10)
+    for prediction, doc in zip(predictions, docs):
+        assert prediction['sequence'] == doc and sorted(prediction['labels']) == sorted(NAMES)
+        assert prediction['scores'] == sorted(prediction['scores'], reverse=True)
+    # The embeddings alone are enough without an NLI pipeline
+    assert [prediction['labels'] for prediction in zero_shot.predict(embeddings=encode(docs))] == [prediction['labels'][:3] for prediction in predictions]
+
+
+def test_nli_only_reranks_the_best_labels():
+    docs = make_corpus(20)['processed_data'].tolist()
+    zero_shot = EmbeddingZeroShot(encode, GROUPS, label_names=NAMES)
+    nli = FakeNLI()
+    predictions = zero_shot.predict(docs, nli_classifier=nli, nli_top_k=2, top_k=5)
+
+    # One call per distinct set of candidates, with two candidates each
+    assert sum(n_docs for n_docs, _ in nli.calls) == len(docs)
+    assert all(len(candidates) == 2 for _, candidates in nli.calls)
+    assert len({tuple(candidates) for _, candidates in nli.calls}) == len(nli.calls)
+    embedding_best = [prediction['labels'][:2] for prediction in zero_shot.predict(docs, top_k=2)]
+    for prediction, best in zip(predictions, embedding_best):
+        assert len(prediction['labels']) == 2 and set(prediction['labels']) == set(best)
+        assert np.isclose(sum(prediction['scores']), 1)
+
+
+def test_invalid_labels():
+    with pytest.raises(ValueError):
+        EmbeddingZeroShot(encode, GROUPS, aggregation='median')
+    with pytest.raises(ValueError):
+        EmbeddingZeroShot(encode, GROUPS, label_names=NAMES[:2])
+    with pytest.raises(ValueError):
+        EmbeddingZeroShot(encode, GROUPS, label_names=['a', 'a', 'b', 'c'])
+    with pytest.raises(ValueError):
+        EmbeddingZeroShot(encode, GROUPS).predict()
+    with pytest.raises(ValueError):
+        EmbeddingZeroShot(encode, GROUPS).predict(embeddings=encode(['price']), nli_classifier=FakeNLI())
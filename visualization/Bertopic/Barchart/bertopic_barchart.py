@@ -1,13 +1,26 @@
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from typing import List, Union
 from sklearn.preprocessing import normalize
+from clustering.doc_term_matrix import topics_per_class_from_matrix
 from visualization.Shared.Barchart.barchart import Barchart
 
 class BertopicBarchart(Barchart):
 
-    def __init__(self, bertopic_model) -> None:
+    def __init__(self, bertopic_model, doc_term_matrix=None) -> None:
+        """
+        Constructor
+
+        Parameters
+        ----------
+            bertopic_model (BERTopic): The BERTopic model used to calculate the topics per class.
+            doc_term_matrix (scipy.sparse.csr_matrix): The optional term counts of the documents used to fit the model (see `ClusteringMethod.get_doc_term_matrix`). When provided, the topics per class are computed from its rows, selected with the positions of the documents of the DataFrame in the fitted data, instead of tokenizing the documents again. Defaults to None.
+        """
+        if doc_term_matrix is not None and doc_term_matrix.shape[0] != len(bertopic_model.topics_):
+            raise ValueError(f"doc_term_matrix has {doc_term_matrix.shape[0]} rows but the model was fitted on {len(bertopic_model.topics_)} documents")
         self.bertopic_model = bertopic_model
+        self.doc_term_matrix = doc_term_matrix
 
     def create_chart_per_class(self, 
                                df, 
@@ -19,6 +32,7 @@ class BertopicBarchart(Barchart):
                                viz_from_source=False,
                                stacked=False, 
                                percentage_by=None,
+                               positions=None,
                                **kwargs
                                ):
         """
@@ -33,13 +47,14 @@ class BertopicBarchart(Barchart):
             sortedBy (str): An optional parameter used to sort the topics by either "Frequency" or "Name". Defaults to None.
             ascending (bool): An optional boolean parameter used to determine the sorting order. If True, sorts in ascending order. If False, sorts in descending order. Defaults to True.
             orient (str): The orientation of the visualization. Can be either "h" for horizontal or "v" for vertical. Defaults to "h".
+            positions (array-like): The positions of the documents of `df` in the data the model was fitted on, used to select the rows of `doc_term_matrix`. Defaults to None (the index of `df`).
             **kwargs: Additional keyword arguments passed to the visualization method.
 
         Returns
         -------
             plotly.graph_objs.Figure: The resulting chart representing the topics per class.
         """
-        self.topics_per_class = self.create_topics_per_class_df(df, classes_column, filter_value=filter_value, sortedBy=sortedBy, ascending=ascending)
+        self.topics_per_class = self.create_topics_per_class_df(df, classes_column, filter_value=filter_value, sortedBy=sortedBy, ascending=ascending, positions=positions)
         self.fig = self.__visualize_topics_per_class_options(self.topics_per_class, orient=orient, viz_from_source=viz_from_source, stacked=stacked, percentage_by=percentage_by, **kwargs)
 
         return self.fig
@@ -211,7 +226,8 @@ class BertopicBarchart(Barchart):
                                      classes_column, 
                                      filter_value=None, 
                                      sortedBy=None, 
-                                     ascending=True
+                                     ascending=True,
+                                     positions=None
                                      ) -> pd.DataFrame:
         """
         Computes the distribution of topics per class in the given DataFrame. Optionally filters the data by a given subclass and sorts the resulting DataFrame.
@@ -223,6 +239,7 @@ class BertopicBarchart(Barchart):
             filter_value (str, optional): The value of the subclass to filter the data by. Required if filter is True.
             sortedBy (str, optional): Column name to sort by. Must be either None (default), 'Frequency', 'Class', 'Topic_Percentage' or 'Class_Percentage'.
             ascending (bool, optional): Whether to sort in ascending order. Default is True. Can only be used if sortedBy is not None.
+            positions (array-like, optional): The positions of the documents of df in the data the model was fitted on, used to select the rows of `doc_term_matrix`. Defaults to None (the index of df, which must then be these positions).
 
         Returns
         -------
@@ -238,8 +255,15 @@ class BertopicBarchart(Barchart):
         if ascending not in [True, False]:
             raise ValueError("ascending must be either True or False")
         
-        # Compute topics_per_class dataframe using bertopic method
-        topics_per_class = self.bertopic_model.topics_per_class(df["processed_data"].astype(str).tolist(), classes=df[classes_column].to_list())
+        if self.doc_term_matrix is not None:
+            # Slice the precomputed term counts with the positions of the documents in the fitted data
+            rows = np.asarray(positions) if positions is not None else df.index.to_numpy()
+            if len(rows) != len(df) or not np.issubdtype(rows.dtype, np.integer) or (len(rows) and (rows.min() < 0 or rows.max() >= self.doc_term_matrix.shape[0])):
+                raise ValueError("The positions of the documents in the fitted data must be one integer per row of df, lower than the number of documents: pass them in `positions` if the index of df is not these positions")
+            topics_per_class = topics_per_class_from_matrix(self.bertopic_model, self.doc_term_matrix[rows], np.asarray(self.bertopic_model.topics_)[rows], df[classes_column].to_list())
+        else:
+            # Compute topics_per_class dataframe using bertopic method
+            topics_per_class = self.bertopic_model.topics_per_class(df["processed_data"].astype(str).tolist(), classes=df[classes_column].to_list())
         # Add percentage columns to dataframe
         topics_per_class = self.add_percentage(topics_per_class, topic_col='Topic', freq_col='Frequency')
 
@@ -1,20 +1,25 @@
-from numpy import ndarray, where, sort, unique, array, argsort
+from typing import Union
+
+from numpy import ndarray, where, argsort, lexsort
 from pandas import DataFrame
 
+from clustering.probabilities import TopKProbabilities, topic_column, top_two_margin
+
 class BertopicTopDocs:
 
-    def __init__(self, bertopic_probabilities: ndarray, df: DataFrame) -> None:
+    def __init__(self, bertopic_probabilities: Union[ndarray, TopKProbabilities], df: DataFrame) -> None:
         """
         Constructor
 
         Parameters
         ----------
-            probabilities (numpy.ndarray): The probabilities from the BERTopic model.
+            probabilities (numpy.ndarray | TopKProbabilities): The probabilities from the BERTopic model, either dense (any float dtype, possibly memory-mapped) or in the compact top-k storage.
             df (pandas.DataFrame): The dataframe containing the documents.
             
         """
         self.bertopic_probabilities = bertopic_probabilities
         self.df = df.copy()
+        self._margins = None
 
     def get_top_topic_docs(self, topic: int, top_n_docs: int) -> tuple:
         """
@@ -31,23 +36,17 @@ class BertopicTopDocs:
         """
         
         
-        # Get the unique probabilities for the defined topic
-        unique_probs = unique(self.bertopic_probabilities[:, topic])
-        # Sort the unique probabilities in descending order
-        sorted_unique_probs = sort(unique_probs)[::-1]
-        
-        # Initialize an empty list to store the sorted indices of all documents
-        sorted_docs_indices = []
+        # Get the probabilities of every document for the defined topic
+        topic_probs = topic_column(self.bertopic_probabilities, topic)
+        # The difference between the first and second scores of each document, computed once for all topics
+        if self._margins is None:
+            self._margins = top_two_margin(self.bertopic_probabilities)
         
-        # Loop over the unique probabilities
-        for prob in sorted_unique_probs:
-            # Sort the documents that have the current probability for the defined topic
-            sorted_top_docs_indices = BertopicTopDocs.sort_docs_with_same_prob(self.bertopic_probabilities, prob, topic)
-            # Append these indices to the list of sorted indices of all documents
-            sorted_docs_indices.extend(sorted_top_docs_indices)
+        # Sort the documents by decreasing probability, and the documents having the same probability by decreasing difference between their first and second scores
+        sorted_docs_indices = lexsort((-self._margins, -topic_probs))
         
         # Take the top n from this sorted list
-        final_top_docs_indices = array(sorted_docs_indices)[:top_n_docs]
+        final_top_docs_indices = sorted_docs_indices[:top_n_docs]
         
         # Get the content of the top n documents from your dataframe
         top_docs_df = self.df.iloc[final_top_docs_indices]
@@ -69,11 +68,9 @@ class BertopicTopDocs:
             numpy.ndarray: An array containing the sorted indices of the documents that have the specified probability for the specified topic.
         """
         # Get the indices of all documents that have the current probability for the defined topic
-        top_docs_indices = where(bertopic_probabilities[:, topic] == prob)[0]
-        # Sort the probabilities for each document in descending order
-        sorted_probs = -sort(-bertopic_probabilities[top_docs_indices], axis=1)
+        top_docs_indices = where(topic_column(bertopic_probabilities, topic) == prob)[0]
         # Compute the score for each document based on the difference between their first and second scores
-        scores = sorted_probs[:, 0] - sorted_probs[:, 1]
+        scores = top_two_margin(bertopic_probabilities[top_docs_indices])
         # Sort these top documents based on their scores
         sorted_top_docs_indices = top_docs_indices[argsort(scores)[::-1]]
         
@@ -10,7 +10,7 @@ nltk.download('punkt')
 
 class BertopicWordcloud(WordcloudMaker):
 
-    def __init__(self, bertopic_model, docs) -> None:
+    def __init__(self, bertopic_model, docs, doc_term_matrix=None) -> None:
         """
         Constructor
 
@@ -18,33 +18,54 @@ class BertopicWordcloud(WordcloudMaker):
         ----------
             bertopic_model (BERTopic): The BERTopic model used to calculate the topic words.
             docs (list): A list of documents used to fit the BERTopic model.
+            doc_term_matrix (scipy.sparse.csr_matrix): The optional term counts of the documents (see `ClusteringMethod.get_doc_term_matrix`), sliced by row instead of applying the vectorizer to the documents again. Defaults to None.
         """
+        if doc_term_matrix is not None and doc_term_matrix.shape[0] != len(docs):
+            raise ValueError(f"doc_term_matrix has {doc_term_matrix.shape[0]} rows but there are {len(docs)} documents")
         self.bertopic_model = bertopic_model
         self.docs = docs
+        self.doc_term_matrix = doc_term_matrix
 
-    def __recalculate_probabilities(self, lemma_prob, docs) -> Dict[str, float]:
+    def __topic_doc_term_matrix(self, topic):
+        """
+        Get the term counts of the documents assigned to a topic.
+
+        Parameters
+        ----------
+            topic (int): The topic number, shifted by one as in `__group_docs_by_topic` (0 is the outlier topic -1).
+
+        Returns
+        -------
+            scipy.sparse.csr_matrix: The term counts of the documents of the topic.
+        """
+        if self.doc_term_matrix is not None:
+            rows = np.nonzero(np.asarray(self.bertopic_model.topics_) + 1 == topic)[0]
+            return self.doc_term_matrix[rows]
+        # Group documents by their assigned topic.
+        docs_by_topic = self.__group_docs_by_topic()
+        # get the documents assigned to a specific topic
+        my_docs = docs_by_topic.get(topic, [])
+        return self.bertopic_model.vectorizer_model.transform(my_docs)
+
+    def __recalculate_probabilities(self, lemma_prob, X) -> Dict[str, float]:
         """
         Recalculate the c-TF-IDF scores for the lemmas.
 
-        This function takes as input a dictionary `lemma_prob` containing the lemmas and their probabilities, a list of documents `docs`, and a BERTopic model `bertopic_model`. The function recalculates the c-TF-IDF scores for the lemmas using the provided documents and BERTopic model.
+        This function takes as input a dictionary `lemma_prob` containing the lemmas and their probabilities, and the term counts `X` of the documents of the topic. The function recalculates the c-TF-IDF scores for the lemmas using these term counts and the vocabulary of the BERTopic model.
 
-        The function first calculates the term frequencies for each lemma using the CountVectorizer from the BERTopic model. Then, it calculates the inverse document frequencies for each lemma and uses these values to compute the c-TF-IDF scores. The c-TF-IDF scores are then normalized and used to update the probabilities of the lemmas.
+        The function first calculates the term frequencies for each lemma from the term counts. Then, it calculates the inverse document frequencies for each lemma and uses these values to compute the c-TF-IDF scores. The c-TF-IDF scores are then normalized and used to update the probabilities of the lemmas.
 
         The resulting dictionary, where the keys are the lemmas and the values are their updated probabilities, is then returned.
 
         Parameters
         ----------
             lemma_prob (dict): A dictionary where the keys are the lemmas (str) and the values are their probabilities (float).
-            docs (list): A list of documents used to fit the BERTopic model.
-            topic_model (BERTopic): The BERTopic model used to calculate the c-TF-IDF scores.
+            X (scipy.sparse.csr_matrix): The term counts of the documents of the topic, with the vocabulary of the BERTopic model.
 
         Returns
         -------
             dict: A dictionary where the keys are the lemmas (str) and the values are their updated probabilities (float).
         """
-        # Calculate the term frequencies using the provided CountVectorizer
-        X = self.bertopic_model.vectorizer_model.transform(docs)
-        
         # Calculate the term frequencies for each lemma
         tf = {}
         for lemma, prob in lemma_prob.items():
@@ -152,14 +173,12 @@ class BertopicWordcloud(WordcloudMaker):
         topic_words = [(word, prob ** scale) for word, prob in topic_words]
 
         if lemmatize:
-            # Group documents by their assigned topic.
-            docs_by_topic = self.__group_docs_by_topic()
-            # get the documents assigned to a specific topic
-            my_docs = docs_by_topic.get(topic, [])
+            # Get the term counts of the documents assigned to the topic
+            X = self.__topic_doc_term_matrix(topic)
             # Lemmatize the words and combine their probabilities
             lemma_prob = self.lemmatize_words(topic_words)
             # Recalculate the c-TF-IDF scores for the lemmas
-            topic_words_lemma = self.__recalculate_probabilities(lemma_prob, my_docs)
+            topic_words_lemma = self.__recalculate_probabilities(lemma_prob, X)
             # Create a dictionary with the lemmas and their probabilities
             word_freq = {lemma: prob for lemma, prob in topic_words_lemma.items()}
         